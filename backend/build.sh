@@ -4,5 +4,15 @@ set -o errexit
 
 pip install -r requirements.txt
 
+# Refuses settings that only work in a single process (portal/checks.py)
+python manage.py check --deploy --fail-level ERROR
+
 python manage.py collectstatic --no-input
-python manage.py migrate
\ No newline at end of file
+# Old random PAY-xxxxxx references can collide; the unique constraint that
+# migrate adds needs them distinct first (a no-op once they are)
+python manage.py dedupe_transaction_refs
+python manage.py migrate
+# Only does anything with CACHE_BACKEND set to the database cache
+python manage.py createcachetable
+# Reports saved before imei_reversed existed (IMEI suffix search); a no-op once filled
+python manage.py backfill_imei_reversed
@@ -0,0 +1,28 @@
+# backend/gunicorn.conf.py
+# Loaded automatically by `gunicorn safeimei_project.wsgi` run from this
+# directory. Prepares the shared metrics directory for multi-process
+# Prometheus aggregation (see portal/metrics.py).
+import glob
+import os
+
+import decouple
+
+# Module-level names are read as gunicorn settings, hence no bare `config`
+multiproc_dir = decouple.config('PROMETHEUS_MULTIPROC_DIR', default='')
+if multiproc_dir:
+    # Workers inherit the master's environment
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', multiproc_dir)
+
+
+def on_starting(server):
+    if multiproc_dir:
+        # Files from a previous run would be added to this run's totals
+        os.makedirs(multiproc_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(multiproc_dir, '*.db')):
+            os.remove(path)
+
+
+def child_exit(server, worker):
+    if multiproc_dir:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -2,8 +2,9 @@
 from django.contrib import admin
 from django.core.management import call_command
 from django.contrib import messages
+from django.utils import timezone
 
-from .models import Station, OfficerProfile, DeviceReport
+from .models import Station, OfficerProfile, DeviceReport, Job, PaymentEvent, ProofBlob, SightingAlertWindow, ReportImport
 
 
 @admin.register(Station)
@@ -79,4 +80,69 @@ class DeviceReportAdmin(admin.ModelAdmin):
         ('Reporting Information', {
             'fields': ('reported_by', 'station', 'created_at')
         }),
-    )
\ No newline at end of file
+    )
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """
+    Admin view for the background job queue.
+    Dead-lettered jobs can be inspected and re-queued from here.
+    """
+    list_display = ('name', 'status', 'attempts', 'max_attempts', 'run_after', 'created_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created_at', 'updated_at', 'last_error')
+    actions = ['requeue_jobs']
+
+    @admin.action(description='Re-queue selected jobs')
+    def requeue_jobs(self, request, queryset):
+        count = queryset.update(status=Job.StatusChoices.QUEUED, attempts=0, run_after=timezone.now(), locked_until=None)
+        self.message_user(request, f"Re-queued {count} job(s).", messages.SUCCESS)
+
+
+@admin.register(PaymentEvent)
+class PaymentEventAdmin(admin.ModelAdmin):
+    """
+    Read-only log of Paystack webhook events, one row per event id.
+    """
+    list_display = ('event', 'reference', 'event_id', 'note', 'received_at')
+    list_filter = ('event',)
+    search_fields = ('reference', 'event_id')
+    readonly_fields = ('event_id', 'event', 'reference', 'payload', 'note', 'received_at')
+
+
+@admin.register(ProofBlob)
+class ProofBlobAdmin(admin.ModelAdmin):
+    """
+    Content-addressed proof files and how many reports use each one.
+    Orphans are removed by `manage.py gc_proofs`.
+    """
+    list_display = ('name', 'size', 'ref_count', 'created_at')
+    list_filter = ('created_at',)
+    readonly_fields = ('name', 'size', 'ref_count', 'created_at')
+
+
+@admin.register(SightingAlertWindow)
+class SightingAlertWindowAdmin(admin.ModelAdmin):
+    """
+    Sighting alert windows per IMEI and recipient, with the sightings
+    waiting for their digest.
+    """
+    list_display = ('imei', 'kind', 'recipient', 'window_ends', 'pending_count', 'digest_queued')
+    list_filter = ('kind',)
+    search_fields = ('imei', 'recipient')
+    readonly_fields = ('imei', 'recipient', 'kind', 'report', 'window_ends', 'opening', 'pending', 'pending_count',
+                       'digest_queued', 'updated_at')
+
+
+@admin.register(ReportImport)
+class ReportImportAdmin(admin.ModelAdmin):
+    """
+    Bulk imports of historical records and their progress. Rejected rows are
+    downloadable from the agent portal's import page.
+    """
+    list_display = ('source_name', 'station', 'status', 'rows_done', 'imported', 'rejected', 'created_at')
+    list_filter = ('status', 'station')
+    search_fields = ('source_name',)
+    readonly_fields = ('station', 'uploaded_by', 'file', 'source_name', 'format', 'encoding', 'status', 'rows_done',
+                       'imported', 'rejected', 'error', 'created_at', 'finished_at')
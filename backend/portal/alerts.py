@@ -0,0 +1,195 @@
+# portal/alerts.py
+"""
+Sighting alerts, coalesced per IMEI and recipient.
+
+A stolen phone being shopped around a market is checked dozens of times an
+hour. Rather than one email per check, the first sighting opens a window of
+SIGHTING_ALERT_WINDOW seconds and is emailed straight away; sightings during
+the window are held on its SightingAlertWindow row and go out together as a
+single digest (times, approximate locations, IPs) when it closes. The next
+sighting after that opens a new window.
+
+Both steps run in background jobs (see portal/tasks.py). A digest is only
+cleared once it has been sent, so a failed send is retried with the job
+rather than lost. The opening sighting is kept on the window until its alert
+is out, so a retried alert job sends it again instead of filing it under the
+digest. Sightings still held when a window closes (a digest that ran out of
+retries, an opening alert that never went out) are queued as a digest as soon
+as the next window opens.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import enqueue
+from .metrics import timed_outbound
+from .models import SightingAlertWindow
+
+logger = logging.getLogger(__name__)
+
+
+def _sighting_lines(sightings):
+    return "\n".join(
+        f"- {s['seen_at']}  |  {s['location']}  |  IP {s['ip']}" for s in sightings
+    )
+
+
+def render_alert(kind, report, sighting):
+    """(subject, message) for a single sighting."""
+    if kind == SightingAlertWindow.KindChoices.OWNER:
+        subject = f"SafeIMEI Alert: Your Stolen Device (IMEI: {report.imei}) was Detected!"
+        message = f"""
+Dear {report.owner_full_name},
+
+Important Update:
+Your stolen device (IMEI: {report.imei}) was just searched on the SafeIMEI database.
+This usually means someone is trying to buy or sell it right now.
+
+--- Sighting Details ---
+Time: {sighting['seen_at']}
+Approximate Location: {sighting['location']}
+IP Address: {sighting['ip']}
+-----------------------
+
+Please forward this information to your recovery agent immediately.
+
+SafeIMEI Security Team
+    """
+    else:
+        subject = f"Anonymous Tip: Stolen Device (IMEI: {report.imei})"
+        message = f"""
+ALERT: A stolen device has just been scanned on SafeIMEI.
+
+Device Details:
+- IMEI: {report.imei}
+- Brand: {report.brand} {report.model}
+- Center: {report.station.name if report.station else 'Unknown'}
+
+Sighting Information:
+- Time: {sighting['seen_at']}
+- Approx Location: {sighting['location']}
+- IP Address: {sighting['ip']}
+
+This is an automated intelligence alert.
+    """
+    return subject, message
+
+
+def render_digest(kind, report, sightings, total):
+    """(subject, message) for the `total` sightings held in a window, `sightings` listed."""
+    more = f"\n... and {total - len(sightings)} more.\n" if total > len(sightings) else ""
+    if kind == SightingAlertWindow.KindChoices.OWNER:
+        subject = f"SafeIMEI Alert: Your Stolen Device (IMEI: {report.imei}) was checked {total} more times"
+        message = f"""
+Dear {report.owner_full_name},
+
+Since our last alert, your stolen device (IMEI: {report.imei}) was searched
+on the SafeIMEI database {total} more times:
+
+{_sighting_lines(sightings)}
+{more}
+Repeated checks usually mean the device is actively being offered for sale.
+Please forward this information to your recovery agent immediately.
+
+SafeIMEI Security Team
+    """
+    else:
+        subject = f"Anonymous Tips: Stolen Device (IMEI: {report.imei}), {total} more sightings"
+        message = f"""
+ALERT: A stolen device was scanned on SafeIMEI {total} more times since the last alert.
+
+Device Details:
+- IMEI: {report.imei}
+- Brand: {report.brand} {report.model}
+- Center: {report.station.name if report.station else 'Unknown'}
+
+Sightings:
+{_sighting_lines(sightings)}
+{more}
+This is an automated intelligence alert.
+    """
+    return subject, message
+
+
+def _send(recipient, subject, message):
+    with timed_outbound('email'):
+        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [recipient], fail_silently=False)
+
+
+def _queue_digest(window, delay):
+    window.digest_queued = True
+    # After commit, so the digest job sees the sighting it was queued for
+    transaction.on_commit(lambda: enqueue('sighting_digest', delay=delay, window_id=window.pk))
+
+
+def record_sighting(kind, report, recipient, sighting):
+    """
+    Alert `recipient` about `sighting` ({'seen_at', 'ip', 'location'}) of
+    `report`'s IMEI: at once if it opens a window, otherwise in the digest.
+    Returns True when the alert was sent now.
+    """
+    now = timezone.now()
+    window_length = timedelta(seconds=settings.SIGHTING_ALERT_WINDOW)
+    with transaction.atomic():
+        window, opened = SightingAlertWindow.objects.select_for_update().get_or_create(
+            imei=report.imei, recipient=recipient, kind=kind,
+            defaults={'report': report, 'window_ends': now + window_length, 'opening': sighting},
+        )
+        if not opened and window.window_ends <= now:
+            opened = True
+            if window.opening is not None:
+                window.pending = [window.opening, *window.pending][:settings.SIGHTING_DIGEST_MAX_ITEMS]
+                window.pending_count += 1
+            window.report = report
+            window.window_ends = now + window_length
+            window.opening = sighting
+            # Whatever the last window could not deliver goes out straight away
+            window.digest_queued = False
+            if window.pending_count:
+                _queue_digest(window, timedelta())
+            window.save(update_fields=[
+                'report', 'window_ends', 'opening', 'pending', 'pending_count', 'digest_queued', 'updated_at',
+            ])
+        elif not opened and window.opening == sighting:
+            # The job that opened this window is being retried
+            opened = True
+        elif not opened:
+            if len(window.pending) < settings.SIGHTING_DIGEST_MAX_ITEMS:
+                window.pending.append(sighting)
+            window.pending_count += 1
+            # One digest job per window; later sightings ride along
+            if not window.digest_queued:
+                _queue_digest(window, max(window.window_ends - now, timedelta()))
+            window.save(update_fields=['pending', 'pending_count', 'digest_queued', 'updated_at'])
+
+    if opened:
+        _send(recipient, *render_alert(kind, report, sighting))
+        SightingAlertWindow.objects.filter(pk=window.pk, opening=sighting).update(opening=None)
+    return opened
+
+
+def send_digest(window_id):
+    """Send the sightings held on a window, then clear the ones sent."""
+    window = SightingAlertWindow.objects.select_related('report__station').filter(pk=window_id).first()
+    if window is None:
+        return
+    if not window.pending_count:
+        SightingAlertWindow.objects.filter(pk=window_id, pending_count=0).update(digest_queued=False)
+        return
+    sightings, total = list(window.pending), window.pending_count
+    _send(window.recipient, *render_digest(window.kind, window.report, sightings, total))
+
+    with transaction.atomic():
+        window = SightingAlertWindow.objects.select_for_update().get(pk=window_id)
+        # Sightings recorded while the email was going out stay for the next digest
+        window.pending = window.pending[len(sightings):]
+        window.pending_count = max(0, window.pending_count - total)
+        window.digest_queued = False
+        if window.pending_count:
+            _queue_digest(window, max(window.window_ends - timezone.now(), timedelta()))
+        window.save(update_fields=['pending', 'pending_count', 'digest_queued', 'updated_at'])
+    logger.info(f"Sent a digest of {total} sightings of {window.imei} to {window.recipient}")
@@ -0,0 +1,232 @@
+# portal/benchmarks.py
+"""
+Latency benchmarks for the hot portal views.
+
+`manage.py bench_views` generates a dataset of the requested size on a
+throwaway database (see portal/load_data.py), then drives each scenario
+through the test client: public IMEI checks (safe and stolen), public report
+submission against a stub Paystack with the fake OCR engine, payment
+verification, the dashboard and the report list. For every scenario it
+records:
+
+- p50/p95/p99 latency over the timed iterations;
+- database queries per request;
+- memory allocated per request (peak, via tracemalloc, in a separate pass
+  so tracing does not distort the timings).
+
+Results are plain JSON. Saved with --output, they become the baseline a
+later run is compared against with --baseline.
+"""
+import itertools
+import math
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from .load_data import imei_for
+from .models import DeviceReport, OfficerProfile
+from .testing import StubServer
+
+# Latency may drift this much (relative) before a scenario counts as slower
+DEFAULT_THRESHOLD = 0.10
+# ...unless the difference is below this, which is noise at any percentile
+MIN_REGRESSION_MS = 0.5
+
+
+class BenchmarkError(Exception):
+    """A scenario did not behave as expected (error status, missing data)."""
+
+
+class Scenario:
+    def __init__(self, name, run, before=None, expect=(200,)):
+        self.name = name
+        self.run = run
+        # Called before each request, outside the measurement
+        self.before = before
+        self.expect = expect
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an ascending list."""
+    return sorted_values[max(0, math.ceil(fraction * len(sorted_values)) - 1)]
+
+
+@contextmanager
+def count_queries():
+    counter = {'queries': 0}
+
+    def wrapper(execute, sql, params, many, context):
+        counter['queries'] += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        yield counter
+
+
+def _public_report_data(station_id, imei):
+    return {
+        'owner_full_name': 'Bench Reporter', 'owner_phone_number': '08012345678',
+        'owner_email': 'reporter@bench.test', 'owner_address': '1 Bench Road',
+        'imei': imei, 'brand': 'Tecno', 'model': 'Spark 10',
+        'incident_state': station_id, 'incident_date': '2025-01-01',
+        'police_report_image': SimpleUploadedFile('report.pdf', b'%PDF-1.4 bench report'),
+        'device_receipt': SimpleUploadedFile('receipt.pdf', f'%PDF-1.4 IMEI {imei}'.encode()),
+        'terms': 'on',
+    }
+
+
+def build_scenarios(sample_size=200):
+    """Scenarios over whatever reports are in the database."""
+    stolen = list(DeviceReport.objects.filter(status=DeviceReport.StatusChoices.STOLEN)
+                  .order_by('pk').values_list('imei', flat=True)[:sample_size])
+    refs = list(DeviceReport.objects.order_by('pk').values_list('transaction_ref', flat=True)[:sample_size])
+    officer = OfficerProfile.objects.order_by('user_id').first()
+    if not stolen or officer is None:
+        raise BenchmarkError("The dataset needs stolen reports and at least one agent.")
+
+    # Numbers past the generated range: Luhn-valid and never reported
+    fresh = (imei_for(n) for n in itertools.count(10 ** 11))
+    safe = itertools.cycle([next(fresh) for _ in range(sample_size)])
+    stolen_cycle, ref_cycle = itertools.cycle(stolen), itertools.cycle(refs)
+    station_id = officer.station_id
+
+    return officer.user, [
+        Scenario('home_view (safe IMEI)', lambda c: c.post(reverse('home'), {'imei': next(safe)})),
+        Scenario('home_view (stolen IMEI)', lambda c: c.post(reverse('home'), {'imei': next(stolen_cycle)})),
+        Scenario('public_report_view (POST)',
+                 lambda c: c.post(reverse('public_report'), _public_report_data(station_id, next(fresh))),
+                 expect=(302,)),
+        Scenario('verify_payment_view', lambda c: c.get(reverse('verify_payment'), {'reference': next(ref_cycle)})),
+        Scenario('dashboard_view (cold cache)', lambda c: c.get(reverse('dashboard')), before=cache.clear),
+        Scenario('dashboard_view (cached)', lambda c: c.get(reverse('dashboard'))),
+        Scenario('view_reports_view', lambda c: c.get(reverse('view_reports'))),
+        Scenario('view_reports_view (IMEI suffix)',
+                 lambda c: c.get(reverse('view_reports'), {'search': next(stolen_cycle)[-5:]})),
+    ]
+
+
+def measure(scenario, client, iterations, warmup, allocation_iterations):
+    def prepare():
+        if scenario.before:
+            scenario.before()
+
+    for _ in range(warmup):
+        prepare()
+        scenario.run(client)
+
+    timings, queries = [], []
+    for _ in range(iterations):
+        prepare()
+        with count_queries() as counter:
+            started = time.perf_counter()
+            response = scenario.run(client)
+            elapsed = time.perf_counter() - started
+        if response.status_code not in scenario.expect:
+            raise BenchmarkError(f"{scenario.name} answered {response.status_code}")
+        timings.append(elapsed * 1000)
+        queries.append(counter['queries'])
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(allocation_iterations):
+            prepare()
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            scenario.run(client)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'mean_ms': round(statistics.fmean(timings), 3),
+        'queries': statistics.median_low(queries),
+        'max_queries': max(queries),
+        'alloc_peak_kib': round(statistics.median(peaks) / 1024, 1) if peaks else None,
+    }
+
+
+def run_suite(iterations=200, warmup=20, allocation_iterations=20, only=None):
+    """Benchmark every scenario (or those whose name contains one of `only`)."""
+    dataset = {'reports': DeviceReport.objects.count()}
+    officer, scenarios = build_scenarios()
+    client = Client()
+    client.force_login(officer)
+    results = {}
+
+    with StubServer() as paystack, tempfile.TemporaryDirectory(prefix='bench-views-') as media_root:
+        paystack.route('POST', '/transaction/initialize', {
+            'status': True, 'data': {'authorization_url': 'https://checkout.test/bench'},
+        })
+        overrides = override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            OUTBOUND_HTTP={'paystack': {'base_url': paystack.url, 'retries': 0}},
+            GEOIP_REMOTE_FALLBACK=False,
+            # One client posting in a loop is exactly what the limiter refuses
+            RATE_LIMIT_ENABLED=False,
+            # Jobs (emails, OCR) are queued as in production, not run inline;
+            # should they run, OCR uses the fake engine.
+            JOBS_EAGER=False,
+            OCR_ENGINE='fake', OCR_ENGINE_OPTIONS={}, OCR_PROCESSES=0,
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            MEDIA_ROOT=media_root,
+        )
+        with overrides:
+            for scenario in scenarios:
+                if only and not any(part in scenario.name for part in only):
+                    continue
+                results[scenario.name] = measure(scenario, client, iterations, warmup, allocation_iterations)
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'debug': settings.DEBUG,
+        },
+        'dataset': dataset,
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """
+    Per-scenario changes from `baseline` to `current` (both run_suite output).
+
+    A scenario regresses when its p50 or p95 grows by more than `threshold`
+    (and MIN_REGRESSION_MS), or when it issues more queries.
+    """
+    rows = []
+    for name, now in current['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            rows.append({'view': name, 'status': 'new', 'changes': {}, 'regressions': []})
+            continue
+        changes, regressions = {}, []
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            changes[metric] = (now[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+            if metric != 'p99_ms' and changes[metric] > threshold and now[metric] - before[metric] >= MIN_REGRESSION_MS:
+                regressions.append(metric)
+        changes['queries'] = now['queries'] - before['queries']
+        if changes['queries'] > 0:
+            regressions.append('queries')
+        rows.append({
+            'view': name, 'changes': changes, 'regressions': regressions,
+            'status': 'slower' if regressions else 'ok',
+        })
+    return rows
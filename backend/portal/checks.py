@@ -0,0 +1,41 @@
+# portal/checks.py
+"""
+Deployment checks (`manage.py check --deploy`, run by build.sh) for settings
+that work on one development process but not behind gunicorn.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def _is_local(alias):
+    return settings.CACHES.get(alias, {}).get('BACKEND') in LOCAL_CACHE_BACKENDS
+
+
+@register(Tags.caches, deploy=True)
+def check_rate_limit_cache(app_configs, **kwargs):
+    if settings.DEBUG or not settings.RATE_LIMIT_ENABLED or not _is_local(settings.RATE_LIMIT_CACHE):
+        return []
+    return [Error(
+        f"RATE_LIMIT_CACHE ({settings.RATE_LIMIT_CACHE!r}) is not shared between processes, so each worker "
+        f"counts requests on its own and the rate limits do not hold.",
+        hint="Point CACHE_BACKEND (or the RATE_LIMIT_CACHE alias) at a shared cache such as Redis or "
+             "django.core.cache.backends.db.DatabaseCache, or set RATE_LIMIT_ENABLED=False.",
+        id='portal.E001',
+    )]
+
+
+@register(Tags.caches, deploy=True)
+def check_dashboard_cache(app_configs, **kwargs):
+    if settings.DEBUG or settings.DASHBOARD_CACHE_TTL <= 0 or not _is_local('default'):
+        return []
+    return [Error(
+        "The default cache is not shared between processes, so a report change only clears the dashboard "
+        "tiles cached by the worker that made it; the others show stale counts for up to DASHBOARD_CACHE_TTL.",
+        hint="Point CACHE_BACKEND at a shared cache, or set DASHBOARD_CACHE_TTL=0.",
+        id='portal.E002',
+    )]
@@ -0,0 +1,112 @@
+# portal/dashboard.py
+"""
+Station dashboard figures.
+
+Every tile is a filtered COUNT, so all of them are computed together in one
+conditional-aggregation query over the station's reports. Date tiles use
+half-open `created_at` ranges (>= start, < end) so the database can use an
+index instead of extracting year/month from every row.
+
+Results are cached per station for DASHBOARD_CACHE_TTL seconds and dropped
+as soon as a report for that station is created, deleted or changes status.
+That only reaches every worker through a shared cache, which the deploy
+checks require (portal/checks.py).
+
+To add a tile, register a function that returns the Q filter for it:
+
+    @tile('reports_today_count')
+    def reports_today(now):
+        return Q(created_at__gte=now.replace(hour=0, minute=0, second=0, microsecond=0))
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import DeviceReport
+
+TILES = {}
+
+
+def tile(name):
+    def decorator(condition):
+        TILES[name] = condition
+        return condition
+    return decorator
+
+
+def month_bounds(now):
+    """[start of this month, start of next month) in the current time zone."""
+    local = timezone.localtime(now)
+    start = local.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+
+@tile('reports_this_month_count')
+def reports_this_month(now):
+    start, end = month_bounds(now)
+    return Q(created_at__gte=start, created_at__lt=end)
+
+
+@tile('reports_last_7_days_count')
+def reports_last_7_days(now):
+    return Q(created_at__gte=now - timedelta(days=7), created_at__lt=now)
+
+
+@tile('reports_previous_7_days_count')
+def reports_previous_7_days(now):
+    return Q(created_at__gte=now - timedelta(days=14), created_at__lt=now - timedelta(days=7))
+
+
+@tile('reports_last_30_days_count')
+def reports_last_30_days(now):
+    return Q(created_at__gte=now - timedelta(days=30), created_at__lt=now)
+
+
+def _status_tile(status):
+    return lambda now: Q(status=status)
+
+
+# One tile per status, e.g. 'stolen_count', 'payment_pending_count'
+for _status in DeviceReport.StatusChoices:
+    tile(f"{_status.name.lower()}_count")(_status_tile(_status.value))
+
+# Older names used by the dashboard template
+ALIASES = {
+    'pending_review_count': 'pending_count',
+    'recently_recovered_count': 'recovered_count',
+}
+
+
+def cache_key(station_id):
+    return f"portal:dashboard:{station_id}"
+
+
+def compute_station_stats(station_id, now=None):
+    now = now or timezone.now()
+    aggregates = {name: Count('pk', filter=condition(now)) for name, condition in TILES.items()}
+    stats = DeviceReport.objects.filter(station_id=station_id).aggregate(**aggregates)
+    for alias, name in ALIASES.items():
+        stats[alias] = stats[name]
+    return stats
+
+
+def station_stats(station_id):
+    """All dashboard tiles for a station, from cache when possible."""
+    key = cache_key(station_id)
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_station_stats(station_id)
+        cache.set(key, stats, settings.DASHBOARD_CACHE_TTL)
+    return stats
+
+
+def invalidate_station(station_id):
+    key = cache_key(station_id)
+    cache.delete(key)
+    # Again after commit, in case another request re-cached pre-commit counts.
+    transaction.on_commit(lambda: cache.delete(key))
@@ -0,0 +1,171 @@
+# portal/db_router.py
+"""
+Read replicas for public lookups.
+
+Views decorated with @read_replica (the public IMEI check and the anonymous
+sighting form) read from one of the READ_REPLICAS aliases; everything else,
+and every write, uses the primary ('default'). Agents reviewing reports and
+payment updates therefore never read stale data, and the market-hours spike
+of IMEI checks is served by the replicas.
+
+Read-your-writes: once a request writes, the rest of it reads from the
+primary, and ReplicaMiddleware sets a short-lived cookie so the same client
+keeps reading from the primary for REPLICA_MAX_LAG seconds, long enough for
+the replicas to catch up.
+
+Replicas whose replication lag exceeds REPLICA_MAX_LAG (measured on
+PostgreSQL every REPLICA_LAG_CHECK_INTERVAL seconds), or that cannot be
+reached, are skipped until the next check. With no replica available,
+reads fall back to the primary.
+"""
+import contextvars
+import logging
+import random
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE = 'safeimei_primary'
+
+
+class RequestState:
+    def __init__(self, pinned=False):
+        self.use_replica = False
+        # Reads must see this client's own writes
+        self.pinned = pinned
+        self.wrote = False
+        self.replica = None
+
+
+_state = contextvars.ContextVar('replica_state', default=None)
+
+
+def replica_lag(alias):
+    """Seconds the replica `alias` is behind the primary (0 when it cannot tell)."""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        # A SQLite replica is a file copied or synced by something else
+        return 0.0
+    with connection.cursor() as cursor:
+        # The last replayed commit ages while the primary is idle, so a
+        # replica that has replayed everything it received counts as current.
+        cursor.execute(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+            " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+            " WHERE pg_is_in_recovery()"
+        )
+        row = cursor.fetchone()
+    return float(row[0]) if row else 0.0
+
+
+class ReplicaHealth:
+    """Which replicas are within the lag tolerance, re-checked periodically per process."""
+
+    def __init__(self):
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def usable(self, alias):
+        now = time.monotonic()
+        checked = self._checked.get(alias)
+        if checked is not None and now - checked[0] < settings.REPLICA_LAG_CHECK_INTERVAL:
+            return checked[1]
+        with self._lock:
+            try:
+                lag = replica_lag(alias)
+                usable = lag <= settings.REPLICA_MAX_LAG
+                if not usable:
+                    logger.warning(f"Replica {alias} is {lag:.1f}s behind; reading from the primary")
+            except DatabaseError as e:
+                logger.warning(f"Replica {alias} is unavailable: {e}")
+                usable = False
+            self._checked[alias] = (now, usable)
+        return usable
+
+    def clear(self):
+        self._checked.clear()
+
+
+health = ReplicaHealth()
+
+
+def choose_replica():
+    replicas = [alias for alias in settings.READ_REPLICAS if health.usable(alias)]
+    return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.use_replica or state.pinned or not settings.READ_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        # One replica per request, so its reads are mutually consistent
+        if state.replica is None:
+            state.replica = choose_replica()
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.pinned = state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.READ_REPLICAS:
+            return False
+        return None
+
+
+def read_replica(view):
+    """Let the view's reads go to a replica (until it writes)."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        state = _state.get()
+        token = None
+        if state is None:
+            token = _state.set(state := RequestState())
+        state.use_replica = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.use_replica = False
+            if token is not None:
+                _state.reset(token)
+    return wrapped
+
+
+class ReplicaMiddleware:
+    """Tracks writes per request and pins clients that wrote to the primary for a while."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.READ_REPLICAS:
+            return self.get_response(request)
+
+        try:
+            pinned = float(request.COOKIES.get(PIN_COOKIE, 0)) > time.time()
+        except ValueError:
+            pinned = False
+        state = RequestState(pinned=pinned)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+
+        if state.wrote:
+            lag = settings.REPLICA_MAX_LAG
+            response.set_cookie(PIN_COOKIE, f"{time.time() + lag:.0f}", max_age=max(1, round(lag)),
+                                httponly=True, samesite='Lax')
+        return response
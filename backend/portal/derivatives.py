@@ -0,0 +1,143 @@
+# portal/derivatives.py
+"""
+Thumbnails and previews of proof documents for the review page.
+
+Phone photos of receipts and police extracts are often several megabytes;
+agents triaging reports over slow station links only need to read them. For
+every new proof blob a background job renders two bounded-size copies:
+
+- thumbnail: up to PROOF_THUMBNAIL_SIZE px on the long side, shown inline;
+- preview: up to PROOF_PREVIEW_SIZE px, opened when the thumbnail is clicked.
+
+Images are re-encoded as WebP (JPEG if this Pillow has no WebP support);
+PDFs get a render of their first page (needs pypdfium2). Blobs are
+content-addressed, so each document is processed once however many reports
+share it. The original stays available behind an explicit link.
+"""
+import io
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from .models import ProofBlob
+from .proof_storage import PROOF_FIELDS, proof_storage
+
+logger = logging.getLogger(__name__)
+
+DERIVED_PREFIX = 'proofs/derived'
+
+PROOF_LABELS = {
+    'police_report_image': "Incident Report / Extract",
+    'device_carton_photo': "Device Carton / Box",
+    'device_receipt': "Proof of Ownership",
+}
+
+
+class DerivativeUnavailable(Exception):
+    """The document cannot be rendered here (missing library, unreadable file)."""
+
+
+def _output_format():
+    from PIL import features
+    if settings.PROOF_DERIVATIVE_FORMAT == 'WEBP' and features.check('webp'):
+        return 'WEBP', 'webp'
+    return 'JPEG', 'jpg'
+
+
+def render_first_page(path):
+    """The document at `path` as a PIL image (first page for PDFs)."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError as e:
+        raise DerivativeUnavailable("Pillow is not installed") from e
+
+    with open(path, 'rb') as f:
+        is_pdf = f.read(5) == b'%PDF-'
+    if is_pdf:
+        try:
+            import pypdfium2
+        except ImportError as e:
+            raise DerivativeUnavailable("PDF previews need pypdfium2") from e
+        try:
+            pdf = pypdfium2.PdfDocument(path)
+            try:
+                # Rendered at roughly the preview size; no need for print resolution
+                page = pdf[0]
+                scale = settings.PROOF_PREVIEW_SIZE / max(page.get_size())
+                return page.render(scale=scale).to_pil().convert('RGB')
+            finally:
+                pdf.close()
+        except pypdfium2.PdfiumError as e:
+            raise DerivativeUnavailable(f"Unreadable PDF: {e}") from e
+
+    try:
+        image = Image.open(path)
+        # Phone photos are often stored sideways with an EXIF rotation flag
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        raise DerivativeUnavailable(f"Unreadable image: {e}") from e
+    return image.convert('RGB')
+
+
+def _encode(image, max_size, image_format):
+    copy = image.copy()
+    copy.thumbnail((max_size, max_size))
+    buffer = io.BytesIO()
+    copy.save(buffer, image_format, quality=settings.PROOF_DERIVATIVE_QUALITY)
+    return buffer.getvalue()
+
+
+def derived_name(blob_name, kind, extension):
+    digest = blob_name.rsplit('/', 1)[-1].split('.', 1)[0]
+    return f"{DERIVED_PREFIX}/{digest[:2]}/{digest[2:4]}/{digest}-{kind}.{extension}"
+
+
+def generate(blob):
+    """Render and store the thumbnail and preview for a ProofBlob."""
+    try:
+        image = render_first_page(proof_storage.path(blob.name))
+    except (DerivativeUnavailable, FileNotFoundError) as e:
+        blob.derivatives_error = str(e)[:255]
+        blob.save(update_fields=['derivatives_error'])
+        logger.warning(f"No derivatives for {blob.name}: {e}")
+        return blob
+
+    image_format, extension = _output_format()
+    names = {}
+    for kind, max_size in (('thumbnail', settings.PROOF_THUMBNAIL_SIZE), ('preview', settings.PROOF_PREVIEW_SIZE)):
+        names[kind] = proof_storage.save_named(
+            derived_name(blob.name, kind, extension), ContentFile(_encode(image, max_size, image_format))
+        )
+    blob.thumbnail, blob.preview, blob.derivatives_error = names['thumbnail'], names['preview'], ''
+    blob.save(update_fields=['thumbnail', 'preview', 'derivatives_error'])
+    return blob
+
+
+def delete_derivatives(blob):
+    for name in (blob.thumbnail, blob.preview):
+        if name:
+            proof_storage.delete(name)
+
+
+def proof_previews(report):
+    """
+    What the review page shows for each proof: the original's URL plus
+    thumbnail/preview URLs when they have been generated.
+    """
+    files = {field: getattr(report, field) for field in PROOF_FIELDS}
+    blobs = ProofBlob.objects.in_bulk([f.name for f in files.values() if f], field_name='name')
+    previews = []
+    for field, field_file in files.items():
+        entry = {'field': field, 'label': PROOF_LABELS[field], 'original_url': None,
+                 'thumbnail_url': None, 'preview_url': None,
+                 'is_pdf': bool(field_file) and field_file.name.lower().endswith('.pdf')}
+        if field_file:
+            entry['original_url'] = field_file.url
+            blob = blobs.get(field_file.name)
+            if blob and blob.thumbnail:
+                entry['thumbnail_url'] = proof_storage.url(blob.thumbnail)
+                entry['preview_url'] = proof_storage.url(blob.preview)
+        previews.append(entry)
+    return previews
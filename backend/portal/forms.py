@@ -1,8 +1,10 @@
 # backend/portal/forms.py
 
 from django import forms
+from django.conf import settings
 from .models import DeviceReport, Station
-from . import validators
+from . import tac, validators
+from .report_import import ENCODINGS
 
 
 # Base class for common styling + error handling
@@ -27,6 +29,37 @@ class StyledForm(forms.Form):
         return {field: error.get_json_data() for field, error in self.errors.items()}
 
 
+# Reports errors for files the upload handler dropped mid-stream (portal/uploads.py)
+class UploadErrorsMixin:
+    def __init__(self, *args, upload_errors=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_errors = upload_errors or {}
+
+    def clean(self):
+        cleaned_data = super().clean()
+        for field, message in self.upload_errors.items():
+            # The dropped file also left a "required" error; show the real reason.
+            self._errors.pop(field, None)
+            self.add_error(field, message)
+        return cleaned_data
+
+
+# Checks the brand and model against the TAC database (portal/tac.py)
+class TacCheckMixin:
+    def clean(self):
+        cleaned_data = super().clean()
+        imei, brand, model = (cleaned_data.get(name) for name in ('imei', 'brand', 'model'))
+        device = tac.lookup(imei) if imei else None
+        if device is None:
+            # Unknown TAC (or no TAC file): nothing to compare against
+            return cleaned_data
+        if brand and not tac.names_match(brand, device['brand']):
+            self.add_error('brand', f"This IMEI belongs to a {device['brand']} device.")
+        elif model and not tac.names_match(model, device['model']):
+            self.add_error('model', f"This IMEI belongs to a {device['brand']} {device['model']}.")
+        return cleaned_data
+
+
 # Step 1: Personal Information
 class ReportStep1Form(StyledForm):
     owner_full_name = forms.CharField(
@@ -56,7 +89,7 @@ class ReportStep1Form(StyledForm):
 
 
 # Step 2: Device Information
-class ReportStep2Form(StyledForm):
+class ReportStep2Form(TacCheckMixin, StyledForm):
     imei = forms.CharField(
         max_length=15,
         label="IMEI Number",
@@ -109,7 +142,7 @@ class ReportStep3Form(StyledForm):
 
 # Step 4: Final Step (Proofs, Confirmation, and Submission)
 # UPDATED to match new requirements
-class ReportStep4Form(StyledForm):
+class ReportStep4Form(UploadErrorsMixin, StyledForm):
     police_report_image = forms.FileField(
         label="Police Report / Extract",
         required=True,
@@ -154,7 +187,7 @@ class ReportStep4Form(StyledForm):
 
 
 # Public Report Form (Single Step)
-class PublicReportForm(StyledForm):
+class PublicReportForm(TacCheckMixin, UploadErrorsMixin, StyledForm):
     # Owner Info
     owner_full_name = forms.CharField(max_length=255, label="Full Name")
     owner_phone_number = forms.CharField(max_length=20, label="Phone Number")
@@ -214,4 +247,26 @@ class PublicReportForm(StyledForm):
             if field_name in self.fields:
                 self.fields[field_name].widget.attrs.update({
                     'class': 'w-full text-sm text-gray-500 file:mr-4 file:py-2 file:px-4 file:rounded-full file:border-0 file:text-sm file:font-semibold file:bg-red-50 file:text-red-700 hover:file:bg-red-100'
-                })
\ No newline at end of file
+                })
+
+class ReportImportForm(StyledForm):
+    """Upload of a historical theft registry (see portal/report_import.py)."""
+    file = forms.FileField(
+        label="Registry file",
+        help_text="CSV with a header row, or NDJSON (one JSON object per line).",
+    )
+    encoding = forms.ChoiceField(
+        label="Text encoding",
+        choices=ENCODINGS,
+        initial='utf-8',
+        help_text="Rows that are not valid text in this encoding are rejected.",
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        if not file.name.lower().endswith(('.csv', '.ndjson', '.jsonl')):
+            raise forms.ValidationError("Upload a .csv, .ndjson or .jsonl file.")
+        max_size = settings.IMPORT_MAX_UPLOAD_SIZE
+        if file.size > max_size:
+            raise forms.ValidationError(f"File size must be under {max_size // (1024 * 1024)}MB.")
+        return file
@@ -0,0 +1,228 @@
+# portal/geoip.py
+"""
+Offline IP geolocation.
+
+Sightings are resolved against a local range file built by
+`manage.py build_geoip` from a CSV dump (DB-IP / IP2Location style). The file
+is memory-mapped and searched with a binary search over fixed-width records,
+so a lookup costs a few page reads and no network. ipinfo.io is only used as
+an optional fallback (GEOIP_REMOTE_FALLBACK) for addresses the file does not
+cover, and every answer goes through a bounded LRU cache with a TTL.
+
+File layout (all integers little-endian unless noted):
+
+    header   MAGIC, record count, offset of the string table
+    records  `count` x RECORD: start (16 bytes, big-endian), end (16 bytes,
+             big-endian), string offset (u32), string length (u16)
+    strings  UTF-8 "city<US>region<US>country" entries, shared between ranges
+
+IPv4 addresses are stored as IPv4-mapped IPv6 (::ffff:a.b.c.d) so both
+families live in one sorted address space.
+"""
+import ipaddress
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+from .http_client import get_client
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SIGEOIP1'
+HEADER = struct.Struct('<8sIQ')
+RECORD = struct.Struct('<16s16sIH')
+FIELD_SEPARATOR = '\x1f'
+
+DEFAULT_LOCATION = {"city": "Unknown", "country": "Unknown", "full": "Unknown Location"}
+
+
+def ip_key(ip):
+    """16-byte big-endian key for an address; IPv4 is mapped into ::ffff:0:0/96."""
+    address = ipaddress.ip_address(ip)
+    if address.version == 4:
+        address = ipaddress.IPv6Address(b'\x00' * 10 + b'\xff\xff' + address.packed)
+    return address.packed
+
+
+def make_location(city, region, country):
+    city = city or 'Unknown'
+    country = country or 'Unknown'
+    full_loc = ", ".join([p for p in (city, region, country) if p])
+    return {"city": city, "country": country, "full": full_loc}
+
+
+class GeoIPDatabase:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self._strings_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a SafeIMEI GeoIP file")
+        self.mtime = os.stat(path).st_mtime
+
+    def _record(self, i):
+        return RECORD.unpack_from(self._mmap, HEADER.size + i * RECORD.size)
+
+    def _start(self, i):
+        offset = HEADER.size + i * RECORD.size
+        return self._mmap[offset:offset + 16]
+
+    def lookup(self, ip):
+        """Return a location dict for `ip`, or None if no range covers it."""
+        key = ip_key(ip)
+        # Find the last range starting at or before the key.
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._start(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+        _, end, str_offset, str_length = self._record(lo - 1)
+        if key > end:
+            return None
+        offset = self._strings_offset + str_offset
+        city, region, country = self._mmap[offset:offset + str_length].decode('utf-8').split(FIELD_SEPARATOR)
+        return make_location(city, region, country)
+
+    def close(self):
+        self._mmap.close()
+
+
+def write_database(path, ranges):
+    """
+    Write a range file from an iterable of (start_ip, end_ip, city, region, country).
+
+    Ranges may arrive in any order; overlapping ranges are not merged.
+    """
+    strings = {}
+    string_blob = bytearray()
+    records = []
+    for start_ip, end_ip, city, region, country in ranges:
+        text = FIELD_SEPARATOR.join((city or '', region or '', country or ''))
+        if text not in strings:
+            encoded = text.encode('utf-8')
+            strings[text] = (len(string_blob), len(encoded))
+            string_blob += encoded
+        str_offset, str_length = strings[text]
+        records.append(RECORD.pack(ip_key(start_ip), ip_key(end_ip), str_offset, str_length))
+
+    # Records start with the big-endian start key, so byte order is address order.
+    records.sort()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(records), HEADER.size + len(records) * RECORD.size))
+        f.writelines(records)
+        f.write(string_blob)
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+class TTLCache:
+    """A small thread-safe LRU cache whose entries expire after `ttl` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_cache = TTLCache(settings.GEOIP_CACHE_SIZE, settings.GEOIP_CACHE_TTL)
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_database():
+    """The current range file, reopened when `build_geoip` replaces it."""
+    global _database
+    path = settings.GEOIP_DATABASE
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    if _database is None or _database.path != path or _database.mtime != mtime:
+        with _database_lock:
+            if _database is None or _database.path != path or _database.mtime != mtime:
+                try:
+                    _database = GeoIPDatabase(path)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not open GeoIP database {path}: {e}")
+                    return None
+                _cache.clear()
+    return _database
+
+
+def _remote_lookup(ip):
+    r = get_client('ipinfo').get(f"/{ip}/json")
+    if r.status_code == 200:
+        data = r.json()
+        return make_location(data.get('city', 'Unknown'), data.get('region', ''), data.get('country', 'Nigeria'))
+    return None
+
+
+def get_geo_location(ip, allow_remote=None):
+    """Retrieves geolocation data for an IP address."""
+    if ip == '127.0.0.1' or ip == 'localhost':
+        return {"city": "Local", "country": "Network", "full": "Local Test Network"}
+
+    try:
+        if ipaddress.ip_address(ip).is_private:
+            return {"city": "Local", "country": "Network", "full": "Local Network"}
+    except ValueError:
+        return DEFAULT_LOCATION
+
+    location = _cache.get(ip)
+    if location is not None:
+        return location
+
+    database = get_database()
+    if database is not None:
+        location = database.lookup(ip)
+
+    if allow_remote is None:
+        allow_remote = settings.GEOIP_REMOTE_FALLBACK
+    if location is None and allow_remote:
+        try:
+            location = _remote_lookup(ip) or DEFAULT_LOCATION
+        except Exception as e:
+            # Not cached, so the next sighting tries again.
+            logger.warning(f"GeoIP lookup failed for {ip}: {e}")
+            return DEFAULT_LOCATION
+
+    if location is None:
+        return DEFAULT_LOCATION
+    _cache.set(ip, location)
+    return location
@@ -0,0 +1,268 @@
+# portal/http_client.py
+"""
+Shared outbound HTTP client for third-party providers (Paystack, ipinfo).
+
+Each provider configured in OUTBOUND_HTTP gets one long-lived
+requests.Session, so TLS connections are pooled and reused across requests
+in a worker. Every call has strict connect/read timeouts, retries are capped
+by a per-provider retry budget, and a circuit breaker fails fast while a
+provider is degraded. Per-provider call counts, outcomes and latency are
+kept in memory (see `stats()`).
+
+    from .http_client import get_client
+    response = get_client('paystack').get('/transaction/verify/REF', headers=...)
+"""
+import logging
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+from .metrics import observe_outbound
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+
+DEFAULTS = {
+    'base_url': '',
+    'connect_timeout': 3.05,
+    'read_timeout': 10,
+    'retries': 2,
+    'retry_backoff': 0.2,
+    # Retries may add at most this fraction of extra calls on top of first tries.
+    'retry_budget_ratio': 0.2,
+    'pool_size': 10,
+    'failure_threshold': 5,
+    'reset_timeout': 30,
+}
+
+
+class OutboundError(Exception):
+    """A call to a third-party provider failed."""
+
+
+class CircuitOpenError(OutboundError):
+    """The provider is marked as degraded; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    for `reset_timeout` seconds, then lets a single trial call through
+    (half-open); its outcome closes or re-opens the circuit.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True
+            # Open, or half-open with the trial call still in flight
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+class RetryBudget:
+    """Each first try deposits `ratio` tokens; each retry spends one."""
+
+    def __init__(self, ratio, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = float(max_tokens)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class CallStats:
+    def __init__(self, provider=None):
+        self.provider = provider
+        self._lock = threading.Lock()
+        self.outcomes = {}
+        self.calls = 0
+        self.retries = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, outcome, seconds):
+        with self._lock:
+            self.calls += 1
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+        if self.provider:
+            observe_outbound(self.provider, outcome, seconds)
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'retries': self.retries,
+                'outcomes': dict(self.outcomes),
+                'avg_ms': round(1000 * self.total_seconds / self.calls, 2) if self.calls else 0.0,
+                'max_ms': round(1000 * self.max_seconds, 2),
+            }
+
+
+class OutboundClient:
+    def __init__(self, name, **options):
+        config = {**DEFAULTS, **options}
+        self.name = name
+        self.base_url = config['base_url'].rstrip('/')
+        self.timeout = (config['connect_timeout'], config['read_timeout'])
+        self.retries = config['retries']
+        self.retry_backoff = config['retry_backoff']
+        self.breaker = CircuitBreaker(config['failure_threshold'], config['reset_timeout'])
+        self.budget = RetryBudget(config['retry_budget_ratio'])
+        self.stats = CallStats(name)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config['pool_size'], max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, path, **kwargs):
+        """
+        Send a request and return the response.
+
+        5xx responses are returned after retries are exhausted; connection
+        errors and timeouts raise OutboundError. Non-idempotent requests are
+        only retried when the connection could not be established.
+        """
+        method = method.upper()
+        url = f"{self.base_url}{path}" if path.startswith('/') else path
+        kwargs.setdefault('timeout', self.timeout)
+
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.stats.record('short_circuited', 0.0)
+                raise CircuitOpenError(f"{self.name} is unavailable (circuit open)")
+
+            started = time.monotonic()
+            error = response = None
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                error = e
+            elapsed = time.monotonic() - started
+
+            if error is None and response.status_code < 500:
+                self.breaker.record_success()
+                self.stats.record('ok' if response.status_code < 400 else 'client_error', elapsed)
+                return response
+
+            self.breaker.record_failure()
+            if isinstance(error, requests.Timeout):
+                outcome = 'timeout'
+            elif error is not None:
+                outcome = 'connection_error'
+            else:
+                outcome = 'server_error'
+            self.stats.record(outcome, elapsed)
+
+            retryable = method in IDEMPOTENT_METHODS or _not_sent(error)
+            if attempt < self.retries and retryable and self.budget.try_spend():
+                attempt += 1
+                self.stats.record_retry()
+                time.sleep(self.retry_backoff * (2 ** (attempt - 1)))
+                continue
+
+            if error is not None:
+                raise OutboundError(f"{self.name} {method} {path} failed: {error}") from error
+            return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+
+def _not_sent(error):
+    """
+    True if `error` happened while connecting, so the request never reached
+    the provider. A plain ConnectionError can also be a reset after the body
+    was sent, which must not be repeated for a POST.
+    """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.ConnectionError) or not error.args:
+        return False
+    return isinstance(getattr(error.args[0], 'reason', None), NewConnectionError)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name):
+    """The shared client for a provider configured in OUTBOUND_HTTP."""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = OutboundClient(name, **settings.OUTBOUND_HTTP[name])
+                _clients[name] = client
+    return client
+
+
+def reset_clients():
+    """Drop all clients (used when OUTBOUND_HTTP changes, e.g. in tests)."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.session.close()
+        _clients.clear()
+
+
+@receiver(setting_changed)
+def _outbound_settings_changed(setting, **kwargs):
+    if setting == 'OUTBOUND_HTTP':
+        reset_clients()
+
+
+def stats():
+    return {name: client.stats.snapshot() for name, client in _clients.items()}
@@ -0,0 +1,141 @@
+# portal/imei_batch.py
+"""
+Helpers for the partner batch IMEI status API.
+
+IMEIs are read lazily from the request (a JSON list, or a CSV/NDJSON body or
+upload read line by line) and resolved in fixed-size chunks, so memory use
+stays bounded by IMEI_BATCH_CHUNK_SIZE however large the inventory is.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from .models import DeviceReport
+from .imei_index import stolen_index
+from .validators import validate_imei
+
+
+class BatchError(Exception):
+    """The submitted batch could not be read."""
+
+
+def _lines(stream):
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8-sig', errors='replace')
+        line = line.strip()
+        if line:
+            yield line
+
+
+def _imeis_from_csv(stream):
+    for row in csv.reader(_lines(stream)):
+        if not row:
+            continue
+        value = row[0].strip()
+        # Skip a header row such as "imei,brand,model"
+        if value.lower() == 'imei':
+            continue
+        yield value
+
+
+def _imeis_from_ndjson(stream):
+    for line in _lines(stream):
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield line
+            continue
+        if isinstance(item, dict):
+            item = item.get('imei', '')
+        yield str(item)
+
+
+def iter_submitted_imeis(request):
+    """
+    Return an iterable of raw IMEI strings from any supported request format.
+
+    JSON bodies are already in memory and come back as a list; CSV/NDJSON
+    bodies and uploads are read lazily.
+    """
+    content_type = request.content_type
+
+    if content_type == 'application/json':
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            raise BatchError("Request body is not valid JSON.")
+        imeis = payload.get('imeis') if isinstance(payload, dict) else payload
+        if not isinstance(imeis, list):
+            raise BatchError('Expected a JSON list or {"imeis": [...]}.')
+        return [str(imei) for imei in imeis]
+
+    if content_type == 'multipart/form-data':
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise BatchError("Attach the inventory as a 'file' field.")
+        if upload.name.lower().endswith(('.ndjson', '.jsonl')):
+            return _imeis_from_ndjson(upload)
+        return _imeis_from_csv(upload)
+
+    if content_type in ('application/x-ndjson', 'application/jsonl'):
+        return _imeis_from_ndjson(request)
+    if content_type in ('text/csv', 'text/plain'):
+        return _imeis_from_csv(request)
+
+    raise BatchError(f"Unsupported content type: {content_type or 'none'}.")
+
+
+def _resolve_chunk(chunk):
+    valid, results = [], []
+    for imei in chunk:
+        try:
+            validate_imei(imei)
+        except ValidationError as e:
+            results.append((imei, {'imei': imei, 'status': 'invalid', 'error': e.messages[0]}))
+            continue
+        valid.append(imei)
+        results.append((imei, None))
+
+    # The index rules out clean IMEIs; only probable hits reach the query.
+    candidates = {imei for imei in valid if stolen_index.contains(imei)}
+    stolen = set()
+    if candidates:
+        stolen = set(
+            DeviceReport.objects.filter(imei__in=candidates, status=DeviceReport.StatusChoices.STOLEN)
+            .values_list('imei', flat=True)
+        )
+
+    for imei, result in results:
+        yield result or {'imei': imei, 'status': 'stolen' if imei in stolen else 'safe'}
+
+
+def resolve_batch(imeis, chunk_size=None, max_items=None):
+    """
+    Yield one result dict per submitted IMEI, in submission order.
+
+    Stops with an error entry once max_items have been resolved. No sighting
+    alerts or geo lookups are made for batch checks.
+    """
+    chunk_size = chunk_size or settings.IMEI_BATCH_CHUNK_SIZE
+    max_items = max_items or settings.IMEI_BATCH_MAX_ITEMS
+    imeis = iter(imeis)
+    seen = 0
+    while True:
+        chunk = list(islice(imeis, min(chunk_size, max_items - seen)))
+        if not chunk:
+            break
+        seen += len(chunk)
+        yield from _resolve_chunk(chunk)
+        if seen >= max_items:
+            if next(imeis, None) is not None:
+                yield {'error': f"Batch limit of {max_items} IMEIs exceeded; remaining entries were not checked."}
+            break
+
+
+def to_ndjson(results):
+    for result in results:
+        yield json.dumps(result) + '\n'
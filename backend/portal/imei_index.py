@@ -0,0 +1,104 @@
+# portal/imei_index.py
+"""
+Per-worker in-memory index of stolen IMEIs.
+
+Most public checks are for devices that have never been reported, so the
+index keeps every stolen IMEI as a sorted array of 64-bit integers and answers
+"not stolen" with a binary search instead of a database round-trip. Positive
+hits are still confirmed against the database by the caller.
+
+Workers share nothing but the StolenIndexVersion row: every change to the set
+of stolen IMEIs bumps it, and each worker re-reads it at most once every
+STOLEN_INDEX_MAX_STALENESS seconds, rebuilding its array when it has moved.
+"""
+import bisect
+import threading
+import time
+from array import array
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from .models import DeviceReport, StolenIndexVersion
+
+
+def current_version():
+    return StolenIndexVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+def bump_version():
+    """Mark the stolen set as changed for every worker."""
+    if not StolenIndexVersion.objects.filter(pk=1).update(version=F('version') + 1):
+        _, created = StolenIndexVersion.objects.get_or_create(pk=1, defaults={'version': 1})
+        if not created:
+            StolenIndexVersion.objects.filter(pk=1).update(version=F('version') + 1)
+    # This worker does not need to wait for the staleness window. Invalidate
+    # again on commit in case another thread rebuilt from pre-commit data.
+    stolen_index.invalidate()
+    transaction.on_commit(stolen_index.invalidate)
+
+
+class StolenImeiIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._imeis = array('Q')
+        # IMEIs that are not plain 15-digit numbers (legacy or admin-entered rows)
+        self._irregular = frozenset()
+        self._version = None
+        self._checked_at = 0.0
+        self._dirty = True
+
+    def invalidate(self):
+        self._dirty = True
+
+    def __len__(self):
+        return len(self._imeis) + len(self._irregular)
+
+    def _is_fresh(self):
+        max_staleness = getattr(settings, 'STOLEN_INDEX_MAX_STALENESS', 5)
+        return not self._dirty and time.monotonic() - self._checked_at < max_staleness
+
+    def refresh(self):
+        if self._is_fresh():
+            return
+        with self._lock:
+            if self._is_fresh():
+                return
+            # Cleared before reading so an invalidation during the rebuild is not lost.
+            dirty, self._dirty = self._dirty, False
+            version = current_version()
+            if dirty or version != self._version:
+                self._rebuild()
+                self._version = version
+            self._checked_at = time.monotonic()
+
+    def _rebuild(self):
+        numbers, irregular = [], set()
+        stolen = DeviceReport.objects.filter(status=DeviceReport.StatusChoices.STOLEN)
+        for imei in stolen.values_list('imei', flat=True).iterator(chunk_size=10000):
+            if imei.isdigit() and len(imei) == 15:
+                numbers.append(int(imei))
+            else:
+                irregular.add(imei)
+        numbers.sort()
+        self._imeis = array('Q', numbers)
+        self._irregular = frozenset(irregular)
+
+    def contains(self, imei):
+        """
+        False means the IMEI is definitely not stolen (as of the last refresh).
+        True means it probably is and the caller should load the report.
+        """
+        if not imei:
+            return False
+        self.refresh()
+        if not (imei.isdigit() and len(imei) == 15):
+            return imei in self._irregular
+        imeis = self._imeis
+        value = int(imei)
+        i = bisect.bisect_left(imeis, value)
+        return i < len(imeis) and imeis[i] == value
+
+
+stolen_index = StolenImeiIndex()
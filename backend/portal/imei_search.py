@@ -0,0 +1,31 @@
+# portal/imei_search.py
+"""
+Partial-IMEI search for the agent report list.
+
+Agents usually type the first or last few digits they can read off a device.
+Instead of `imei__icontains` (LIKE '%...%', a full table scan), fragments of
+IMEI_SEARCH_MIN_INDEXED_DIGITS or more are matched as a prefix of `imei` or
+a prefix of `imei_reversed` (i.e. a suffix of the IMEI). Both are expressed
+as >= / < range conditions, which every backend answers from its B-tree index.
+Shorter or non-numeric fragments fall back to substring search.
+"""
+from django.conf import settings
+from django.db.models import Q
+
+
+def prefix_range(field, prefix):
+    """Q matching values of `field` that start with the digit string `prefix`."""
+    # ':' sorts right after '9', so this is the first string past the prefix.
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': upper})
+
+
+def search_reports(queryset, query):
+    query = (query or '').strip()
+    if not query:
+        return queryset
+    if query.isdigit() and len(query) >= settings.IMEI_SEARCH_MIN_INDEXED_DIGITS:
+        if len(query) == 15:
+            return queryset.filter(imei=query)
+        return queryset.filter(prefix_range('imei', query) | prefix_range('imei_reversed', query[::-1]))
+    return queryset.filter(imei__icontains=query)
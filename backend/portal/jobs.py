@@ -0,0 +1,160 @@
+# portal/jobs.py
+"""
+A small database-backed job queue.
+
+Views call `enqueue('job_name', **payload)` instead of doing slow work (SMTP,
+geo lookups) inline; `manage.py run_workers` claims and runs the jobs. Only
+the configured DATABASES are used, so it works the same on SQLite and
+Postgres without a broker.
+
+Claiming is a conditional UPDATE, so two workers can never run the same job
+at once. A claimed job is hidden for JOBS_VISIBILITY_TIMEOUT seconds; if its
+worker dies, the job becomes visible again and counts as a failed attempt.
+Failures are retried with exponential backoff until max_attempts, after which
+the job is dead-lettered (status Dead) for inspection in the admin.
+
+Every claim bumps `attempts`, so (status Running, attempts) identifies the
+lease a worker holds. Finishing or failing a job is conditional on it: a
+worker whose lease expired and was reclaimed leaves the job to its new owner.
+"""
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def job(name):
+    """Register a function as a job handler under `name`."""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, delay=None, max_attempts=None, **payload):
+    """
+    Queue `name` to run with `payload` as keyword arguments.
+
+    The payload must be JSON-serialisable. With JOBS_EAGER the job runs
+    immediately in-process instead (useful for local development).
+    """
+    if name not in _registry:
+        raise KeyError(f"Unknown job: {name}")
+
+    if settings.JOBS_EAGER:
+        try:
+            _registry[name](**payload)
+        except Exception as e:
+            logger.error(f"Eager job {name} failed: {e}")
+        return None
+
+    return Job.objects.create(
+        name=name,
+        payload=payload,
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        run_after=timezone.now() + (delay or timedelta()),
+    )
+
+
+def claim(limit, visibility_timeout=None):
+    """Claim up to `limit` runnable jobs for this worker and return their ids."""
+    now = timezone.now()
+    visibility_timeout = visibility_timeout or settings.JOBS_VISIBILITY_TIMEOUT
+    runnable = (
+        Q(status=Job.StatusChoices.QUEUED, run_after__lte=now)
+        | Q(status=Job.StatusChoices.RUNNING, locked_until__lte=now, attempts__lt=F('max_attempts'))
+    )
+    # Over-fetch a little; some candidates may be taken by other workers.
+    candidates = list(
+        Job.objects.filter(runnable).order_by('run_after').values_list('id', flat=True)[:limit * 2]
+    )
+
+    claimed = []
+    for job_id in candidates:
+        if len(claimed) >= limit:
+            break
+        updated = Job.objects.filter(runnable, pk=job_id).update(
+            status=Job.StatusChoices.RUNNING,
+            locked_until=now + timedelta(seconds=visibility_timeout),
+            attempts=F('attempts') + 1,
+        )
+        if updated:
+            claimed.append(job_id)
+    return claimed
+
+
+def backoff(attempts):
+    """Delay before the next try: exponential with jitter, capped."""
+    delay = settings.JOBS_RETRY_BASE_DELAY * (2 ** max(attempts - 1, 0))
+    delay = min(delay, settings.JOBS_RETRY_MAX_DELAY)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def execute(job_id):
+    """Run a claimed job and record the outcome. Returns True on success."""
+    try:
+        job_obj = Job.objects.get(pk=job_id, status=Job.StatusChoices.RUNNING)
+    except Job.DoesNotExist:
+        return False
+
+    handler = _registry.get(job_obj.name)
+    try:
+        if handler is None:
+            raise KeyError(f"No handler registered for job {job_obj.name}")
+        handler(**job_obj.payload)
+    except Exception as e:
+        _record_failure(job_obj, e)
+        return False
+
+    # Finished jobs are removed so the queue table only holds pending work.
+    deleted, _ = _held(job_obj).delete()
+    if not deleted:
+        logger.warning(f"Job {job_obj} finished after its lease was taken over; leaving it to the new owner.")
+    return True
+
+
+def _held(job_obj):
+    """The job's row, only while this worker's claim on it is still current."""
+    return Job.objects.filter(pk=job_obj.pk, status=Job.StatusChoices.RUNNING, attempts=job_obj.attempts)
+
+
+def _record_failure(job_obj, error):
+    job_obj.last_error = "".join(traceback.format_exception(error))[-4000:]
+    job_obj.locked_until = None
+    if job_obj.attempts >= job_obj.max_attempts:
+        job_obj.status = Job.StatusChoices.DEAD
+    else:
+        job_obj.status = Job.StatusChoices.QUEUED
+        job_obj.run_after = timezone.now() + backoff(job_obj.attempts)
+    updated = _held(job_obj).update(
+        status=job_obj.status,
+        run_after=job_obj.run_after,
+        locked_until=None,
+        last_error=job_obj.last_error,
+        updated_at=timezone.now(),
+    )
+    if not updated:
+        logger.warning(f"Job {job_obj} failed after its lease was taken over; not recording the failure: {error}")
+    elif job_obj.status == Job.StatusChoices.DEAD:
+        logger.error(f"Job {job_obj} dead-lettered after {job_obj.attempts} attempts: {error}")
+    else:
+        logger.warning(f"Job {job_obj} failed (attempt {job_obj.attempts}), retrying: {error}")
+
+
+def dead_letter_expired():
+    """Dead-letter running jobs whose lease expired on their final attempt."""
+    return Job.objects.filter(
+        status=Job.StatusChoices.RUNNING,
+        locked_until__lte=timezone.now(),
+        attempts__gte=F('max_attempts'),
+    ).update(status=Job.StatusChoices.DEAD, last_error="Visibility timeout expired on final attempt.")
@@ -0,0 +1,282 @@
+# portal/load_data.py
+"""
+Synthetic data at national scale, for load tests and benchmarks.
+
+`manage.py generate_load_data` drives this. Everything is derived from a
+seed, so the same command line produces the same rows, and rows are
+produced lazily and written in bounded chunks (one transaction each), so
+memory stays flat however many millions are asked for.
+
+Stolen reports can be given sightings, spread between the report date and
+the end of the range and clustered around the report's state, so the
+sighting history and hotspot pages have something realistic to show.
+
+Generated rows are recognisable and numbered: officers are users named
+`load.agent.0000042`, reports carry transaction refs like
+`LOAD-0000000042`. Append mode continues the numbering after the highest
+existing row, and report IMEIs are a fixed permutation of that number, so
+appended rows never collide with earlier ones.
+"""
+import datetime
+import random
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import reset_queries, transaction
+from django.utils import timezone
+
+from .models import (
+    DeviceReport, OfficerProfile, ProofBlob, ReportRollup, Sighting, SightingAlertWindow, SightingRollup, Station,
+)
+from .validators import luhn_check_digit
+
+STATES = [
+    "Abia", "Adamawa", "Akwa Ibom", "Anambra", "Bauchi", "Bayelsa", "Benue", "Borno",
+    "Cross River", "Delta", "Ebonyi", "Edo", "Ekiti", "Enugu", "Gombe", "Imo", "Jigawa",
+    "Kaduna", "Kano", "Katsina", "Kebbi", "Kogi", "Kwara", "Lagos", "Nasarawa", "Niger",
+    "Ogun", "Ondo", "Osun", "Oyo", "Plateau", "Rivers", "Sokoto", "Taraba", "Yobe",
+    "Zamfara", "FCT",
+]
+
+BRANDS_MODELS = {
+    "Tecno": ["Camon 20", "Spark 10", "Phantom X2", "Pop 7"],
+    "Infinix": ["Note 30", "Hot 30", "Zero Ultra", "Smart 7"],
+    "Samsung": ["Galaxy S23", "Galaxy A54", "Z Fold 5", "Galaxy M34"],
+    "Apple": ["iPhone 15 Pro", "iPhone 14", "iPhone SE", "iPhone 13"],
+    "itel": ["A70", "P40", "S23"],
+    "Xiaomi": ["Redmi Note 12", "Poco X5", "Redmi 12C"],
+    "Google": ["Pixel 8", "Pixel 7a"],
+}
+BRANDS = list(BRANDS_MODELS)
+# Roughly the Nigerian market: Transsion brands dominate
+BRAND_WEIGHTS = [30, 22, 18, 10, 10, 7, 3]
+
+STATUSES = [
+    DeviceReport.StatusChoices.STOLEN, DeviceReport.StatusChoices.RECOVERED,
+    DeviceReport.StatusChoices.PENDING, DeviceReport.StatusChoices.PAYMENT_PENDING,
+]
+STATUS_WEIGHTS = [70, 10, 15, 5]
+INCIDENT_TYPES = ["Snatching", "Robbery", "Burglary", "Lost", "Pickpocketing", "Other"]
+INCIDENT_WEIGHTS = [30, 25, 10, 20, 12, 3]
+COLORS = ["Black", "Silver", "Blue", "Gold", "White", "Graphite"]
+FIRST_NAMES = ["Ada", "Chinedu", "Aisha", "Tunde", "Ngozi", "Ibrahim", "Funmi", "Emeka", "Zainab", "Segun"]
+LAST_NAMES = ["Obi", "Okafor", "Bello", "Adeyemi", "Eze", "Musa", "Balogun", "Nwosu", "Abubakar", "Ojo"]
+
+OFFICER_PREFIX = 'load.agent.'
+REPORT_PREFIX = 'LOAD-'
+# Share of reports filed through the public form (no reporting agent)
+PUBLIC_SHARE = 0.3
+# Share of a device's sightings in the state it was stolen in
+LOCAL_SIGHTING_SHARE = 0.6
+TIP_SHARE = 0.1
+# First octets of Nigerian mobile and ISP ranges
+IP_PREFIXES = [41, 102, 105, 129, 154, 196, 197]
+
+# IMEI serials are (A * n + B) mod 10^12: a bijection, since A is coprime to 10.
+_SERIAL_SPACE = 10 ** 12
+_SERIAL_A = 7_919_492_183
+_SERIAL_B = 104_729_000_017
+
+
+def imei_for(number):
+    """The IMEI of generated report `number`; distinct for every number below 10^12."""
+    body = f"35{(_SERIAL_A * number + _SERIAL_B) % _SERIAL_SPACE:012d}"
+    return body + luhn_check_digit(body)
+
+
+def station_name(index):
+    state = STATES[index % len(STATES)]
+    if index < len(STATES):
+        return "Abuja FCT Command" if state == "FCT" else f"{state} State Command"
+    return f"{state} Division {index // len(STATES)}"
+
+
+def _next_number(queryset, field, prefix):
+    """One past the highest generated number, found with an index range scan."""
+    # Bumping the last character gives the first string after every `prefix...`
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    last = (queryset.filter(**{f"{field}__gte": prefix, f"{field}__lt": upper})
+            .order_by(f"-{field}").values_list(field, flat=True).first())
+    return int(last[len(prefix):]) + 1 if last else 0
+
+
+class LoadDataGenerator:
+    def __init__(self, seed=42, batch_size=5000, days=730, end_date=None, progress=None):
+        self.seed = seed
+        self.batch_size = batch_size
+        self.days = days
+        end_date = end_date or timezone.localdate()
+        self.end = timezone.make_aware(datetime.datetime.combine(end_date, datetime.time.max))
+        self.progress = progress or (lambda kind, done, total: None)
+
+    def rng(self, kind, start):
+        # One stream per kind and starting row: appending with the same seed
+        # continues rather than repeats.
+        return random.Random(f"{self.seed}:{kind}:{start}")
+
+    # ---- wipe ----
+
+    def wipe(self):
+        """
+        Delete all reports, agents and stations. Superusers are kept, and so
+        is any station a superuser's officer profile still points at.
+        """
+        # Raw deletes do not cascade: rows pointing at reports go first
+        self._delete_in_chunks('sightings', Sighting.objects.all(), raw=True)
+        self._delete_in_chunks('alert windows', SightingAlertWindow.objects.all(), raw=True)
+        self._delete_in_chunks('reports', DeviceReport.objects.all(), raw=True)
+        # Every report is gone, so nothing references a proof blob any more
+        ProofBlob.objects.update(ref_count=0)
+        self._delete_in_chunks('officers', User.objects.filter(is_superuser=False))
+        self._delete_in_chunks('report rollups', ReportRollup.objects.all(), raw=True)
+        self._delete_in_chunks('sighting rollups', SightingRollup.objects.all(), raw=True)
+        Station.objects.exclude(pk__in=OfficerProfile.objects.values('station_id')).delete()
+
+    def _delete_in_chunks(self, kind, queryset, raw=False):
+        model = queryset.model
+        deleted = 0
+        while True:
+            pks = list(queryset.order_by('pk').values_list('pk', flat=True)[:self.batch_size])
+            if not pks:
+                break
+            with transaction.atomic():
+                chunk = model.objects.filter(pk__in=pks)
+                if raw:
+                    # Skips the per-row delete signals; callers fix up what
+                    # they maintain (index version, blob refs, dashboards).
+                    chunk._raw_delete(chunk.db)
+                else:
+                    chunk.delete()
+            deleted += len(pks)
+            reset_queries()
+            self.progress(f"deleted {kind}", deleted, None)
+
+    # ---- stations ----
+
+    def ensure_stations(self, count):
+        """The ids of the first `count` stations, creating any that are missing."""
+        names = [station_name(i) for i in range(count)]
+        Station.objects.bulk_create(
+            [Station(name=name, location=STATES[i % len(STATES)]) for i, name in enumerate(names)],
+            batch_size=self.batch_size, ignore_conflicts=True,
+        )
+        ids = dict(Station.objects.filter(name__in=names).values_list('name', 'id'))
+        return [ids[name] for name in names]
+
+    # ---- officers ----
+
+    def create_officers(self, count, station_ids, password='password123'):
+        start = _next_number(User.objects, 'username', OFFICER_PREFIX)
+        # Hashing is deliberately slow; every generated agent shares one hash.
+        password_hash = make_password(password)
+        for first in range(start, start + count, self.batch_size):
+            numbers = range(first, min(first + self.batch_size, start + count))
+            rng = self.rng('officers', first)
+            with transaction.atomic():
+                users = [
+                    User(username=f"{OFFICER_PREFIX}{n:07d}", password=password_hash,
+                         email=f"agent{n}@load.safeimei.test",
+                         first_name=rng.choice(FIRST_NAMES), last_name=rng.choice(LAST_NAMES))
+                    for n in numbers
+                ]
+                User.objects.bulk_create(users)
+                # Not every backend returns primary keys from bulk inserts
+                user_ids = dict(User.objects.filter(username__in=[u.username for u in users])
+                                .values_list('username', 'id'))
+                OfficerProfile.objects.bulk_create([
+                    OfficerProfile(user_id=user_ids[u.username], station_id=station_ids[n % len(station_ids)])
+                    for n, u in zip(numbers, users)
+                ])
+            reset_queries()
+            self.progress('officers', numbers[-1] - start + 1, count)
+        return count
+
+    # ---- reports ----
+
+    def create_reports(self, count, station_ids):
+        start = _next_number(DeviceReport.objects, 'transaction_ref', REPORT_PREFIX)
+        officers = list(OfficerProfile.objects.filter(station_id__in=station_ids)
+                        .order_by('user_id').values_list('user_id', 'station_id'))
+        for first in range(start, start + count, self.batch_size):
+            numbers = range(first, min(first + self.batch_size, start + count))
+            rng = self.rng('reports', first)
+            with transaction.atomic():
+                DeviceReport.objects.bulk_create(
+                    [self.report(n, rng, station_ids, officers) for n in numbers]
+                )
+            reset_queries()
+            self.progress('reports', numbers[-1] - start + 1, count)
+        return count
+
+    def report(self, number, rng, station_ids, officers):
+        created_at = self.end - datetime.timedelta(seconds=rng.randrange(self.days * 86400))
+        incident_at = created_at - datetime.timedelta(minutes=rng.randrange(3 * 24 * 60))
+        brand = rng.choices(BRANDS, BRAND_WEIGHTS)[0]
+        if officers and rng.random() >= PUBLIC_SHARE:
+            reported_by, station_id = officers[rng.randrange(len(officers))]
+        else:
+            reported_by, station_id = None, station_ids[rng.randrange(len(station_ids))]
+        imei = imei_for(number)
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        return DeviceReport(
+            owner_full_name=f"{first_name} {last_name}",
+            owner_phone_number=f"080{rng.randrange(10 ** 8):08d}",
+            owner_email=f"{first_name.lower()}.{number}@load.safeimei.test" if rng.random() < 0.6 else None,
+            imei=imei,
+            imei_reversed=imei[::-1],
+            brand=brand,
+            model=rng.choice(BRANDS_MODELS[brand]),
+            color=rng.choice(COLORS),
+            incident_date=incident_at.date(),
+            incident_time=incident_at.time().replace(microsecond=0),
+            incident_type=rng.choices(INCIDENT_TYPES, INCIDENT_WEIGHTS)[0],
+            incident_location=f"{STATES[rng.randrange(len(STATES))]} (generated)",
+            transaction_ref=f"{REPORT_PREFIX}{number:010d}",
+            status=rng.choices(STATUSES, STATUS_WEIGHTS)[0],
+            reported_by_id=reported_by,
+            station_id=station_id,
+            created_at=created_at,
+        )
+
+    # ---- sightings ----
+
+    def create_sightings(self, per_report, after_pk=0):
+        """
+        Sightings for the stolen reports with pk > `after_pk`, `per_report`
+        on average (most devices few, some many). Returns how many were made.
+        """
+        states = dict(Station.objects.values_list('id', 'location'))
+        stolen = DeviceReport.objects.filter(status=DeviceReport.StatusChoices.STOLEN)
+        created = 0
+        while per_report > 0:
+            chunk = list(stolen.filter(pk__gt=after_pk).order_by('pk')
+                         .values_list('pk', 'station_id', 'created_at', 'transaction_ref')[:self.batch_size])
+            if not chunk:
+                break
+            # Seeded by report number rather than pk, which a wipe does not reset
+            rng = self.rng('sightings', chunk[0][3])
+            rows = [
+                self.sighting(report_id, states.get(station_id), reported_at, rng)
+                for report_id, station_id, reported_at, _ in chunk
+                for _ in range(round(rng.expovariate(1 / per_report)))
+            ]
+            with transaction.atomic():
+                Sighting.objects.bulk_create(rows, batch_size=self.batch_size)
+            created += len(rows)
+            after_pk = chunk[-1][0]
+            reset_queries()
+            self.progress('sightings', created, None)
+        return created
+
+    def sighting(self, report_id, state, reported_at, rng):
+        span = max(1, int((self.end - reported_at).total_seconds()))
+        if state not in STATES or rng.random() >= LOCAL_SIGHTING_SHARE:
+            state = STATES[rng.randrange(len(STATES))]
+        return Sighting(
+            report_id=report_id,
+            source=Sighting.SourceChoices.TIP if rng.random() < TIP_SHARE else Sighting.SourceChoices.CHECK,
+            ip=f"{rng.choice(IP_PREFIXES)}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}",
+            city=state,
+            country="Nigeria",
+            created_at=reported_at + datetime.timedelta(seconds=rng.randrange(span)),
+        )
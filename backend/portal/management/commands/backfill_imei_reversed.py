@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Max
+from django.db.models.functions import Reverse
+
+from portal.models import DeviceReport
+
+CHUNK_SIZE = 10000
+
+
+class Command(BaseCommand):
+    help = ('Fills DeviceReport.imei_reversed (used by IMEI suffix search) for reports saved before '
+            'the column existed or changed by queryset updates. Safe to re-run; only stale rows are written.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Reports per UPDATE, by id range.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = DeviceReport.objects.aggregate(last=Max('pk'))['last'] or 0
+        updated = 0
+        for start in range(0, last_id + 1, chunk_size):
+            updated += (
+                DeviceReport.objects.filter(pk__gte=start, pk__lt=start + chunk_size)
+                .exclude(imei_reversed=Reverse(F('imei')))
+                .update(imei_reversed=Reverse(F('imei')))
+            )
+        self.stdout.write(self.style.SUCCESS(f"Backfilled imei_reversed on {updated} reports."))
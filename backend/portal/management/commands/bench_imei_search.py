@@ -0,0 +1,68 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from portal.imei_search import search_reports
+from portal.models import DeviceReport, Station
+from portal.scratch_db import scratch_database
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks partial-IMEI search (indexed prefix/suffix vs. substring scan) '
+            'on a throwaway database at growing table sizes.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000',
+                            help='Comma-separated table sizes to measure at.')
+        parser.add_argument('--lookups', type=int, default=200, help='Indexed lookups per size.')
+        parser.add_argument('--scan-lookups', type=int, default=10, help='Substring-scan lookups per size.')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(s) for s in options['sizes'].split(','))
+        rng = random.Random(options['seed'])
+        imeis = [str(n) for n in rng.sample(range(10 ** 14, 10 ** 15), sizes[-1])]
+
+        with scratch_database():
+            station = Station.objects.create(name="Benchmark Command", location="Benchmark")
+            self.stdout.write(f"{'rows':>10} {'suffix (ms)':>12} {'prefix (ms)':>12} {'substring (ms)':>15}")
+            inserted = 0
+            for size in sizes:
+                self._insert(station, imeis[inserted:size])
+                inserted = size
+                sample = rng.sample(imeis[:size], options['lookups'])
+
+                suffix = self._time(search_reports, lambda imei: imei[-rng.randint(4, 6):], sample)
+                prefix = self._time(search_reports, lambda imei: imei[:rng.randint(6, 8)], sample)
+                # The previous implementation, for comparison
+                scan = self._time(
+                    lambda qs, query: qs.filter(imei__icontains=query),
+                    lambda imei: imei[-rng.randint(4, 6):],
+                    sample[:options['scan_lookups']],
+                )
+                self.stdout.write(f"{size:>10} {suffix:>12.3f} {prefix:>12.3f} {scan:>15.3f}")
+
+    def _insert(self, station, imeis, batch_size=5000):
+        today, now = timezone.now().date(), timezone.now().time()
+        for start in range(0, len(imeis), batch_size):
+            DeviceReport.objects.bulk_create([
+                DeviceReport(
+                    owner_full_name="Benchmark", owner_phone_number="0", imei=imei, imei_reversed=imei[::-1],
+                    brand="Brand", model="Model", incident_date=today, incident_time=now,
+                    incident_type="Robbery", transaction_ref=f"BENCH-{imei}", station=station,
+                )
+                for imei in imeis[start:start + batch_size]
+            ])
+
+    def _time(self, search, fragment_for, sample):
+        """Median milliseconds to run `search` for a fragment of each sampled IMEI."""
+        timings = []
+        for imei in sample:
+            query = fragment_for(imei)
+            started = time.perf_counter()
+            list(search(DeviceReport.objects.all(), query).values_list('pk', flat=True)[:50])
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,89 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portal.benchmarks import DEFAULT_THRESHOLD, BenchmarkError, compare, run_suite
+from portal.load_data import LoadDataGenerator
+from portal.scratch_db import scratch_database
+
+
+class Command(BaseCommand):
+    help = ('Benchmarks the hot portal views (IMEI checks, report submission, payment verification, '
+            'dashboard, report list) on a throwaway database of configurable size.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reports', type=int, default=100_000, help='Reports in the generated dataset.')
+        parser.add_argument('--officers', type=int, default=200)
+        parser.add_argument('--stations', type=int, default=37)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--iterations', type=int, default=200, help='Timed requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=20)
+        parser.add_argument('--alloc-iterations', type=int, default=20,
+                            help='Requests per scenario traced for allocations (0 to skip).')
+        parser.add_argument('--only', action='append', help='Run scenarios whose name contains this (repeatable).')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--baseline', help='Compare against results saved earlier with --output.')
+        parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Relative p50/p95 increase that counts as a regression.')
+        parser.add_argument('--fail-on-regression', action='store_true',
+                            help='Exit with an error if any scenario regressed (for CI).')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read baseline {options['baseline']}: {e}")
+
+        with scratch_database():
+            self.stdout.write(f"Generating {options['reports']:,} reports...")
+            generator = LoadDataGenerator(seed=options['seed'], batch_size=5_000)
+            station_ids = generator.ensure_stations(options['stations'])
+            generator.create_officers(options['officers'], station_ids)
+            generator.create_reports(options['reports'], station_ids)
+            try:
+                suite = run_suite(
+                    iterations=options['iterations'], warmup=options['warmup'],
+                    allocation_iterations=options['alloc_iterations'], only=options['only'],
+                )
+            except BenchmarkError as e:
+                raise CommandError(str(e))
+        suite['dataset'].update(officers=options['officers'], stations=options['stations'], seed=options['seed'])
+
+        self.stdout.write(f"\n{'scenario':<36} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8} {'alloc KiB':>10}")
+        for name, result in suite['results'].items():
+            alloc = '-' if result['alloc_peak_kib'] is None else f"{result['alloc_peak_kib']:.1f}"
+            self.stdout.write(
+                f"{name:<36} {result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+                f"{result['queries']:>8} {alloc:>10}"
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(suite, f, indent=2)
+            self.stdout.write(f"\nResults written to {options['output']}.")
+
+        if baseline is None:
+            return
+        if baseline.get('dataset', {}).get('reports') != suite['dataset']['reports']:
+            self.stdout.write(self.style.WARNING("Baseline was measured on a different dataset size."))
+        rows = compare(baseline, suite, options['threshold'])
+        self.stdout.write(f"\n{'scenario':<36} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8}")
+        for row in rows:
+            if row['status'] == 'new':
+                self.stdout.write(f"{row['view']:<36} (not in baseline)")
+                continue
+            changes = row['changes']
+            line = (f"{row['view']:<36} {changes['p50_ms']:>+8.1%} {changes['p95_ms']:>+8.1%} "
+                    f"{changes['p99_ms']:>+8.1%} {changes['queries']:>+8d}")
+            self.stdout.write(self.style.ERROR(line) if row['regressions'] else line)
+
+        regressed = [row['view'] for row in rows if row['regressions']]
+        if regressed and options['fail_on_regression']:
+            raise CommandError(f"{len(regressed)} scenario(s) regressed: {', '.join(regressed)}")
+        if regressed:
+            self.stdout.write(self.style.WARNING(f"{len(regressed)} scenario(s) regressed."))
+        else:
+            self.stdout.write(self.style.SUCCESS("No regressions against the baseline."))
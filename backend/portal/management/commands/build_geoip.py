@@ -0,0 +1,64 @@
+import csv
+import ipaddress
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from portal.geoip import write_database
+
+
+def parse_ip(value):
+    """Accept dotted/colon notation or the integer form used by IP2Location dumps."""
+    value = value.strip()
+    if value.isdigit():
+        number = int(value)
+        return ipaddress.IPv4Address(number) if number < 2 ** 32 else ipaddress.IPv6Address(number)
+    return ipaddress.ip_address(value)
+
+
+class Command(BaseCommand):
+    help = 'Builds the offline GeoIP range file from a CSV dump.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', required=True, help='Path to the CSV dump.')
+        parser.add_argument('--output', default=settings.GEOIP_DATABASE,
+                            help='Where to write the range file (defaults to GEOIP_DATABASE).')
+
+    def handle(self, *args, **options):
+        path = options['csv']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+
+        output = options['output']
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        skipped = []
+
+        def ranges():
+            with open(path, newline='', encoding='utf-8') as f:
+                reader = csv.reader(f)
+                columns = None
+                for line_number, row in enumerate(reader, start=1):
+                    if not row:
+                        continue
+                    if line_number == 1 and not row[0].strip()[:1].isdigit() and ':' not in row[0]:
+                        # Named header: start_ip,end_ip,city,region,country (any order)
+                        columns = {name.strip().lower(): i for i, name in enumerate(row)}
+                        continue
+                    try:
+                        if columns:
+                            start, end, city, region, country = (
+                                row[columns[name]] if name in columns else ''
+                                for name in ('start_ip', 'end_ip', 'city', 'region', 'country')
+                            )
+                        else:
+                            # DB-IP lite layout: start, end, continent, country, region, city, ...
+                            start, end, _, country, region, city = row[:6]
+                        yield str(parse_ip(start)), str(parse_ip(end)), city, region, country
+                    except (ValueError, IndexError, KeyError):
+                        skipped.append(line_number)
+
+        count = write_database(output, ranges())
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"Skipped {len(skipped)} malformed rows (first: line {skipped[0]})."))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} IP ranges to {output}."))
@@ -0,0 +1,36 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from portal.rollups import compact
+
+
+class Command(BaseCommand):
+    help = ('Recomputes the station analytics rollups from the reports and sightings, one station '
+            'at a time. Run after bulk loads and periodically to correct drift.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Only recompute the last N days (default: everything).')
+        parser.add_argument('--station', type=int, action='append', dest='stations',
+                            help='Only this station id (repeatable).')
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days'] is not None:
+            if options['days'] < 1:
+                raise CommandError("--days must be at least 1.")
+            since = timezone.now() - datetime.timedelta(days=options['days'] - 1)
+
+        started = time.monotonic()
+        report_rows, sighting_rows = compact(since=since, station_ids=options['stations'], progress=self.progress)
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {report_rows} report and {sighting_rows} sighting rollup rows "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
+
+    def progress(self, done, total):
+        if done == total or done % 50 == 0:
+            self.stdout.write(f"  stations: {done} / {total}")
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count
+
+from portal.models import DeviceReport
+
+
+class Command(BaseCommand):
+    help = ('Gives reports that share a transaction_ref (old random PAY-xxxxxx references could collide) a '
+            'unique one, so the portal_report_unique_txref constraint can be applied. Run before migrate; '
+            'the earliest report keeps each reference. Safe to re-run.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='List the changes without saving them.')
+
+    def handle(self, *args, **options):
+        if DeviceReport._meta.db_table not in connection.introspection.table_names():
+            self.stdout.write("No reports table yet; nothing to do.")
+            return
+
+        # Only id and transaction_ref are read or written, so this works on
+        # the schema from before the migration that adds the constraint.
+        duplicated = (DeviceReport.objects.values('transaction_ref').annotate(n=Count('id'))
+                      .filter(n__gt=1).values_list('transaction_ref', flat=True))
+        changed = 0
+        with transaction.atomic():
+            for ref in list(duplicated):
+                pks = list(DeviceReport.objects.filter(transaction_ref=ref).order_by('pk').values_list('pk', flat=True))
+                for pk in pks[1:]:
+                    new_ref = f"{ref}-R{pk}"
+                    self.stdout.write(f"Report #{pk}: {ref} -> {new_ref}")
+                    if not options['dry_run']:
+                        DeviceReport.objects.filter(pk=pk).update(transaction_ref=new_ref)
+                    changed += 1
+        verb = "Would reassign" if options['dry_run'] else "Reassigned"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {changed} duplicate transaction references."))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from portal.query_audit import EXPECTED_SCANS, audit_views
+from portal.scratch_db import scratch_database
+
+
+class Command(BaseCommand):
+    help = ('Drives every portal view on a throwaway database, runs EXPLAIN on each query '
+            'they issue, and flags full table scans.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--show-plans', action='store_true', help='Print every plan, not just scans.')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit with an error if any unexpected full scan is found (for CI).')
+
+    def handle(self, *args, **options):
+        with scratch_database():
+            results = audit_views()
+
+        unexpected = 0
+        for result in results:
+            flagged = [p for p in result['plans'] if p['scans']]
+            self.stdout.write(f"{result['view']}: {result['queries']} queries, {len(result['plans'])} explained")
+            for plan in result['plans']:
+                if not (plan['scans'] or options['show_plans']):
+                    continue
+                for table in plan['scans']:
+                    if table in EXPECTED_SCANS:
+                        self.stdout.write(f"  full scan of {table} (expected: {EXPECTED_SCANS[table]})")
+                    else:
+                        unexpected += 1
+                        self.stdout.write(self.style.ERROR(f"  FULL SCAN of {table}"))
+                self.stdout.write(f"    {plan['sql']}")
+                for line in plan['plan']:
+                    self.stdout.write(f"      {line}")
+            if not flagged and not options['show_plans']:
+                self.stdout.write(self.style.SUCCESS("  no full scans"))
+
+        if unexpected and options['fail_on_scan']:
+            raise CommandError(f"{unexpected} unexpected full table scan(s).")
+        summary = f"{unexpected} unexpected full table scan(s)." if unexpected else "No unexpected full table scans."
+        self.stdout.write(self.style.WARNING(summary) if unexpected else self.style.SUCCESS(summary))
@@ -0,0 +1,108 @@
+import os
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from portal.derivatives import delete_derivatives
+from portal.models import DeviceReport, ProofBlob
+from portal.proof_storage import PROOF_FIELDS, blob_prefix, is_blob_name, proof_storage
+
+CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ('Deletes content-addressed proof blobs that no report references '
+            '(and that are older than PROOF_GC_GRACE_SECONDS).')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=None,
+                            help='Only delete blobs untouched for this many seconds.')
+        parser.add_argument('--recount', action='store_true',
+                            help='Recompute reference counts from the reports first '
+                                 '(after bulk updates that bypassed signals).')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted.')
+
+    def handle(self, *args, **options):
+        grace = settings.PROOF_GC_GRACE_SECONDS if options['grace'] is None else options['grace']
+        cutoff = time.time() - grace
+        dry_run = options['dry_run']
+
+        if options['recount']:
+            self.recount(dry_run)
+
+        # Blobs whose last reference went away, and files saved for a report
+        # that was never created (no row at all)
+        orphans = [
+            name for name in ProofBlob.objects.filter(ref_count__lte=0).values_list('name', flat=True).iterator()
+            if self.expired(name, cutoff)
+        ]
+        known = set(ProofBlob.objects.values_list('name', flat=True))
+        orphans += [name for name in self.stored_blobs() if name not in known and self.expired(name, cutoff)]
+
+        deleted = freed = 0
+        for start in range(0, len(orphans), CHUNK_SIZE):
+            chunk = orphans[start:start + CHUNK_SIZE]
+            in_use = self.referenced(chunk)
+            for name in chunk:
+                if name in in_use:
+                    continue
+                if not dry_run and name in known:
+                    # Drop the row first, and only if still unreferenced, so a
+                    # blob re-used since the scan keeps its file.
+                    blob = ProofBlob.objects.filter(name=name).first()
+                    if blob is None or not ProofBlob.objects.filter(pk=blob.pk, ref_count__lte=0).delete()[0]:
+                        continue
+                    delete_derivatives(blob)
+                freed += self.remove(name, dry_run)
+                deleted += 1
+
+        verb = "Would delete" if dry_run else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {deleted} orphaned blob(s), {freed / (1024 * 1024):.1f} MB."))
+
+    def recount(self, dry_run):
+        counts = Counter()
+        for names in DeviceReport.objects.values_list(*PROOF_FIELDS).iterator():
+            counts.update(name for name in names if is_blob_name(name))
+        changed = 0
+        for blob in ProofBlob.objects.iterator():
+            if blob.ref_count != counts.get(blob.name, 0):
+                changed += 1
+                if not dry_run:
+                    ProofBlob.objects.filter(pk=blob.pk).update(ref_count=counts.get(blob.name, 0))
+            counts.pop(blob.name, None)
+        for name, count in counts.items():
+            changed += 1
+            if not dry_run:
+                size = proof_storage.size(name) if proof_storage.exists(name) else 0
+                ProofBlob.objects.get_or_create(name=name, defaults={'size': size, 'ref_count': count})
+        self.stdout.write(f"Recount: {changed} blob(s) corrected.")
+
+    def stored_blobs(self):
+        root = proof_storage.path(blob_prefix())
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                yield os.path.relpath(path, proof_storage.location).replace(os.sep, '/')
+
+    def expired(self, name, cutoff):
+        try:
+            return os.path.getmtime(proof_storage.path(name)) < cutoff
+        except FileNotFoundError:
+            return True
+
+    def referenced(self, names):
+        """Which of `names` a report still points at (counts can lag after bulk updates)."""
+        query = Q(*[(f"{field}__in", names) for field in PROOF_FIELDS], _connector=Q.OR)
+        return {name for row in DeviceReport.objects.filter(query).values_list(*PROOF_FIELDS) for name in row}
+
+    def remove(self, name, dry_run):
+        try:
+            size = proof_storage.size(name)
+        except FileNotFoundError:
+            return 0
+        if not dry_run:
+            proof_storage.delete(name)
+        return size
@@ -0,0 +1,72 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portal.dashboard import invalidate_station
+from portal.imei_index import bump_version
+from portal.load_data import LoadDataGenerator
+from portal.models import DeviceReport
+from portal.rollups import compact
+
+
+class Command(BaseCommand):
+    help = ('Generates a large, deterministic dataset (stations, agents, reports, sightings) for load testing. '
+            'Appends by default; --wipe clears existing portal data first.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reports', type=int, default=1_000_000)
+        parser.add_argument('--officers', type=int, default=2_000)
+        parser.add_argument('--stations', type=int, default=37,
+                            help='Stations to spread data over (37 state commands, then divisions).')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5_000, help='Rows per insert and transaction.')
+        parser.add_argument('--days', type=int, default=730, help='Spread reports over this many days.')
+        parser.add_argument('--end-date', type=datetime.date.fromisoformat, default=None,
+                            help='Last day of the spread (YYYY-MM-DD, defaults to today).')
+        parser.add_argument('--sightings-per-report', type=float, default=2.0,
+                            help='Average sightings per new stolen report (0 for none).')
+        parser.add_argument('--wipe', action='store_true',
+                            help='Delete all reports, non-superuser accounts and stations first.')
+
+    def handle(self, *args, **options):
+        if options['stations'] < 1:
+            raise CommandError("--stations must be at least 1.")
+        self._last_report = 0
+        generator = LoadDataGenerator(
+            seed=options['seed'], batch_size=options['batch_size'], days=options['days'],
+            end_date=options['end_date'], progress=self.progress,
+        )
+        started = time.monotonic()
+
+        if options['wipe']:
+            self.stdout.write("Wiping existing data...")
+            generator.wipe()
+
+        station_ids = generator.ensure_stations(options['stations'])
+        self.stdout.write(f"{len(station_ids)} stations ready.")
+        generator.create_officers(options['officers'], station_ids)
+        last_pk = DeviceReport.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        generator.create_reports(options['reports'], station_ids)
+        sightings = generator.create_sightings(options['sightings_per_report'], after_pk=last_pk)
+
+        # bulk inserts skip model signals, so tell the IMEI index workers and
+        # the dashboard cache directly, and rebuild the analytics rollups.
+        bump_version()
+        for station_id in station_ids:
+            invalidate_station(station_id)
+        self.stdout.write("Recomputing analytics rollups...")
+        compact(station_ids=station_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {options['officers']} agents, {options['reports']} reports and {sightings} sightings "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
+
+    def progress(self, kind, done, total):
+        # At most every two seconds, plus the final chunk
+        now = time.monotonic()
+        if now - self._last_report < 2 and done != total:
+            return
+        self._last_report = now
+        self.stdout.write(f"  {kind}: {done:,}" + (f" / {total:,} ({done / total:.0%})" if total else ""))
@@ -0,0 +1,107 @@
+import codecs
+import os
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from portal.models import ReportImport, Station
+from portal.report_import import FORMATS, DecodedLines, ReportImporter, format_for, write_rejections
+
+
+class Command(BaseCommand):
+    help = ('Imports a historical theft registry (CSV with a header row, or NDJSON) into a station, '
+            'streaming the file in chunks. Rejected rows are listed with their reasons.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="The registry file, or '-' for standard input.")
+        parser.add_argument('--station', help='Station id or name the reports belong to.')
+        parser.add_argument('--format', choices=FORMATS, default=None,
+                            help='Input format (default: from the file extension, else csv).')
+        parser.add_argument('--encoding', default='utf-8',
+                            help='Text encoding of the file, e.g. cp1252 for Windows spreadsheets (default: utf-8). '
+                                 'Rows that are not valid in it are rejected.')
+        parser.add_argument('--agent', help='Username recorded as the reporting agent.')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='Rows per transaction (default: IMPORT_CHUNK_SIZE).')
+        parser.add_argument('--rejections', metavar='PATH',
+                            help='Write the rejected rows to this CSV file.')
+        parser.add_argument('--resume', type=int, metavar='IMPORT_ID',
+                            help='Continue an interrupted import of the same file after its last committed row.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        try:
+            codecs.lookup(options['encoding'])
+        except LookupError:
+            raise CommandError(f"Unknown encoding {options['encoding']!r}.")
+        if options['resume']:
+            report_import = ReportImport.objects.filter(pk=options['resume']).first()
+            if report_import is None:
+                raise CommandError(f"No import #{options['resume']}.")
+            if report_import.status == ReportImport.StatusChoices.DONE:
+                raise CommandError(f"Import #{report_import.pk} has already finished.")
+        else:
+            report_import = ReportImport.objects.create(
+                station=self.station(options['station']),
+                uploaded_by=self.agent(options['agent']),
+                source_name='stdin' if path == '-' else os.path.basename(path),
+                format=format_for(path, options['format']),
+                encoding=options['encoding'],
+            )
+        report_import.status = ReportImport.StatusChoices.RUNNING
+        report_import.save(update_fields=['status'])
+
+        started = time.monotonic()
+        self.chunks = 0
+        importer = ReportImporter(report_import, chunk_size=options['chunk_size'], progress=self.progress)
+        try:
+            if path == '-':
+                importer.run(DecodedLines(sys.stdin.buffer, report_import.encoding))
+            else:
+                with open(path, 'rb') as binary:
+                    importer.run(DecodedLines(binary, report_import.encoding))
+        except (Exception, KeyboardInterrupt) as e:
+            report_import.status = ReportImport.StatusChoices.FAILED
+            report_import.error = str(e)[:1000] or type(e).__name__
+            report_import.save(update_fields=['status', 'error'])
+            raise CommandError(
+                f"Import #{report_import.pk} stopped after row {report_import.rows_done}: {report_import.error}. "
+                f"Re-run with --resume {report_import.pk} to continue."
+            )
+        importer.finish()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Import #{report_import.pk}: {report_import.imported} reports imported, "
+            f"{report_import.rejected} rows rejected in {time.monotonic() - started:.1f}s."
+        ))
+        if options['rejections']:
+            with open(options['rejections'], 'w', newline='', encoding='utf-8') as out:
+                write_rejections(report_import, out)
+            self.stdout.write(f"Rejected rows written to {options['rejections']}.")
+
+    def station(self, value):
+        if not value:
+            raise CommandError("--station is required.")
+        station = (Station.objects.filter(pk=int(value)).first() if value.isdigit()
+                   else Station.objects.filter(name__iexact=value).first())
+        if station is None:
+            raise CommandError(f"No station {value!r}.")
+        return station
+
+    def agent(self, username):
+        if not username:
+            return None
+        user = User.objects.filter(username=username).first()
+        if user is None:
+            raise CommandError(f"No user {username!r}.")
+        return user
+
+    def progress(self, report_import):
+        self.chunks += 1
+        if self.chunks % 50:
+            return
+        self.stdout.write(
+            f"  row {report_import.rows_done}: {report_import.imported} imported, {report_import.rejected} rejected"
+        )
@@ -0,0 +1,76 @@
+import csv
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from portal.tac import write_database
+
+# Header names used by GSMA TAC database exports and their common derivatives,
+# in order of preference.
+TAC_COLUMNS = ('tac', 'type allocation code')
+BRAND_COLUMNS = ('standardised brand name', 'brand name', 'brand', 'manufacturer (or) applicant', 'manufacturer')
+MODEL_COLUMNS = ('standardised marketing name', 'marketing name', 'model name', 'model', 'name')
+
+
+def find_column(columns, names):
+    for name in names:
+        if name in columns:
+            return columns[name]
+    return None
+
+
+class Command(BaseCommand):
+    help = 'Builds the TAC (device model) file from a GSMA-style TAC CSV export.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--csv', required=True, help='Path to the TAC export (comma, semicolon, tab or pipe separated).')
+        parser.add_argument('--output', default=settings.TAC_DATABASE,
+                            help='Where to write the TAC file (defaults to TAC_DATABASE).')
+
+    def handle(self, *args, **options):
+        path = options['csv']
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist.")
+
+        with open(path, newline='', encoding='utf-8-sig') as f:
+            header_line = f.readline()
+        try:
+            dialect = csv.Sniffer().sniff(header_line, delimiters=',;|\t')
+        except csv.Error:
+            dialect = csv.excel
+        header = next(csv.reader([header_line], dialect), [])
+        columns = {name.strip().lower(): i for i, name in enumerate(header)}
+        tac_col = find_column(columns, TAC_COLUMNS)
+        brand_col = find_column(columns, BRAND_COLUMNS)
+        model_col = find_column(columns, MODEL_COLUMNS)
+        if tac_col is None or brand_col is None or model_col is None:
+            raise CommandError("The CSV needs a header with TAC, brand and model (or marketing name) columns.")
+
+        output = options['output']
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        skipped = []
+
+        def entries():
+            with open(path, newline='', encoding='utf-8-sig') as f:
+                reader = csv.reader(f, dialect)
+                next(reader, None)
+                for line_number, row in enumerate(reader, start=2):
+                    if not row:
+                        continue
+                    try:
+                        tac = row[tac_col].strip()
+                        brand, model = row[brand_col].strip(), row[model_col].strip()
+                    except IndexError:
+                        skipped.append(line_number)
+                        continue
+                    # Spreadsheets drop the leading zeros of TACs like 01234567
+                    if not tac.isdigit() or len(tac) > 8 or not brand:
+                        skipped.append(line_number)
+                        continue
+                    yield tac.zfill(8), brand, model
+
+        count = write_database(output, entries())
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"Skipped {len(skipped)} malformed rows (first: line {skipped[0]})."))
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} TACs to {output}."))
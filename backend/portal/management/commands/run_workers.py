@@ -0,0 +1,102 @@
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+# portal.jobs is imported lazily: spawned pool processes import this module
+# to find their entry points before Django has been set up.
+
+
+def _run_job(job_id):
+    from portal import jobs
+    try:
+        return jobs.execute(job_id)
+    finally:
+        close_old_connections()
+
+
+def _init_process(settings_module):
+    # Children are spawned (not forked) so they never share the parent's
+    # database connections; they need their own Django setup.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
+    import django
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs (emails, geo lookups) on a thread or process pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pool', choices=['thread', 'process'], default=settings.JOBS_WORKER_POOL)
+        parser.add_argument('--concurrency', type=int, default=settings.JOBS_WORKER_CONCURRENCY)
+        parser.add_argument('--poll-interval', type=float, default=settings.JOBS_POLL_INTERVAL,
+                            help='Seconds to sleep when the queue is empty.')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once no runnable jobs are left instead of polling forever.')
+
+    def handle(self, *args, **options):
+        from portal import jobs
+
+        concurrency = max(options['concurrency'], 1)
+        poll_interval = options['poll_interval']
+        self.stopping = False
+        previous_handlers = {sig: signal.signal(sig, self._stop) for sig in (signal.SIGTERM, signal.SIGINT)}
+
+        if options['pool'] == 'process':
+            executor = ProcessPoolExecutor(
+                max_workers=concurrency,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_process,
+                initargs=(os.environ.get('DJANGO_SETTINGS_MODULE', 'safeimei_project.settings'),),
+            )
+        else:
+            executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='job-worker')
+
+        self.stdout.write(f"Job workers started ({options['pool']} pool, concurrency {concurrency}).")
+        in_flight = set()
+        done_count = failed_count = 0
+        try:
+            while not self.stopping:
+                jobs.dead_letter_expired()
+                free = concurrency - len(in_flight)
+                claimed = jobs.claim(free) if free else []
+                for job_id in claimed:
+                    in_flight.add(executor.submit(_run_job, job_id))
+
+                if not in_flight:
+                    if options['burst']:
+                        break
+                    time.sleep(poll_interval)
+                    continue
+
+                finished, in_flight = wait(
+                    in_flight, timeout=None if len(in_flight) >= concurrency else poll_interval,
+                    return_when=FIRST_COMPLETED
+                )
+                for future in finished:
+                    try:
+                        ok = future.result()
+                    except Exception as e:
+                        ok = False
+                        self.stderr.write(f"Worker crashed: {e}")
+                    if ok:
+                        done_count += 1
+                    else:
+                        failed_count += 1
+        finally:
+            # Let running jobs finish; anything unfinished is picked up again
+            # once its visibility timeout expires.
+            executor.shutdown(wait=True)
+            connections.close_all()
+            for sig, handler in previous_handlers.items():
+                signal.signal(sig, handler)
+
+        self.stdout.write(self.style.SUCCESS(f"Job workers stopped: {done_count} succeeded, {failed_count} failed."))
+
+    def _stop(self, signum, frame):
+        self.stopping = True
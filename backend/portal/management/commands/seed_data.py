@@ -4,6 +4,10 @@ from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
 from django.db import transaction
 from portal.models import Station, OfficerProfile, DeviceReport
+from portal.imei_index import bump_version
+from portal.load_data import LoadDataGenerator
+from portal.rollups import compact
+from portal.validators import luhn_check_digit
 
 class Command(BaseCommand):
     help = 'Seeds the database with realistic demo data for the SafeIMEI project, covering all Nigerian states.'
@@ -11,11 +15,11 @@ class Command(BaseCommand):
     @transaction.atomic
     def handle(self, *args, **kwargs):
         self.stdout.write("Deleting old data...")
-        # Clean up existing data to ensure a fresh start
-        DeviceReport.objects.all().delete()
+        # Clean up existing data to ensure a fresh start. The wipe skips the
+        # per-report delete signals, which would decrement rollups that the
+        # bulk-created reports never incremented.
         OfficerProfile.objects.all().delete()
-        Station.objects.all().delete()
-        User.objects.filter(is_superuser=False).delete()
+        LoadDataGenerator().wipe()
 
         self.stdout.write("Creating new data...")
 
@@ -80,13 +84,15 @@ class Command(BaseCommand):
             model = random.choice(brands_models[brand])
             reporting_officer = random.choice(officers)
 
-            # Generate a random 15-digit IMEI
-            imei = ''.join([str(random.randint(0, 9)) for _ in range(15)])
+            # Generate a random 15-digit IMEI with a valid check digit
+            imei = ''.join([str(random.randint(0, 9)) for _ in range(14)])
+            imei += luhn_check_digit(imei)
 
             report = DeviceReport(
                 owner_full_name=f"Victim Name {i+1}",
                 owner_phone_number=f"080{random.randint(10000000, 99999999)}",
                 imei=imei,
+                imei_reversed=imei[::-1],
                 brand=brand,
                 model=model,
                 color=random.choice(["Black", "Silver", "Blue", "Gold", "White", "Graphite"]),
@@ -106,6 +112,10 @@ class Command(BaseCommand):
             reports_to_create.append(report)
 
         DeviceReport.objects.bulk_create(reports_to_create)
+        # bulk_create skips model signals, so tell the IMEI index workers and
+        # the analytics rollups directly.
+        bump_version()
+        compact(station_ids=[station.pk for station in stations])
         self.stdout.write(self.style.SUCCESS(f"Successfully created {len(reports_to_create)} device reports."))
 
         self.stdout.write(self.style.SUCCESS("\nDatabase seeding complete!"))
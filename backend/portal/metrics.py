@@ -0,0 +1,180 @@
+# portal/metrics.py
+"""
+Prometheus metrics for the portal.
+
+MetricsMiddleware times every request and counts the database queries it
+issues; outbound calls (Paystack, ipinfo through http_client, and email
+sends) are timed where they are made. Everything is labelled by the URL name
+from portal/urls.py ("home", "dashboard", ...) and by outcome, and served as
+Prometheus text from /metrics.
+
+    safeimei_http_request_duration_seconds{view, method, outcome}
+    safeimei_db_queries_per_request{view}
+    safeimei_db_duration_seconds{view}          time spent in queries per request
+    safeimei_outbound_request_duration_seconds{provider, outcome}
+    safeimei_rate_limited_total{route, layer}   requests refused with 429
+
+Under gunicorn each worker keeps its own numbers. Set
+PROMETHEUS_MULTIPROC_DIR to a directory shared by the workers and each one
+writes its metrics there; /metrics then aggregates all of them, whichever
+worker answers. gunicorn.conf.py clears the directory on start and retires
+the files of exited workers.
+
+Needs prometheus_client; without it the middleware does nothing and
+/metrics answers 503.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+KNOWN_METHODS = frozenset(['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'])
+
+
+class MetricsUnavailable(Exception):
+    """prometheus_client is not installed."""
+
+
+class Metrics:
+    def __init__(self, prometheus_client):
+        Histogram = prometheus_client.Histogram
+        self.request_duration = Histogram(
+            'safeimei_http_request_duration_seconds', 'Time to produce a response, by URL name.',
+            ['view', 'method', 'outcome'], buckets=LATENCY_BUCKETS,
+        )
+        self.db_queries = Histogram(
+            'safeimei_db_queries_per_request', 'Database queries issued per request.',
+            ['view'], buckets=QUERY_COUNT_BUCKETS,
+        )
+        self.db_duration = Histogram(
+            'safeimei_db_duration_seconds', 'Time spent in database queries per request.',
+            ['view'], buckets=LATENCY_BUCKETS,
+        )
+        self.outbound_duration = Histogram(
+            'safeimei_outbound_request_duration_seconds', 'Calls to third-party providers.',
+            ['provider', 'outcome'], buckets=LATENCY_BUCKETS,
+        )
+        self.rate_limited = prometheus_client.Counter(
+            'safeimei_rate_limited', 'Requests refused by the rate limiter, by the layer that refused them.',
+            ['route', 'layer'],
+        )
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """The process-wide metric objects (registered once)."""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                try:
+                    import prometheus_client
+                except ImportError as e:
+                    raise MetricsUnavailable("prometheus_client is not installed") from e
+                _metrics = Metrics(prometheus_client)
+    return _metrics
+
+
+def _enabled_metrics():
+    if not settings.METRICS_ENABLED:
+        return None
+    try:
+        return get_metrics()
+    except MetricsUnavailable:
+        return None
+
+
+def observe_outbound(provider, outcome, seconds):
+    metrics = _enabled_metrics()
+    if metrics is not None:
+        metrics.outbound_duration.labels(provider, outcome).observe(seconds)
+
+
+def observe_rate_limited(route, layer):
+    metrics = _enabled_metrics()
+    if metrics is not None:
+        metrics.rate_limited.labels(route, layer).inc()
+
+
+@contextmanager
+def timed_outbound(provider):
+    """Time a block that calls `provider`; it counts as an error if it raises."""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        observe_outbound(provider, outcome, time.perf_counter() - started)
+
+
+class QueryTimer:
+    """execute_wrapper that counts queries and adds up their duration."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Records latency and database work per request. Put it first in MIDDLEWARE."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = _enabled_metrics()
+        if metrics is None:
+            return self.get_response(request)
+
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        # URL names only, so label values stay a small fixed set
+        view = (match.view_name if match else None) or 'unresolved'
+        if view == 'metrics':
+            return response
+        method = request.method if request.method in KNOWN_METHODS else 'other'
+        outcome = f"{response.status_code // 100}xx"
+        metrics.request_duration.labels(view, method, outcome).observe(elapsed)
+        metrics.db_queries.labels(view).observe(timer.count)
+        metrics.db_duration.labels(view).observe(timer.seconds)
+        return response
+
+
+def render():
+    """(body, content type) of the current metrics, across processes when configured."""
+    get_metrics()
+    import prometheus_client
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
@@ -2,6 +2,9 @@
 
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .proof_storage import get_proof_storage
 
 class Station(models.Model):
     name = models.CharField(max_length=200, unique=True)
@@ -16,6 +19,12 @@ class OfficerProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     station = models.ForeignKey(Station, on_delete=models.PROTECT)
 
+    class Meta:
+        indexes = [
+            # Sighting alerts look up a station's agents (user ids in order)
+            models.Index(fields=['station', 'user'], name='portal_officer_station_user'),
+        ]
+
     def __str__(self):
         return self.user.username
 
@@ -25,6 +34,7 @@ class DeviceReport(models.Model):
         RECOVERED = 'Recovered', 'Recovered'
         PENDING = 'Pending', 'Pending Review'
         PAYMENT_PENDING = 'Payment Pending', 'Awaiting Payment'
+        REJECTED = 'Rejected', 'Rejected'
 
     # Step 1: Owner Info
     owner_full_name = models.CharField(max_length=255)
@@ -34,6 +44,9 @@ class DeviceReport(models.Model):
 
     # Step 2: Device Info
     imei = models.CharField(max_length=15, unique=True, db_index=True)
+    # The IMEI reversed, so suffix searches ("last 4-6 digits") become indexed
+    # prefix range scans. Kept in sync by save(); bulk inserts must set it.
+    imei_reversed = models.CharField(max_length=15, db_index=True, editable=False, default='')
     brand = models.CharField(max_length=100)
     model = models.CharField(max_length=100)
     color = models.CharField(max_length=50, blank=True, null=True)
@@ -47,12 +60,17 @@ class DeviceReport(models.Model):
 
     # Step 4: Proofs & Verification (UPDATED)
     # We replaced 'owner_id_proof' with 'police_report_image'
-    police_report_image = models.FileField(upload_to='proofs/police_reports/', blank=True, null=True)
-    device_carton_photo = models.FileField(upload_to='proofs/cartons/', blank=True, null=True)
-    device_receipt = models.FileField(upload_to='proofs/receipts/', blank=True, null=True)
+    # Stored by content hash and shared between reports (see portal/proof_storage.py)
+    police_report_image = models.FileField(upload_to='proofs/police_reports/', storage=get_proof_storage, blank=True, null=True)
+    device_carton_photo = models.FileField(upload_to='proofs/cartons/', storage=get_proof_storage, blank=True, null=True)
+    device_receipt = models.FileField(upload_to='proofs/receipts/', storage=get_proof_storage, blank=True, null=True)
     
     # New: OCR Status
     ocr_verification_status = models.BooleanField(default=False, help_text="True if OCR verified the documents")
+    # Filled in by the background OCR job (see portal/ocr.py)
+    ocr_confidence = models.FloatField(blank=True, null=True)
+    ocr_details = models.JSONField(default=dict, blank=True)
+    ocr_checked_at = models.DateTimeField(blank=True, null=True)
 
     # Step 5: Final
     transaction_ref = models.CharField(max_length=100)
@@ -61,8 +79,269 @@ class DeviceReport(models.Model):
     # Metadata
     reported_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     station = models.ForeignKey(Station, on_delete=models.PROTECT)
+    # A default rather than auto_now_add, so bulk loads can keep historical dates
+    created_at = models.DateTimeField(default=timezone.now, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Agent report list: keyset pagination per station, newest first
+            models.Index(fields=['station', '-created_at', '-id'], name='portal_report_station_feed'),
+            # Dashboard status tiles and status filters within a station
+            models.Index(fields=['station', 'status'], name='portal_report_station_status'),
+            # Public IMEI checks and the stolen-IMEI index rebuild only ever
+            # look at blacklisted devices
+            models.Index(
+                fields=['imei'],
+                condition=models.Q(status='Stolen'),
+                name='portal_report_stolen_imei',
+            ),
+        ]
+        constraints = [
+            # Payment verification looks reports up by their Paystack reference
+            models.UniqueConstraint(fields=['transaction_ref'], name='portal_report_unique_txref'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.imei_reversed = (self.imei or '')[::-1]
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'imei' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'imei_reversed'}
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"Report for IMEI: {self.imei} ({self.status})"
+
+
+class StolenIndexVersion(models.Model):
+    # Single-row counter bumped whenever the set of stolen IMEIs changes.
+    # Each worker compares it against the version of its in-memory index
+    # (see portal/imei_index.py) to decide when to rebuild.
+    version = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Stolen index v{self.version}"
+
+
+class Job(models.Model):
+    """
+    A unit of background work (emails, geo lookups, ...) picked up by
+    `manage.py run_workers`. See portal/jobs.py.
+    """
+    class StatusChoices(models.TextChoices):
+        QUEUED = 'Queued', 'Queued'
+        RUNNING = 'Running', 'Running'
+        DEAD = 'Dead', 'Dead Letter'
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=StatusChoices.choices, default=StatusChoices.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+
+    # Not eligible to run before this time (used for retry backoff)
+    run_after = models.DateTimeField(default=timezone.now)
+    # While running, the job is hidden from other workers until this time
+    locked_until = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='portal_job_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+
+
+class PaymentEvent(models.Model):
+    """
+    A Paystack webhook event, stored once per event id so that retried or
+    duplicated deliveries are only acted on the first time.
+    See portal/payments.py.
+    """
+    event_id = models.CharField(max_length=100, unique=True)
+    event = models.CharField(max_length=50)
+    reference = models.CharField(max_length=100, db_index=True, blank=True)
+    payload = models.JSONField(default=dict)
+    # Why the event did not change a report (unknown reference, wrong amount, ...)
+    note = models.CharField(max_length=255, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.event} {self.reference} ({self.event_id})"
+
+
+class ProofBlob(models.Model):
+    """
+    A content-addressed proof file and how many report fields point at it.
+    Unreferenced blobs are removed by `manage.py gc_proofs`.
+    """
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.IntegerField(default=0)
+    # Downscaled copies for the review page (see portal/derivatives.py)
+    thumbnail = models.CharField(max_length=255, blank=True)
+    preview = models.CharField(max_length=255, blank=True)
+    derivatives_error = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], condition=models.Q(ref_count__lte=0), name='portal_proofblob_orphans'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} refs)"
+
+
+class SightingAlertWindow(models.Model):
+    """
+    The coalescing window for sighting alerts about one IMEI to one
+    recipient. The first sighting in a window is emailed at once; later ones
+    collect in `pending` and go out as one digest when the window closes.
+    See portal/alerts.py.
+    """
+    class KindChoices(models.TextChoices):
+        OWNER = 'owner', 'Owner'
+        AGENT = 'agent', 'Agent'
+
+    imei = models.CharField(max_length=15)
+    recipient = models.EmailField()
+    kind = models.CharField(max_length=10, choices=KindChoices.choices)
+    report = models.ForeignKey(DeviceReport, on_delete=models.CASCADE, related_name='alert_windows')
+    window_ends = models.DateTimeField()
+    # Sightings waiting for the digest: [{'seen_at', 'ip', 'location'}, ...]
+    pending = models.JSONField(default=list, blank=True)
+    # Sightings since the last digest, including those beyond the listed ones
+    pending_count = models.PositiveIntegerField(default=0)
+    # Whether a sighting_digest job is queued for the pending sightings
+    digest_queued = models.BooleanField(default=False)
+    # The sighting that opened the window, until its alert has been sent
+    opening = models.JSONField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['imei', 'recipient', 'kind'], name='portal_alert_window_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} alerts for {self.imei} to {self.recipient}"
+
+
+class Sighting(models.Model):
+    """
+    A stolen device's IMEI being checked or reported in a tip, for the
+    report's sighting history. Written in batches by portal/sightings.py.
+    """
+    class SourceChoices(models.TextChoices):
+        CHECK = 'check', 'IMEI check'
+        TIP = 'tip', 'Anonymous tip'
+
+    report = models.ForeignKey(DeviceReport, on_delete=models.CASCADE, related_name='sightings')
+    source = models.CharField(max_length=10, choices=SourceChoices.choices)
+    ip = models.GenericIPAddressField(blank=True, null=True)
+    # Approximate, from the local GeoIP ranges
+    city = models.CharField(max_length=100, blank=True)
+    country = models.CharField(max_length=100, blank=True)
+    # When it happened, not when the batch was written
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Newest-first history per report (keyset pagination)
+            models.Index(fields=['report', 'created_at'], name='portal_sighting_report_time'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_source_display()} of report #{self.report_id} at {self.created_at}"
+
+
+class ReportRollup(models.Model):
+    """
+    Reports per station, day, brand, status and incident type, kept current
+    as reports change and rebuilt by `manage.py compact_rollups`.
+    See portal/rollups.py.
+    """
+    station = models.ForeignKey(Station, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    brand = models.CharField(max_length=100)
+    status = models.CharField(max_length=20)
+    incident_type = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['station', 'day', 'brand', 'status', 'incident_type'],
+                                    name='portal_report_rollup_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.station_id} {self.day} {self.brand}/{self.status}/{self.incident_type}: {self.count}"
+
+
+class SightingRollup(models.Model):
+    """Sightings per station (of the report), day and city. See portal/rollups.py."""
+    station = models.ForeignKey(Station, on_delete=models.CASCADE, related_name='+')
+    day = models.DateField()
+    city = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['station', 'day', 'city'], name='portal_sighting_rollup_key'),
+        ]
+
+    def __str__(self):
+        return f"{self.station_id} {self.day} {self.city}: {self.count}"
+
+
+class ReportImport(models.Model):
+    """
+    A bulk import of historical theft records into a station, from an
+    uploaded file or `manage.py import_reports`. See portal/report_import.py.
+    """
+    class StatusChoices(models.TextChoices):
+        QUEUED = 'Queued', 'Queued'
+        RUNNING = 'Running', 'Running'
+        DONE = 'Done', 'Done'
+        FAILED = 'Failed', 'Failed'
+
+    station = models.ForeignKey(Station, on_delete=models.CASCADE, related_name='imports')
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    # Uploads only; the command reads its file in place
+    file = models.FileField(upload_to='imports/', blank=True)
+    source_name = models.CharField(max_length=255)
+    format = models.CharField(max_length=10)
+    encoding = models.CharField(max_length=20, default='utf-8')
+    status = models.CharField(max_length=20, choices=StatusChoices.choices, default=StatusChoices.QUEUED)
+    # Last input row processed; an interrupted import resumes after it
+    rows_done = models.PositiveIntegerField(default=0)
+    imported = models.PositiveIntegerField(default=0)
+    rejected = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"{self.source_name} into {self.station_id} ({self.status})"
+
+
+class ReportImportRejection(models.Model):
+    """An input row that an import could not turn into a report, and why."""
+    report_import = models.ForeignKey(ReportImport, on_delete=models.CASCADE, related_name='rejections')
+    row_number = models.PositiveIntegerField()
+    imei = models.CharField(max_length=64, blank=True)
+    reason = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['report_import', 'row_number'], name='portal_import_rejection_row'),
+        ]
+
     def __str__(self):
-        return f"Report for IMEI: {self.imei} ({self.status})"
\ No newline at end of file
+        return f"Row {self.row_number}: {self.reason}"
@@ -0,0 +1,240 @@
+# portal/ocr.py
+"""
+OCR verification of uploaded proof documents.
+
+After a public report is saved, the `verify_report_documents` job reads the
+police report and the purchase receipt, pulls every 15-digit run out of the
+recognised text, and checks the claimed IMEI against them. The outcome is
+written to `ocr_verification_status`, with a confidence score and
+per-document details in `ocr_details`.
+
+Recognition is CPU-bound and slow (seconds per page), so documents are
+analysed on a pool of OCR_PROCESSES worker processes rather than in the job
+worker's thread; with OCR_PROCESSES = 0 they are analysed inline.
+
+Engines are pluggable. OCR_ENGINE is an alias from ENGINES or a dotted path
+to an OcrEngine subclass, constructed with OCR_ENGINE_OPTIONS:
+
+    class MyEngine(OcrEngine):
+        def recognize(self, path):
+            return [("IMEI 490154203237518", 0.97)]
+"""
+import logging
+import multiprocessing
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, contextmanager
+from importlib import import_module
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ENGINES = {
+    'fake': 'portal.ocr.FakeOcrEngine',
+    'tesseract': 'portal.ocr.TesseractEngine',
+}
+
+DOCUMENT_FIELDS = ('police_report_image', 'device_receipt')
+
+# 15 digits, optionally split by the spaces or dashes receipts print them with
+_CANDIDATE = re.compile(r'(?<!\d)(?:\d[ \-]?){14}\d(?!\d)')
+
+
+class OcrUnavailable(Exception):
+    """The engine cannot run here (missing binary or library, unsupported file)."""
+
+
+class OcrEngine:
+    def __init__(self, **options):
+        self.options = options
+
+    def recognize(self, path):
+        """Return the text of the document at `path` as [(line, confidence 0..1)]."""
+        raise NotImplementedError
+
+
+class FakeOcrEngine(OcrEngine):
+    """
+    Deterministic stand-in for tests and benchmarks: the "recognised" text is
+    the file's printable content, always with the same confidence. Set the
+    `delay` option (seconds) to simulate recognition cost.
+    """
+
+    def recognize(self, path):
+        with open(path, 'rb') as f:
+            text = f.read().decode('latin-1')
+        if self.options.get('delay'):
+            time.sleep(self.options['delay'])
+        confidence = self.options.get('confidence', 0.99)
+        return [(line, confidence) for line in text.splitlines() if line.strip()]
+
+
+class TesseractEngine(OcrEngine):
+    """Tesseract via pytesseract; PDFs are rasterised with pypdfium2."""
+
+    def recognize(self, path):
+        try:
+            import pytesseract
+            from PIL import Image
+        except ImportError as e:
+            raise OcrUnavailable(f"Tesseract OCR is not installed ({e.name})") from e
+
+        lines = []
+        for image in self._pages(path, Image):
+            try:
+                data = pytesseract.image_to_data(
+                    image, lang=self.options.get('lang', 'eng'), output_type=pytesseract.Output.DICT
+                )
+            except (pytesseract.TesseractNotFoundError, OSError) as e:
+                # Missing tesseract binary or language data: retrying will not help
+                raise OcrUnavailable(f"Tesseract could not run: {e}") from e
+            words = {}
+            for i, word in enumerate(data['text']):
+                if word.strip() and float(data['conf'][i]) >= 0:
+                    key = (data['block_num'][i], data['par_num'][i], data['line_num'][i])
+                    words.setdefault(key, []).append((word, float(data['conf'][i]) / 100))
+            for line in words.values():
+                lines.append((' '.join(w for w, _ in line), min(c for _, c in line)))
+        return lines
+
+    def _pages(self, path, Image):
+        with open(path, 'rb') as f:
+            is_pdf = f.read(5) == b'%PDF-'
+        if not is_pdf:
+            yield Image.open(path)
+            return
+        try:
+            import pypdfium2
+        except ImportError as e:
+            raise OcrUnavailable("Reading PDFs needs pypdfium2") from e
+        pdf = pypdfium2.PdfDocument(path)
+        try:
+            for index in range(min(len(pdf), self.options.get('max_pages', 3))):
+                yield pdf[index].render(scale=self.options.get('pdf_scale', 300 / 72)).to_pil()
+        finally:
+            pdf.close()
+
+
+def load_engine(name, options=None):
+    module_path, _, class_name = ENGINES.get(name, name).rpartition('.')
+    return getattr(import_module(module_path), class_name)(**(options or {}))
+
+
+def find_candidates(lines):
+    """Distinct 15-digit strings in recognised text, with their best confidence."""
+    found = {}
+    for text, confidence in lines:
+        for match in _CANDIDATE.finditer(text):
+            digits = re.sub(r'\D', '', match.group())
+            found[digits] = max(confidence, found.get(digits, 0.0))
+    return found
+
+
+def analyse_document(engine_name, engine_options, path, imei):
+    """
+    Runs in an OCR worker process: recognise one document and compare its
+    candidates with the claimed IMEI. Returns a JSON-serialisable dict.
+    """
+    try:
+        candidates = find_candidates(load_engine(engine_name, engine_options).recognize(path))
+    except OcrUnavailable as e:
+        return {'error': str(e), 'match': False, 'confidence': None, 'candidates': []}
+
+    nearest = min((sum(a != b for a, b in zip(c, imei)) for c in candidates), default=None)
+    return {
+        'match': imei in candidates,
+        'confidence': candidates.get(imei),
+        'candidates': sorted(candidates),
+        # Digits differing from the claimed IMEI in the closest candidate;
+        # 1-2 usually means a misread rather than a different device.
+        'nearest_distance': nearest,
+    }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: job workers are threaded, and forking a threaded process
+            # can copy held locks into the child.
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.OCR_PROCESSES,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+@contextmanager
+def local_path(field_file):
+    """A filesystem path for a stored file, copying it out of remote storage if needed."""
+    try:
+        path = field_file.path
+    except NotImplementedError:
+        path = None
+    if path:
+        yield path
+        return
+    suffix = os.path.splitext(field_file.name)[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+        with field_file.open('rb') as source:
+            shutil.copyfileobj(source, tmp)
+        tmp.flush()
+        yield tmp.name
+
+
+def verify_report(report_id):
+    """Analyse a report's documents and store the outcome on the report."""
+    # Imported here: OCR worker processes import this module to unpickle
+    # analyse_document and never set up Django's app registry.
+    from .models import DeviceReport
+
+    report = DeviceReport.objects.filter(pk=report_id).first()
+    if report is None:
+        return None
+
+    engine_name, engine_options = settings.OCR_ENGINE, settings.OCR_ENGINE_OPTIONS
+    with ExitStack() as stack:
+        paths = {
+            field: stack.enter_context(local_path(getattr(report, field)))
+            for field in DOCUMENT_FIELDS if getattr(report, field)
+        }
+        if settings.OCR_PROCESSES:
+            futures = {
+                field: get_pool().submit(analyse_document, engine_name, engine_options, path, report.imei)
+                for field, path in paths.items()
+            }
+            documents = {field: future.result(timeout=settings.OCR_TIMEOUT) for field, future in futures.items()}
+        else:
+            documents = {
+                field: analyse_document(engine_name, engine_options, path, report.imei)
+                for field, path in paths.items()
+            }
+
+    # Verified only if every uploaded document shows the claimed IMEI
+    verified = bool(documents) and all(doc['match'] for doc in documents.values())
+    report.ocr_verification_status = verified
+    report.ocr_confidence = min(doc['confidence'] for doc in documents.values()) if verified else None
+    report.ocr_details = {'engine': engine_name, 'documents': documents}
+    report.ocr_checked_at = timezone.now()
+    report.save(update_fields=['ocr_verification_status', 'ocr_confidence', 'ocr_details', 'ocr_checked_at'])
+    logger.info(f"OCR for report {report_id}: {'verified' if verified else 'not verified'}")
+    return report
@@ -0,0 +1,103 @@
+# portal/payments.py
+"""
+Paystack payment confirmation.
+
+Paystack POSTs every transaction event to the webhook with an
+`x-paystack-signature` header: the HMAC-SHA512 of the raw body keyed with
+our secret key. Verified events are stored once per event id (PaymentEvent)
+and a successful charge moves its report from PAYMENT_PENDING to PENDING,
+so confirmation no longer depends on the payer's browser returning to
+`verify_payment_view`.
+"""
+import hashlib
+import hmac
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+
+from .jobs import enqueue
+from .models import DeviceReport, PaymentEvent
+
+logger = logging.getLogger(__name__)
+
+
+def sign(body):
+    return hmac.new(settings.PAYSTACK_SECRET_KEY.encode(), body, hashlib.sha512).hexdigest()
+
+
+def verify_signature(body, signature):
+    return bool(signature) and hmac.compare_digest(sign(body), signature)
+
+
+def event_id(payload):
+    """
+    Paystack events carry no id of their own; the event name plus the
+    transaction id identifies a delivery (retries resend the same pair).
+    """
+    data = payload.get('data') or {}
+    return f"{payload.get('event')}:{data.get('id') or data.get('reference')}"
+
+
+def mark_report_paid(reference, amount=None):
+    """
+    Move the report for `reference` from PAYMENT_PENDING to PENDING and send
+    the receipt email. Returns (report, note); report is None if nothing
+    changed and note says why.
+    """
+    with transaction.atomic():
+        report = (
+            DeviceReport.objects.select_for_update().select_related('station')
+            .filter(transaction_ref=reference).first()
+        )
+        if report is None:
+            return None, "unknown reference"
+        if report.status != DeviceReport.StatusChoices.PAYMENT_PENDING:
+            return None, f"report already {report.status}"
+        if amount is not None:
+            try:
+                paid = int(amount)
+            except (TypeError, ValueError):
+                # Recorded, not raised: a 500 would have Paystack redeliver it forever
+                return None, f"invalid amount {amount!r}"
+            if paid < settings.PAYSTACK_REPORT_AMOUNT:
+                return None, f"amount {amount} below {settings.PAYSTACK_REPORT_AMOUNT}"
+
+        report.status = DeviceReport.StatusChoices.PENDING
+        report.save()
+
+    try:
+        subject = f"SafeIMEI Report Received - {report.transaction_ref}"
+        message = f"Dear {report.owner_full_name},\n\nPayment received. Your report for IMEI {report.imei} is now PENDING VERIFICATION at our {report.station.name} center."
+        enqueue('send_email', subject=subject, message=message, recipient_list=[report.owner_email])
+    except Exception as e:
+        logger.error(f"Failed to queue payment receipt for {reference}: {e}")
+    return report, ""
+
+
+def record_event(payload):
+    """
+    Store a verified webhook event and act on it. Returns the PaymentEvent,
+    or None if this event was already received.
+    """
+    data = payload.get('data') or {}
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                event = PaymentEvent.objects.create(
+                    event_id=event_id(payload),
+                    event=payload.get('event', ''),
+                    reference=data.get('reference') or '',
+                    payload=payload,
+                )
+        except IntegrityError:
+            logger.info(f"Duplicate Paystack event {event_id(payload)} ignored")
+            return None
+
+        if event.event == 'charge.success' and data.get('status') == 'success':
+            _, event.note = mark_report_paid(event.reference, data.get('amount'))
+        else:
+            event.note = "ignored event"
+        if event.note:
+            event.save(update_fields=['note'])
+    return event
@@ -0,0 +1,77 @@
+# portal/proof_storage.py
+"""
+Content-addressed storage for proof documents.
+
+Proofs are stored under PROOF_BLOB_PREFIX by the SHA-256 of their content
+(proofs/blobs/ab/cd/abcd....pdf), whatever name they were uploaded with, so
+the same document uploaded again (e.g. when a payer retries a failed
+checkout) reuses the existing file instead of adding a copy.
+
+Which reports use which blob is counted in ProofBlob, kept up to date by the
+DeviceReport signals. Blobs nobody references are deleted by
+`manage.py gc_proofs` once they are older than PROOF_GC_GRACE_SECONDS; a
+re-upload of an existing blob refreshes its mtime so it is not collected
+between being saved and its report being created.
+"""
+import hashlib
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+PROOF_FIELDS = ('police_report_image', 'device_carton_photo', 'device_receipt')
+
+
+def blob_prefix():
+    return settings.PROOF_BLOB_PREFIX.strip('/') + '/'
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(blob_prefix())
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+
+    def blob_name(self, digest, original_name):
+        extension = os.path.splitext(original_name)[1].lower()
+        return f"{blob_prefix()}{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+    def digest(self, content):
+        # Files from ValidatingUploadHandler were hashed as they streamed in.
+        digest = getattr(content, 'sha256', None)
+        if digest:
+            return digest
+        hasher = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            hasher.update(chunk)
+        content.seek(0)
+        return hasher.hexdigest()
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        target = self.blob_name(self.digest(content), name)
+        if self.exists(target):
+            # Keep a blob that is about to be referenced again out of GC.
+            os.utime(self.path(target))
+            return target
+        return self._save(target, content)
+
+    def save_named(self, name, content):
+        """Store `content` under `name` itself, replacing any existing file (for derived files)."""
+        if self.exists(name):
+            self.delete(name)
+        return super().save(name, content)
+
+
+def get_proof_storage():
+    return proof_storage
+
+
+proof_storage = ContentAddressedStorage()
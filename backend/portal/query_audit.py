@@ -0,0 +1,246 @@
+# portal/query_audit.py
+"""
+Query-plan audit for the portal views.
+
+Drives every portal view through the test client against a small fixture
+dataset, captures the SQL each one issues, and runs EXPLAIN on it. Plans that
+read a whole table are flagged, so a missing index shows up before the table
+is big enough for anyone to notice it in production.
+
+Used by `manage.py explain_queries` (on a throwaway database) and by the
+test suite.
+"""
+import json
+import re
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import DeviceReport, OfficerProfile, ReportImport, ReportImportRejection, Station
+from .pagination import encode_cursor
+from .payments import sign
+from .testing import StubServer
+
+# Tables that are small by design, where reading every row is the right plan.
+EXPECTED_SCANS = {
+    'portal_station': 'the verification-centre dropdown lists every station',
+}
+
+EXPLAINABLE = ('SELECT', 'UPDATE', 'DELETE')
+
+# Scenarios answered without touching the database (a page render, a refused
+# request, in-memory lookups); every other scenario must issue queries.
+QUERY_FREE = {'home_view (GET)', 'imei_batch_view (no API key)', 'tac_lookup_view', 'metrics_view'}
+
+# SQLite: "SCAN portal_devicereport" (no index at all). Older versions say
+# "SCAN TABLE ...". "SCAN ... USING INDEX" walks an index in order and is not
+# flagged. PostgreSQL: "Seq Scan on portal_devicereport".
+_SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+_POSTGRES_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+SAFE_IMEI = '356938035643809'
+STOLEN_IMEI = '490154203237518'
+PENDING_IMEI = '356938035643817'
+PAID_REF = 'PAY-AUDIT-PAID'
+PARTNER_KEY = 'audit-partner-key'
+METRICS_TOKEN = 'audit-metrics-token'
+IMPORT_IMEI = '353918054321688'
+
+
+def explain(sql):
+    """The plan for `sql` as a list of lines."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # Tiny fixture tables make sequential scans the cheapest plan;
+            # forbid them so a Seq Scan means no index could be used at all.
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                cursor.execute(f'EXPLAIN {sql}')
+                return [row[0] for row in cursor.fetchall()]
+            finally:
+                cursor.execute('RESET enable_seqscan')
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def full_scans(plan):
+    """Names of the tables a plan reads in full."""
+    if connection.vendor == 'postgresql':
+        return [table for line in plan for table in _POSTGRES_SCAN.findall(line)]
+    tables = []
+    for line in plan:
+        match = _SQLITE_SCAN.match(line.strip())
+        if match and match.group(1) != 'CONSTANT':
+            tables.append(match.group(1))
+    return tables
+
+
+def create_fixtures():
+    """A station with an officer and one report in each interesting state."""
+    station = Station.objects.create(name="Query Audit Command", location="Audit")
+    Station.objects.create(name="Query Audit Division", location="Audit")
+    officer = User.objects.create_user(username='query-audit-officer', password=None)
+    OfficerProfile.objects.create(user=officer, station=station)
+
+    now = timezone.now()
+    common = {
+        'owner_full_name': "Audit Owner", 'owner_phone_number': "0", 'owner_email': "owner@audit.test",
+        'brand': "Tecno", 'model': "Spark 10", 'incident_date': now.date(), 'incident_time': now.time(),
+        'incident_type': "Robbery", 'station': station,
+    }
+    stolen = DeviceReport.objects.create(
+        imei=STOLEN_IMEI, transaction_ref='PAY-AUDIT-STOLEN', status=DeviceReport.StatusChoices.STOLEN, **common
+    )
+    pending = DeviceReport.objects.create(
+        imei=PENDING_IMEI, transaction_ref='PAY-AUDIT-PENDING', status=DeviceReport.StatusChoices.PENDING, **common
+    )
+    DeviceReport.objects.create(
+        imei='356938035643825', transaction_ref=PAID_REF,
+        status=DeviceReport.StatusChoices.PAYMENT_PENDING, **common
+    )
+    DeviceReport.objects.filter(pk=pending.pk).update(created_at=now - timedelta(days=10))
+    report_import = ReportImport.objects.create(
+        station=station, uploaded_by=officer, source_name='audit.csv', format='csv',
+        status=ReportImport.StatusChoices.DONE, rows_done=2, rejected=1,
+    )
+    ReportImportRejection.objects.create(report_import=report_import, row_number=2, imei='123', reason="Bad IMEI.")
+    return {
+        'station': station, 'officer': officer, 'stolen': stolen, 'pending': pending, 'report_import': report_import,
+    }
+
+
+def _public_report_data(station):
+    return {
+        'owner_full_name': 'Audit Reporter', 'owner_phone_number': '08012345678',
+        'owner_email': 'reporter@audit.test', 'owner_address': '1 Audit Road',
+        'imei': '353918054321670', 'brand': 'Tecno', 'model': 'Spark 10',
+        'incident_state': station.pk, 'incident_date': '2025-01-01',
+        'police_report_image': SimpleUploadedFile('report.pdf', b'%PDF-1.4 audit', content_type='application/pdf'),
+        'device_receipt': SimpleUploadedFile('receipt.pdf', b'%PDF-1.4 audit', content_type='application/pdf'),
+        'terms': 'on',
+    }
+
+
+def _deliver_webhook(client, reference):
+    body = json.dumps({
+        'event': 'charge.success',
+        'data': {'id': 1, 'reference': reference, 'status': 'success', 'amount': settings.PAYSTACK_REPORT_AMOUNT},
+    }).encode()
+    return client.post(
+        reverse('paystack_webhook'), body, content_type='application/json', HTTP_X_PAYSTACK_SIGNATURE=sign(body)
+    )
+
+
+def _import_upload():
+    rows = f"imei,brand,model,owner_full_name,incident_date\n{IMPORT_IMEI},Tecno,Spark,Audit Owner,2021-03-01\n123,,,,\n"
+    return {'file': SimpleUploadedFile('registry.csv', rows.encode()), 'encoding': 'utf-8'}
+
+
+def scenarios(fixtures):
+    """(name, callable taking a logged-in client) for every portal view."""
+    station, stolen, pending = fixtures['station'], fixtures['stolen'], fixtures['pending']
+    report_import = fixtures['report_import']
+    return [
+        ('home_view (GET)', lambda c: c.get(reverse('home'))),
+        ('home_view (safe IMEI)', lambda c: c.post(reverse('home'), {'imei': SAFE_IMEI})),
+        ('home_view (stolen IMEI)', lambda c: c.post(reverse('home'), {'imei': STOLEN_IMEI})),
+        ('anonymous_alert_view', lambda c: c.post(reverse('anonymous_alert'), {'imei': STOLEN_IMEI})),
+        ('imei_batch_view', lambda c: c.post(
+            reverse('imei_batch'), [SAFE_IMEI, STOLEN_IMEI, '123'], content_type='application/json',
+            headers={'Authorization': f'Bearer {PARTNER_KEY}'},
+        ).getvalue()),
+        ('imei_batch_view (no API key)', lambda c: c.post(
+            reverse('imei_batch'), [SAFE_IMEI], content_type='application/json'
+        )),
+        ('tac_lookup_view', lambda c: c.get(reverse('tac_lookup', args=[STOLEN_IMEI]))),
+        ('metrics_view', lambda c: c.get(reverse('metrics'), headers={'Authorization': f'Bearer {METRICS_TOKEN}'})),
+        ('public_report_view (GET)', lambda c: c.get(reverse('public_report'))),
+        ('public_report_view (POST)', lambda c: c.post(reverse('public_report'), _public_report_data(station))),
+        ('paystack_webhook_view', lambda c: _deliver_webhook(c, PAID_REF)),
+        ('verify_payment_view', lambda c: c.get(reverse('verify_payment'), {'reference': PAID_REF})),
+        ('dashboard_view', lambda c: (cache.clear(), c.get(reverse('dashboard')))),
+        ('view_reports_view', lambda c: c.get(reverse('view_reports'))),
+        ('view_reports_view (IMEI suffix)', lambda c: c.get(reverse('view_reports'), {'search': '3809'})),
+        ('view_reports_view (IMEI prefix)', lambda c: c.get(reverse('view_reports'), {'search': '3569380'})),
+        ('view_reports_view (text search)', lambda c: c.get(reverse('view_reports'), {'search': 'Tec'})),
+        ('view_reports_view (next page)', lambda c: c.get(reverse('view_reports'), {
+            'after': encode_cursor(stolen)
+        })),
+        ('report_detail_view (GET)', lambda c: c.get(reverse('report_detail', args=[pending.pk]))),
+        ('report_detail_view (approve)', lambda c: c.post(
+            reverse('report_detail', args=[pending.pk]), {'action': 'approve'}
+        )),
+        ('station_analytics_view', lambda c: c.get(reverse('station_analytics'))),
+        ('import_reports_view (GET)', lambda c: c.get(reverse('import_reports'))),
+        # The queued import runs inline (JOBS_EAGER), so its queries are included
+        ('import_reports_view (POST)', lambda c: c.post(reverse('import_reports'), _import_upload())),
+        ('import_rejections_view', lambda c: b''.join(
+            c.get(reverse('import_rejections', args=[report_import.pk])).streaming_content
+        )),
+    ]
+
+
+def audit_views(fixtures=None):
+    """
+    Run every scenario and EXPLAIN what it executed.
+
+    Returns one dict per scenario: {'view', 'queries', 'plans'}, where
+    `plans` holds {'sql', 'plan', 'scans', 'unexpected'} for each distinct
+    explainable statement.
+    """
+    fixtures = fixtures or create_fixtures()
+    client = Client()
+    client.force_login(fixtures['officer'])
+
+    with StubServer() as paystack:
+        paystack.route('POST', '/transaction/initialize', {
+            'status': True, 'data': {'authorization_url': 'https://checkout.test/audit'},
+        })
+        paystack.route('GET', f'/transaction/verify/{PAID_REF}', {
+            'status': True, 'data': {'status': 'success'},
+        })
+        overrides = override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            OUTBOUND_HTTP={'paystack': {'base_url': paystack.url, 'retries': 0}},
+            GEOIP_REMOTE_FALLBACK=False,
+            IMEI_BATCH_API_KEYS=[PARTNER_KEY],
+            METRICS_AUTH_TOKEN=METRICS_TOKEN,
+            # Run queued jobs inline so their queries count towards the view
+            JOBS_EAGER=True,
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+            MEDIA_ROOT=tempfile.mkdtemp(prefix='query-audit-'),
+        )
+        results = []
+        with overrides:
+            for name, run in scenarios(fixtures):
+                with CaptureQueriesContext(connection) as captured:
+                    run(client)
+                results.append({'view': name, 'queries': len(captured), 'plans': _explain_all(captured)})
+    return results
+
+
+def _explain_all(captured):
+    plans, seen = [], set()
+    for query in captured.captured_queries:
+        sql = query['sql']
+        if sql in seen or not sql.lstrip().upper().startswith(EXPLAINABLE):
+            continue
+        seen.add(sql)
+        plan = explain(sql)
+        scans = full_scans(plan)
+        plans.append({
+            'sql': sql,
+            'plan': plan,
+            'scans': scans,
+            'unexpected': [table for table in scans if table not in EXPECTED_SCANS],
+        })
+    return plans
@@ -0,0 +1,240 @@
+# portal/ratelimit.py
+"""
+Token-bucket rate limiting for the public lookup views.
+
+Every stolen hit on the IMEI check queues an email and a geo lookup, so a
+script posting in a loop costs SMTP quota and worker time. Views decorated
+with @rate_limit(route, ip=..., imei=...) draw one token per request from a
+bucket per scope (client IP, submitted IMEI); RATE_LIMITS sets each bucket's
+rate per route, e.g. '30/m' (30 requests a minute, bursts of up to 30). An
+empty bucket answers 429 with Retry-After.
+
+Buckets live in the RATE_LIMIT_CACHE cache, which must be shared by all
+workers (see the CACHE settings) for the limits to hold across processes.
+Concurrent requests for the same key can both read the bucket before either
+writes it back, so a burst may let a request or two more through; that is
+the price of not locking on every check.
+
+Each process also keeps its own copy of the buckets it has seen. It only
+counts requests this process admitted, so it never holds fewer tokens than
+the shared bucket: when it is empty, or the key was refused recently, the
+request is refused without a cache round-trip. A flood from one client is
+then turned away in memory.
+"""
+import hashlib
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+RATE_PATTERN = re.compile(r'^\s*(\d+)\s*/\s*(\d*)\s*([smhd])\s*$')
+
+
+class Rate:
+    def __init__(self, capacity, per_seconds):
+        self.capacity = capacity
+        # Tokens added back per second
+        self.refill = capacity / per_seconds
+
+    def fill(self, tokens, elapsed):
+        return min(self.capacity, tokens + max(0.0, elapsed) * self.refill)
+
+    def wait(self, tokens):
+        """Seconds until a bucket holding `tokens` has a whole token."""
+        return (1 - tokens) / self.refill
+
+
+@lru_cache(maxsize=None)
+def parse_rate(spec):
+    """'30/m' -> 30 per minute; '100/10m' -> 100 per 10 minutes."""
+    match = RATE_PATTERN.match(spec)
+    if not match or int(match.group(1)) < 1:
+        raise ValueError(f"Invalid rate {spec!r}; expected e.g. '30/m' or '100/10m'.")
+    count, multiple, unit = match.groups()
+    return Rate(int(count), int(multiple or 1) * PERIODS[unit])
+
+
+# Logged once per process: the first request that looks proxied
+_warned_untrusted_forwarding = False
+
+
+def client_ip(request):
+    """
+    The client address to limit by. X-Forwarded-For is client-supplied, so
+    only the entries added by our own TRUSTED_PROXY_COUNT proxies are
+    believed: the address the outermost of them saw connecting. With no
+    trusted proxies it is REMOTE_ADDR.
+    """
+    global _warned_untrusted_forwarding
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    proxies = settings.TRUSTED_PROXY_COUNT
+    if not proxies:
+        if 'HTTP_X_FORWARDED_FOR' in request.META and not _warned_untrusted_forwarding:
+            _warned_untrusted_forwarding = True
+            logger.warning(
+                f"Requests carry X-Forwarded-For but TRUSTED_PROXY_COUNT is 0, so per-IP rate limits key on "
+                f"{remote_addr}. Behind a proxy every client then shares one bucket; set TRUSTED_PROXY_COUNT."
+            )
+        return remote_addr
+    forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+    chain = forwarded + [remote_addr]
+    return chain[max(0, len(chain) - 1 - proxies)]
+
+
+def bucket_key(route, scope, identity):
+    # Hashed: cache keys must stay short and free of client-supplied characters
+    digest = hashlib.sha1(identity.encode()).hexdigest()[:20]
+    return f"ratelimit:{route}:{scope}:{digest}"
+
+
+class LocalBuckets:
+    """This process's view of the buckets, bounded to the most recent keys."""
+
+    def __init__(self, max_keys=10000):
+        self.max_keys = max_keys
+        # key -> [tokens, updated_at, refused_until]
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key, rate, now):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(rate.capacity), now, 0.0]
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = rate.fill(bucket[0], now - bucket[1])
+            bucket[1] = now
+        return bucket
+
+    def refusal(self, buckets, now):
+        """Seconds to wait if any of `buckets` ({key: rate}) is certainly empty, else 0."""
+        wait = 0.0
+        with self._lock:
+            for key, rate in buckets.items():
+                tokens, _, refused_until = self._get(key, rate, now)
+                if refused_until > now:
+                    wait = max(wait, refused_until - now)
+                elif tokens < 1:
+                    wait = max(wait, rate.wait(tokens))
+        return wait
+
+    def admitted(self, buckets, now):
+        with self._lock:
+            for key, rate in buckets.items():
+                self._get(key, rate, now)[0] -= 1
+
+    def refused(self, keys, until):
+        with self._lock:
+            for key in keys:
+                if key in self._buckets:
+                    self._buckets[key][2] = until
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+local_buckets = LocalBuckets()
+
+
+def take(buckets, now=None):
+    """
+    Draw a token from each of `buckets` ({key: Rate}) in the shared cache.
+
+    Returns 0 when the request is admitted, otherwise the seconds until it
+    would be; a refused request draws no tokens.
+    """
+    now = time.time() if now is None else now
+    cache = caches[settings.RATE_LIMIT_CACHE]
+    stored = cache.get_many(list(buckets))
+
+    updated, refused = {}, {}
+    for key, rate in buckets.items():
+        tokens, updated_at = stored.get(key, (rate.capacity, now))
+        tokens = rate.fill(tokens, now - updated_at)
+        if tokens < 1:
+            refused[key] = rate.wait(tokens)
+        updated[key] = (tokens - 1, now)
+    if refused:
+        return refused
+
+    for key, rate in buckets.items():
+        # Entries expire once the bucket would be full again anyway
+        cache.set(key, updated[key], timeout=math.ceil(rate.capacity / rate.refill) + 1)
+    return {}
+
+
+def check(route, identities):
+    """Seconds the caller must wait before `route` serves `identities` ({scope: value}), or 0."""
+    limits = settings.RATE_LIMITS.get(route, {})
+    buckets = {
+        bucket_key(route, scope, value): parse_rate(limits[scope])
+        for scope, value in identities.items()
+        if value and limits.get(scope)
+    }
+    if not buckets:
+        return 0
+
+    now = time.time()
+    wait = local_buckets.refusal(buckets, now)
+    if wait:
+        metrics.observe_rate_limited(route, 'local')
+        return wait
+
+    try:
+        refused = take(buckets, now)
+    except Exception as e:
+        # An unreachable cache must not take the lookup down with it
+        logger.error(f"Rate limit cache unavailable: {e}")
+        refused = {}
+    if refused:
+        wait = max(refused.values())
+        local_buckets.refused(refused, now + wait)
+        metrics.observe_rate_limited(route, 'shared')
+        return wait
+    local_buckets.admitted(buckets, now)
+    return 0
+
+
+def too_many_requests(wait):
+    seconds = max(1, math.ceil(wait))
+    response = HttpResponse(
+        f"Too many requests. Please try again in {seconds} seconds.",
+        status=429, content_type='text/plain',
+    )
+    response['Retry-After'] = str(seconds)
+    return response
+
+
+def rate_limit(route, methods=('POST',), **scopes):
+    """
+    Limit a view by the RATE_LIMITS entry for `route`.
+
+    Each keyword names a scope and a function returning its identity for a
+    request (e.g. ip=client_ip); requests with other methods, and scopes
+    with no value or no configured rate, are not limited.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if settings.RATE_LIMIT_ENABLED and request.method in methods:
+                wait = check(route, {scope: identify(request) for scope, identify in scopes.items()})
+                if wait:
+                    return too_many_requests(wait)
+            return view(request, *args, **kwargs)
+        return wrapped
+    return decorator
@@ -0,0 +1,361 @@
+# portal/report_import.py
+"""
+Bulk import of historical theft registries (CSV or NDJSON).
+
+Rows are read lazily and handled in chunks of IMPORT_CHUNK_SIZE: each row is
+parsed and its IMEI checked with validate_imei, IMEIs already registered (or
+repeated within the file) are rejected with one query per chunk, and the
+chunk's reports and rejections are written with bulk_create in a single
+transaction that also advances the import's checkpoint (`rows_done`). Memory
+therefore stays flat however long the file is, and an interrupted import
+resumes after the last committed chunk instead of starting over.
+
+Every rejected row is stored as a ReportImportRejection with its row number
+and reason; `write_rejections` turns them into the CSV report. That includes
+rows whose IMEI another writer registered between the duplicate check and the
+insert, and rows that are not valid text in the import's encoding (UTF-8 by
+default; e.g. cp1252 for spreadsheets saved on Windows).
+
+Column headers are matched case-insensitively against COLUMNS, so common
+spreadsheet headings ("Make", "Date Stolen", "Phone") work as they are.
+Required: imei, brand, model, owner_full_name, incident_date. Dates may be
+YYYY-MM-DD or DD/MM/YYYY; `reported_at` (default: the incident date) becomes
+the report's created_at, so old records land in the right week of the
+analytics.
+
+Bulk inserts skip the report signals, so a finished import refreshes the
+stolen IMEI index, the station's dashboard and its rollups itself.
+"""
+import codecs
+import csv
+import datetime
+import json
+import logging
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import rollups
+from .dashboard import invalidate_station
+from .imei_index import bump_version
+from .models import DeviceReport, ReportImport, ReportImportRejection
+from .validators import validate_imei
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'ndjson')
+ENCODINGS = [('utf-8', 'UTF-8'), ('cp1252', 'Windows (cp1252)'), ('latin-1', 'Latin-1 (ISO-8859-1)')]
+
+# Report field -> accepted headings (compared lower-cased, with _ and - as spaces)
+COLUMNS = {
+    'imei': ['imei', 'imei number', 'imei no', 'imei1'],
+    'brand': ['brand', 'make', 'manufacturer'],
+    'model': ['model', 'device model'],
+    'color': ['color', 'colour'],
+    'owner_full_name': ['owner full name', 'owner', 'owner name', 'full name', 'name'],
+    'owner_phone_number': ['owner phone number', 'phone', 'phone number', 'owner phone'],
+    'owner_email': ['owner email', 'email'],
+    'owner_address': ['owner address', 'address'],
+    'incident_date': ['incident date', 'date', 'date stolen'],
+    'incident_time': ['incident time', 'time', 'time stolen'],
+    'incident_type': ['incident type', 'type'],
+    'incident_location': ['incident location', 'location'],
+    'status': ['status'],
+    'reported_at': ['reported at', 'date reported', 'reported on', 'created at'],
+}
+REQUIRED = ('imei', 'brand', 'model', 'owner_full_name', 'incident_date')
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y')
+TIME_FORMATS = ('%H:%M', '%H:%M:%S', '%I:%M %p')
+# Historical records are either still missing or were recovered
+STATUSES = {choice.value.lower(): choice.value for choice in
+            (DeviceReport.StatusChoices.STOLEN, DeviceReport.StatusChoices.RECOVERED)}
+
+_HEADINGS = {heading: field for field, headings in COLUMNS.items() for heading in headings}
+
+
+class RowError(Exception):
+    """A row that cannot become a report; the message is the rejection reason."""
+
+
+def _heading(name):
+    return ' '.join(str(name).lower().replace('_', ' ').replace('-', ' ').split())
+
+
+def _canonical(raw):
+    row = {}
+    for key, value in raw.items():
+        field = _HEADINGS.get(_heading(key)) if key is not None else None
+        if field and field not in row:
+            row[field] = '' if value is None else str(value).strip()
+    return row
+
+
+def format_for(name, requested=None):
+    if requested:
+        return requested
+    return 'ndjson' if str(name).lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+class DecodedLines:
+    """
+    The lines of a binary file as text. Lines that are not valid in
+    `encoding` are decoded with replacement characters and their numbers kept
+    in `bad_lines`, so their rows are rejected rather than imported mangled.
+    """
+
+    def __init__(self, binary, encoding='utf-8'):
+        self.binary = binary
+        self.encoding = encoding
+        self.bad_lines = set()
+
+    def __iter__(self):
+        for number, raw in enumerate(self.binary, start=1):
+            if number == 1 and raw.startswith(codecs.BOM_UTF8) and codecs.lookup(self.encoding).name == 'utf-8':
+                raw = raw[len(codecs.BOM_UTF8):]
+            try:
+                yield raw.decode(self.encoding)
+            except UnicodeDecodeError:
+                self.bad_lines.add(number)
+                yield raw.decode(self.encoding, errors='replace')
+
+
+def iter_rows(lines, fmt):
+    """
+    Yield (row number, row) from an iterable of text lines; row is a dict
+    keyed by report field, or a RowError for a row that could not be read.
+    Row numbers are line numbers in the file.
+    """
+    bad_lines = getattr(lines, 'bad_lines', set())
+    encoding = getattr(lines, 'encoding', 'utf-8')
+
+    def undecodable(first, last):
+        found = any(number in bad_lines for number in range(first, last + 1))
+        bad_lines.difference_update(range(first, last + 1))
+        if found:
+            return RowError(f"Not valid {encoding} text; re-export the file as UTF-8 or choose its encoding.")
+        return None
+
+    if fmt == 'ndjson':
+        for number, line in enumerate(lines, start=1):
+            error = undecodable(number, number)
+            line = line.strip()
+            if not line:
+                continue
+            if error:
+                yield number, error
+                continue
+            try:
+                item = json.loads(line)
+            except ValueError:
+                yield number, RowError("Not valid JSON.")
+                continue
+            yield number, _canonical(item) if isinstance(item, dict) else RowError("Expected a JSON object.")
+        return
+
+    reader = csv.DictReader(lines)
+    last_line = 1
+    for raw in reader:
+        # A quoted field may span lines; the row covers all of them
+        first, last_line = last_line + 1, reader.line_num
+        error = undecodable(first, last_line)
+        if not any((value or '').strip() for value in raw.values() if isinstance(value, str)):
+            continue
+        yield reader.line_num, error or _canonical(raw)
+
+
+def _parse_date(value, field):
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise RowError(f"{field}: unrecognised date {value!r}; use YYYY-MM-DD or DD/MM/YYYY.")
+
+
+def _parse_time(value):
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(value.upper(), fmt).time()
+        except ValueError:
+            continue
+    raise RowError(f"incident_time: unrecognised time {value!r}; use HH:MM.")
+
+
+def parse_row(row):
+    """The DeviceReport field values for an input row; raises RowError."""
+    missing = [field for field in REQUIRED if not row.get(field)]
+    if missing:
+        raise RowError(f"Missing {', '.join(missing)}.")
+    try:
+        validate_imei(row['imei'])
+    except ValidationError as e:
+        raise RowError(e.messages[0])
+
+    values = {
+        'imei': row['imei'],
+        'brand': row['brand'],
+        'model': row['model'],
+        'color': row.get('color') or None,
+        'owner_full_name': row['owner_full_name'],
+        'owner_phone_number': row.get('owner_phone_number', ''),
+        'owner_email': row.get('owner_email') or None,
+        'owner_address': row.get('owner_address') or None,
+        'incident_date': _parse_date(row['incident_date'], 'incident_date'),
+        'incident_time': _parse_time(row['incident_time']) if row.get('incident_time') else datetime.time(0, 0),
+        'incident_type': row.get('incident_type') or 'Other',
+        'incident_location': row.get('incident_location') or None,
+    }
+    status = row.get('status', '').lower() or 'stolen'
+    if status not in STATUSES:
+        raise RowError(f"status: {row['status']!r} is not one of {', '.join(STATUSES.values())}.")
+    values['status'] = STATUSES[status]
+
+    for field, value in values.items():
+        max_length = DeviceReport._meta.get_field(field).max_length
+        if isinstance(value, str) and max_length and len(value) > max_length:
+            raise RowError(f"{field} is longer than {max_length} characters.")
+
+    reported_on = _parse_date(row['reported_at'], 'reported_at') if row.get('reported_at') else values['incident_date']
+    values['created_at'] = timezone.make_aware(datetime.datetime.combine(reported_on, values['incident_time']))
+    return values
+
+
+class ReportImporter:
+    def __init__(self, report_import, chunk_size=None, progress=None):
+        self.report_import = report_import
+        self.chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+        self.progress = progress or (lambda report_import: None)
+
+    def run(self, lines, deadline=None):
+        """
+        Import the rows of `lines` after the checkpoint. Returns False when
+        it stopped at `deadline` (a time.monotonic() value) with rows left.
+        """
+        rows = iter_rows(lines, self.report_import.format)
+        # Resuming: skip what earlier runs committed
+        rows = (item for item in rows if item[0] > self.report_import.rows_done)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return True
+            self.import_chunk(chunk)
+            self.progress(self.report_import)
+            if deadline is not None and time.monotonic() >= deadline:
+                return next(rows, None) is None
+
+    def import_chunk(self, chunk):
+        report_import = self.report_import
+        reports, rejections, first_row = [], [], {}
+        parsed = []
+        for number, row in chunk:
+            if isinstance(row, RowError):
+                rejections.append(self.rejection(number, '', str(row)))
+                continue
+            try:
+                parsed.append((number, parse_row(row)))
+            except RowError as e:
+                rejections.append(self.rejection(number, row.get('imei', ''), str(e)))
+
+        registered = set(DeviceReport.objects.filter(imei__in={values['imei'] for _, values in parsed})
+                         .values_list('imei', flat=True))
+        for number, values in parsed:
+            imei = values['imei']
+            if imei in registered:
+                rejections.append(self.rejection(number, imei, "This IMEI is already registered."))
+            elif imei in first_row:
+                rejections.append(self.rejection(number, imei, f"Repeats the IMEI on row {first_row[imei]}."))
+            else:
+                first_row[imei] = number
+                reports.append(DeviceReport(
+                    **values,
+                    imei_reversed=imei[::-1],
+                    transaction_ref=f"IMPORT-{report_import.pk}-{number}",
+                    station_id=report_import.station_id,
+                    reported_by_id=report_import.uploaded_by_id,
+                ))
+
+        with transaction.atomic():
+            # A report saved by someone else since the check above is skipped here...
+            DeviceReport.objects.bulk_create(reports, ignore_conflicts=True)
+            landed = set(DeviceReport.objects.filter(transaction_ref__in=[r.transaction_ref for r in reports])
+                         .values_list('transaction_ref', flat=True))
+            # ...and reported like any other duplicate
+            for report in reports:
+                if report.transaction_ref not in landed:
+                    rejections.append(self.rejection(
+                        first_row[report.imei], report.imei, "This IMEI was registered while the import ran.",
+                    ))
+            ReportImportRejection.objects.bulk_create(rejections)
+            ReportImport.objects.filter(pk=report_import.pk).update(
+                rows_done=chunk[-1][0],
+                imported=F('imported') + len(landed),
+                rejected=F('rejected') + len(rejections),
+            )
+        report_import.rows_done = chunk[-1][0]
+        report_import.imported += len(landed)
+        report_import.rejected += len(rejections)
+
+    def rejection(self, number, imei, reason):
+        return ReportImportRejection(
+            report_import_id=self.report_import.pk, row_number=number, imei=str(imei)[:64], reason=reason[:255],
+        )
+
+    def finish(self):
+        report_import = self.report_import
+        report_import.status = ReportImport.StatusChoices.DONE
+        report_import.finished_at = timezone.now()
+        report_import.save(update_fields=['status', 'finished_at'])
+        if report_import.imported:
+            bump_version()
+            invalidate_station(report_import.station_id)
+            rollups.compact(station_ids=[report_import.station_id])
+        logger.info(f"Import #{report_import.pk}: {report_import.imported} imported, "
+                    f"{report_import.rejected} rejected")
+
+
+def run_uploaded_import(report_import):
+    """
+    Work on a queued upload for up to IMPORT_JOB_SECONDS. Returns True when
+    the import is finished; otherwise the caller queues a continuation.
+    """
+    if report_import.status == ReportImport.StatusChoices.DONE:
+        return True
+    ReportImport.objects.filter(pk=report_import.pk).update(status=ReportImport.StatusChoices.RUNNING, error='')
+    importer = ReportImporter(report_import)
+    try:
+        with report_import.file.open('rb') as binary:
+            lines = DecodedLines(binary, report_import.encoding)
+            finished = importer.run(lines, deadline=time.monotonic() + settings.IMPORT_JOB_SECONDS)
+        if finished:
+            importer.finish()
+    except Exception as e:
+        ReportImport.objects.filter(pk=report_import.pk).update(
+            status=ReportImport.StatusChoices.FAILED, error=str(e)[:1000],
+        )
+        raise
+    return finished
+
+
+class Echo:
+    """File-like object whose write() returns the line, for streaming csv.writer output."""
+    def write(self, value):
+        return value
+
+
+def rejection_lines(report_import):
+    """The rejection report as CSV lines, read from the database in chunks."""
+    writer = csv.writer(Echo())
+    yield writer.writerow(['row', 'imei', 'reason'])
+    rejections = report_import.rejections.order_by('row_number').values_list('row_number', 'imei', 'reason')
+    for row in rejections.iterator(chunk_size=2000):
+        yield writer.writerow(row)
+
+
+def write_rejections(report_import, out):
+    for line in rejection_lines(report_import):
+        out.write(line)
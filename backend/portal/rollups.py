@@ -0,0 +1,175 @@
+# portal/rollups.py
+"""
+Precomputed counts for the station analytics page.
+
+ReportRollup counts reports per (station, day, brand, status, incident type)
+and SightingRollup counts sightings per (station, day, city). The analytics
+page only reads these tables, so its cost depends on the number of days and
+categories shown, not on how many reports and sightings exist.
+
+They are kept current incrementally: report saves and deletes (signals.py)
+move one count from the report's old key to its new one, and each batch of
+sightings adds its counts as it is written (sightings.py). Anything that
+bypasses those paths (bulk loads, queryset updates) is corrected by
+`manage.py compact_rollups`, which recomputes the rollups from the raw rows
+one station at a time, each in its own transaction, and drops rows whose
+count fell to zero. Run it after bulk loads and periodically (e.g. nightly).
+
+A report changing while its station is being recomputed can be counted
+from before or after the change; the next compaction settles it.
+"""
+import datetime
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DeviceReport, ReportRollup, Sighting, SightingRollup, Station
+
+REPORT_KEY = ('station_id', 'day', 'brand', 'status', 'incident_type')
+SIGHTING_KEY = ('station_id', 'day', 'city')
+# Statuses that are not thefts: rejected reports, and unpaid (often abandoned) checkouts
+EXCLUDED_STATUSES = [DeviceReport.StatusChoices.REJECTED, DeviceReport.StatusChoices.PAYMENT_PENDING]
+
+
+def report_key(values):
+    """The ReportRollup key of a report, given its field values as a dict."""
+    return (
+        values['station_id'], timezone.localdate(values['created_at']),
+        values['brand'], values['status'], values['incident_type'],
+    )
+
+
+def apply(model, fields, deltas):
+    """Add `deltas` ({key tuple: change}) to the rollup rows of `model`."""
+    # Sorted, so concurrent writers take row locks in the same order
+    for key in sorted(key for key, change in deltas.items() if change):
+        change = deltas[key]
+        lookup = dict(zip(fields, key))
+        if model.objects.filter(**lookup).update(count=F('count') + change):
+            continue
+        try:
+            with transaction.atomic():
+                model.objects.create(count=change, **lookup)
+        except IntegrityError:
+            # Another writer created it first
+            model.objects.filter(**lookup).update(count=F('count') + change)
+
+
+def report_changed(before, after):
+    """Move a report's count from `before` to `after` (field dicts; None when absent)."""
+    deltas = Counter()
+    if before is not None:
+        deltas[report_key(before)] -= 1
+    if after is not None:
+        deltas[report_key(after)] += 1
+    apply(ReportRollup, REPORT_KEY, deltas)
+
+
+def sightings_written(sightings, stations):
+    """Count a batch of new Sighting rows; `stations` maps report id to station id."""
+    deltas = Counter(
+        (stations[s.report_id], timezone.localdate(s.created_at), s.city) for s in sightings
+    )
+    apply(SightingRollup, SIGHTING_KEY, deltas)
+
+
+# ---- compaction ----
+
+def _since(queryset, since):
+    return queryset.filter(created_at__gte=since) if since else queryset
+
+
+def compact_station(station_id, since=None):
+    """
+    Recompute a station's rollups from its reports and sightings (from
+    datetime `since` on, or all of them). Returns (report rows, sighting rows).
+    """
+    first_day = timezone.localdate(since) if since else datetime.date.min
+    if since:
+        # Whole days, to match the rollup rows being replaced
+        since = timezone.make_aware(datetime.datetime.combine(first_day, datetime.time.min))
+    day = TruncDate('created_at', tzinfo=timezone.get_current_timezone())
+    reports = (
+        _since(DeviceReport.objects.filter(station_id=station_id), since)
+        .annotate(day=day).values('day', 'brand', 'status', 'incident_type')
+        .annotate(count=Count('pk')).order_by()
+    )
+    sightings = (
+        _since(Sighting.objects.filter(report__station_id=station_id), since)
+        .annotate(day=day).values('day', 'city')
+        .annotate(count=Count('pk')).order_by()
+    )
+
+    with transaction.atomic():
+        ReportRollup.objects.filter(station_id=station_id, day__gte=first_day).delete()
+        report_rows = ReportRollup.objects.bulk_create(
+            [ReportRollup(station_id=station_id, **row) for row in reports], batch_size=1000,
+        )
+        SightingRollup.objects.filter(station_id=station_id, day__gte=first_day).delete()
+        sighting_rows = SightingRollup.objects.bulk_create(
+            [SightingRollup(station_id=station_id, **row) for row in sightings], batch_size=1000,
+        )
+    return len(report_rows), len(sighting_rows)
+
+
+def compact(since=None, station_ids=None, progress=None):
+    """Recompute the rollups of every station (or `station_ids`)."""
+    station_ids = station_ids or list(Station.objects.order_by('pk').values_list('pk', flat=True))
+    totals = [0, 0]
+    for done, station_id in enumerate(station_ids, start=1):
+        report_rows, sighting_rows = compact_station(station_id, since)
+        totals[0] += report_rows
+        totals[1] += sighting_rows
+        if progress:
+            progress(done, len(station_ids))
+    return tuple(totals)
+
+
+# ---- reading ----
+
+def week_start(day):
+    return day - datetime.timedelta(days=day.weekday())
+
+
+def station_analytics(station_id, weeks=12, today=None, top=6):
+    """
+    Weekly report counts by brand and incident type, status totals and
+    sighting hotspots for the last `weeks` weeks (Monday to Sunday), read
+    from the rollups only.
+    """
+    today = today or timezone.localdate()
+    start = week_start(today) - datetime.timedelta(weeks=weeks - 1)
+    week_starts = [start + datetime.timedelta(weeks=i) for i in range(weeks)]
+    reports = ReportRollup.objects.filter(station_id=station_id, day__gte=start, day__lte=today)
+    thefts = reports.exclude(status__in=EXCLUDED_STATUSES)
+
+    def weekly(field):
+        series = {}
+        for row in thefts.values('day', field).annotate(total=Sum('count')).order_by():
+            counts = series.setdefault(row[field], [0] * weeks)
+            counts[(row['day'] - start).days // 7] += row['total']
+        # Largest first; the long tail is folded into "Other"
+        ranked = sorted(series.items(), key=lambda item: (-sum(item[1]), item[0]))
+        if len(ranked) > top:
+            other = [sum(week) for week in zip(*(counts for _, counts in ranked[top - 1:]))]
+            ranked = ranked[:top - 1] + [("Other", other)]
+        return [{'name': name, 'weeks': counts, 'total': sum(counts)} for name, counts in ranked]
+
+    hotspots = (
+        SightingRollup.objects.filter(station_id=station_id, day__gte=start, day__lte=today)
+        .values('city').annotate(total=Sum('count')).order_by('-total', 'city')[:10]
+    )
+    by_brand = weekly('brand')
+    return {
+        'weeks': week_starts,
+        'weekly_totals': [sum(week) for week in zip(*(s['weeks'] for s in by_brand))] if by_brand else [0] * weeks,
+        'by_brand': by_brand,
+        'by_incident_type': weekly('incident_type'),
+        'by_status': list(
+            reports.values('status').annotate(total=Sum('count')).filter(total__gt=0).order_by('-total')
+        ),
+        'hotspots': [{'city': row['city'] or 'Unknown', 'total': row['total']} for row in hotspots],
+    }
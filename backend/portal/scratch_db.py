@@ -0,0 +1,22 @@
+# portal/scratch_db.py
+"""
+Throwaway databases for benchmarks and query-plan checks.
+
+Management commands that need to generate large datasets use this instead of
+touching the configured database: it creates a fresh test database (the same
+way `manage.py test` does), points the connection at it, and destroys it
+afterwards.
+"""
+from contextlib import contextmanager
+
+from django.db import connections
+
+
+@contextmanager
+def scratch_database(alias='default', verbosity=0):
+    connection = connections[alias]
+    old_name = connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity)
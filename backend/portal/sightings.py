@@ -0,0 +1,130 @@
+# portal/sightings.py
+"""
+Write-behind buffer for the sighting log.
+
+The public IMEI check and the anonymous tip form record a Sighting for every
+hit on a stolen device. Rather than inserting during the lookup, `record()`
+appends to an in-process buffer; the buffer is written with one bulk insert
+once it holds SIGHTING_BATCH_SIZE sightings or its oldest sighting is
+SIGHTING_FLUSH_INTERVAL seconds old, together with its counts in the
+sighting rollups (portal/rollups.py). The check runs when a request finishes
+(after its response has been handed back) and at process exit, so an idle
+worker holds at most one partial batch until its next request.
+
+A batch that cannot be written is kept for the next flush, up to
+SIGHTING_BUFFER_MAX sightings; beyond that the oldest are dropped, so a
+database outage cannot grow the process without bound.
+"""
+import atexit
+import ipaddress
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import rollups
+from .geoip import get_geo_location
+from .models import DeviceReport, Sighting
+
+logger = logging.getLogger(__name__)
+
+
+def _valid_ip(ip):
+    # X-Forwarded-For is client-supplied; an inet column rejects the whole batch
+    try:
+        return str(ipaddress.ip_address(ip))
+    except ValueError:
+        return None
+
+
+class SightingBuffer:
+    def __init__(self):
+        # (report_id, source, ip, seen_at)
+        self._items = []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, report_id, source, ip, seen_at=None):
+        with self._lock:
+            if not self._items:
+                self._oldest = time.monotonic()
+            self._items.append((report_id, source, ip, seen_at or timezone.now()))
+
+    def due(self):
+        oldest = self._oldest
+        return oldest is not None and (
+            len(self._items) >= settings.SIGHTING_BATCH_SIZE
+            or time.monotonic() - oldest >= settings.SIGHTING_FLUSH_INTERVAL
+        )
+
+    def flush(self):
+        """Write every buffered sighting; returns how many were written."""
+        with self._lock:
+            items, self._items, self._oldest = self._items, [], None
+        if not items:
+            return 0
+        try:
+            # The report may have been deleted while its sighting waited
+            stations = dict(DeviceReport.objects.filter(pk__in={item[0] for item in items})
+                            .values_list('pk', 'station_id'))
+            rows = [self._sighting(*item) for item in items if item[0] in stations]
+            with transaction.atomic():
+                Sighting.objects.bulk_create(rows, batch_size=settings.SIGHTING_BATCH_SIZE)
+                rollups.sightings_written(rows, stations)
+        except Exception as e:
+            logger.error(f"Failed to write {len(items)} sightings, keeping them for the next flush: {e}")
+            self._requeue(items)
+            return 0
+        return len(rows)
+
+    def _sighting(self, report_id, source, ip, seen_at):
+        ip = _valid_ip(ip)
+        # Local ranges only (cached per IP); never a remote call here
+        location = get_geo_location(ip, allow_remote=False) if ip else {}
+        city = location.get('city', '')
+        return Sighting(
+            report_id=report_id, source=source, ip=ip, created_at=seen_at,
+            city='' if city == 'Unknown' else city,
+            country='' if city == 'Unknown' else location.get('country', ''),
+        )
+
+    def _requeue(self, items):
+        with self._lock:
+            items = items + self._items
+            dropped = len(items) - settings.SIGHTING_BUFFER_MAX
+            if dropped > 0:
+                logger.warning(f"Sighting buffer full; dropping the {dropped} oldest sightings")
+                items = items[dropped:]
+            self._items = items
+            self._oldest = self._oldest or time.monotonic()
+
+    def clear(self):
+        with self._lock:
+            self._items, self._oldest = [], None
+
+
+buffer = SightingBuffer()
+
+
+def record(report_id, source, ip):
+    """Log a sighting of `report_id`'s device; written to the database in the next batch."""
+    buffer.add(report_id, source, ip)
+
+
+def flush_if_due():
+    if buffer.due():
+        buffer.flush()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        buffer.flush()
+    except Exception as e:
+        logger.error(f"Failed to write sightings at exit: {e}")
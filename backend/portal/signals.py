@@ -0,0 +1,84 @@
+# portal/signals.py
+from collections import Counter
+
+from django.core.signals import request_finished
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import DeviceReport, ProofBlob
+from .imei_index import bump_version
+from .jobs import enqueue
+from . import rollups, sightings
+from .dashboard import invalidate_station
+from .proof_storage import PROOF_FIELDS, is_blob_name, proof_storage
+
+STOLEN = DeviceReport.StatusChoices.STOLEN
+# The fields that place a report in the analytics rollups
+ROLLUP_FIELDS = ('station_id', 'created_at', 'brand', 'status', 'incident_type')
+
+
+@receiver(pre_save, sender=DeviceReport)
+def remember_previous_state(sender, instance, **kwargs):
+    """Stash the stored status/IMEI/station/proofs/rollup fields so post_save can tell what changed."""
+    previous = None
+    if instance.pk:
+        previous = sender.objects.filter(pk=instance.pk).values(
+            'status', 'imei', 'station_id', 'brand', 'incident_type', 'created_at', *PROOF_FIELDS
+        ).first()
+    instance._previous_state = previous
+
+
+@receiver(post_save, sender=DeviceReport)
+def report_saved(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_previous_state', None)
+    if previous is None:
+        touches_stolen = instance.status == STOLEN
+    else:
+        touches_stolen = STOLEN in (previous['status'], instance.status) and (
+            previous['status'] != instance.status or previous['imei'] != instance.imei
+        )
+    if touches_stolen:
+        bump_version()
+
+    before = [previous[field] for field in PROOF_FIELDS] if previous else []
+    adjust_proof_refs(before, [getattr(instance, field).name for field in PROOF_FIELDS])
+
+    current = {field: getattr(instance, field) for field in ROLLUP_FIELDS}
+    if previous is None or any(previous[field] != current[field] for field in ROLLUP_FIELDS):
+        rollups.report_changed(previous, current)
+
+    if previous is None or previous['status'] != instance.status or previous['station_id'] != instance.station_id:
+        invalidate_station(instance.station_id)
+        if previous is not None and previous['station_id'] != instance.station_id:
+            invalidate_station(previous['station_id'])
+
+
+@receiver(post_delete, sender=DeviceReport)
+def report_deleted(sender, instance, **kwargs):
+    adjust_proof_refs([getattr(instance, field).name for field in PROOF_FIELDS], [])
+    if instance.status == STOLEN:
+        bump_version()
+    rollups.report_changed({field: getattr(instance, field) for field in ROLLUP_FIELDS}, None)
+    invalidate_station(instance.station_id)
+
+
+@receiver(request_finished)
+def write_sightings(sender, **kwargs):
+    # After the response has gone out, so lookups never wait on the insert
+    sightings.flush_if_due()
+
+
+def adjust_proof_refs(before, after):
+    """Update ProofBlob reference counts for report proofs going from `before` to `after` names."""
+    delta = Counter(name for name in after if is_blob_name(name))
+    delta.subtract(name for name in before if is_blob_name(name))
+    for name, change in delta.items():
+        if change > 0:
+            _, created = ProofBlob.objects.get_or_create(
+                name=name, defaults={'size': proof_storage.size(name) if proof_storage.exists(name) else 0}
+            )
+            if created:
+                enqueue('generate_proof_derivatives', blob_name=name)
+        if change:
+            ProofBlob.objects.filter(name=name).update(ref_count=F('ref_count') + change)
@@ -0,0 +1,178 @@
+# portal/tac.py
+"""
+Type Allocation Code (TAC) lookups.
+
+The first 8 digits of an IMEI identify the device model. `manage.py
+import_tac` turns a GSMA-style TAC CSV into a compact file that every worker
+memory-maps: the sorted TACs and, for each, an index into a table of
+distinct brand/model names. A lookup is a binary search over the TAC array
+followed by one string slice, so it costs O(log n) and the file's pages are
+shared between workers through the page cache rather than copied into each.
+
+File layout (little-endian):
+
+    header   MAGIC, TAC count, name count
+    tacs     `count` x u32, ascending
+    names    `count` x u32, index of each TAC's entry in the name table
+    offsets  (`name count` + 1) x u32, start of each entry in the strings
+    strings  UTF-8 "brand<US>model" entries
+"""
+import array
+import logging
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'SITAC001'
+HEADER = struct.Struct('<8sII')
+FIELD_SEPARATOR = '\x1f'
+
+
+def tac_of(value):
+    """The TAC (as an int) of an IMEI or TAC string, or None if it has fewer than 8 digits."""
+    value = (value or '').strip()
+    if len(value) < 8 or not value[:8].isdigit():
+        return None
+    return int(value[:8])
+
+
+def _u32_view(buffer, offset, count):
+    view = memoryview(buffer)[offset:offset + count * 4]
+    if sys.byteorder == 'little':
+        return view.cast('I')
+    # Big-endian hosts get a private, byte-swapped copy
+    copy = array.array('I')
+    copy.frombytes(view)
+    copy.byteswap()
+    return copy
+
+
+class TacDatabase:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.name_count = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a SafeIMEI TAC file")
+        # import_tac replaces the file, so a new inode means new contents
+        self.version = (stat.st_ino, stat.st_mtime_ns)
+        offset = HEADER.size
+        self._tacs = _u32_view(self._mmap, offset, self.count)
+        offset += self.count * 4
+        self._names = _u32_view(self._mmap, offset, self.count)
+        offset += self.count * 4
+        self._offsets = _u32_view(self._mmap, offset, self.name_count + 1)
+        self._strings_offset = offset + (self.name_count + 1) * 4
+
+    def lookup(self, value):
+        """{'tac', 'brand', 'model'} for an IMEI or TAC, or None if the TAC is unknown."""
+        tac = tac_of(value)
+        if tac is None:
+            return None
+        i = bisect_left(self._tacs, tac)
+        if i == self.count or self._tacs[i] != tac:
+            return None
+        name = self._names[i]
+        start = self._strings_offset + self._offsets[name]
+        end = self._strings_offset + self._offsets[name + 1]
+        brand, model = self._mmap[start:end].decode('utf-8').split(FIELD_SEPARATOR)
+        return {'tac': f"{tac:08d}", 'brand': brand, 'model': model}
+
+    def close(self):
+        # The mmap cannot close while views into it are alive
+        for view in (self._tacs, self._names, self._offsets):
+            if isinstance(view, memoryview):
+                view.release()
+        self._mmap.close()
+
+
+def write_database(path, entries):
+    """
+    Write a TAC file from an iterable of (tac, brand, model).
+
+    Entries may arrive in any order; for a repeated TAC the last one wins.
+    """
+    by_tac = {}
+    for tac, brand, model in entries:
+        by_tac[int(tac)] = FIELD_SEPARATOR.join((brand.strip(), model.strip()))
+
+    names = {}
+    tacs, name_indexes = array.array('I'), array.array('I')
+    offsets, string_blob = array.array('I', [0]), bytearray()
+    for tac in sorted(by_tac):
+        text = by_tac[tac]
+        if text not in names:
+            names[text] = len(names)
+            string_blob += text.encode('utf-8')
+            offsets.append(len(string_blob))
+        tacs.append(tac)
+        name_indexes.append(names[text])
+
+    if sys.byteorder != 'little':
+        for values in (tacs, name_indexes, offsets):
+            values.byteswap()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(tacs), len(names)))
+        for values in (tacs, name_indexes, offsets):
+            values.tofile(f)
+        f.write(string_blob)
+    os.replace(tmp_path, path)
+    return len(tacs)
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def get_database():
+    """The current TAC file, reopened when `import_tac` replaces it."""
+    global _database
+    path = settings.TAC_DATABASE
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    version = (stat.st_ino, stat.st_mtime_ns)
+    if _database is None or _database.path != path or _database.version != version:
+        with _database_lock:
+            if _database is None or _database.path != path or _database.version != version:
+                try:
+                    _database = TacDatabase(path)
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not open TAC database {path}: {e}")
+                    return None
+    return _database
+
+
+def lookup(value):
+    """Brand and model for an IMEI (or TAC), or None when unknown or no TAC file is installed."""
+    database = get_database()
+    return database.lookup(value) if database else None
+
+
+def _normalise(name):
+    return re.sub(r'[^0-9a-z]', '', name.lower())
+
+
+def names_match(entered, registered):
+    """
+    Lenient comparison of a name typed by the owner with the TAC record:
+    case, spacing and punctuation are ignored, and either may be a shorter
+    form of the other ("Samsung" / "Samsung Korea", "iPhone 13" / "iPhone13").
+    """
+    entered, registered = _normalise(entered), _normalise(registered)
+    if not entered or not registered:
+        return True
+    return entered in registered or registered in entered
@@ -0,0 +1,99 @@
+# portal/tasks.py
+"""
+Background jobs run by `manage.py run_workers`.
+
+Handlers raise on failure so the queue can retry them; they must only take
+JSON-serialisable arguments.
+"""
+import logging
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import send_mail
+from django.utils import timezone
+
+from . import alerts, derivatives, ocr, report_import
+from .geoip import get_geo_location
+from .jobs import enqueue, job
+from .metrics import timed_outbound
+from .models import DeviceReport, ProofBlob, ReportImport, SightingAlertWindow
+
+logger = logging.getLogger(__name__)
+
+
+@job('send_email')
+def send_email(subject, message, recipient_list):
+    with timed_outbound('email'):
+        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, recipient_list, fail_silently=False)
+
+
+@job('owner_sighting_alert')
+def owner_sighting_alert(report_id, ip, seen_at):
+    """Tell the owner of a stolen device that its IMEI was just checked."""
+    report = DeviceReport.objects.filter(pk=report_id).first()
+    if not report or not report.owner_email:
+        return
+    location_data = get_geo_location(ip)
+    alerts.record_sighting(SightingAlertWindow.KindChoices.OWNER, report, report.owner_email, {
+        'seen_at': seen_at, 'ip': ip, 'location': location_data.get('full', 'Unknown'),
+    })
+
+
+@job('agent_sighting_alert')
+def agent_sighting_alert(report_id, ip, seen_at=None):
+    """Forward an anonymous sighting to the agent handling the report."""
+    report = DeviceReport.objects.select_related('reported_by', 'station').filter(pk=report_id).first()
+    if not report:
+        return
+
+    # Find Recipient (Agent)
+    recipient_email = None
+    if report.reported_by and report.reported_by.email:
+        recipient_email = report.reported_by.email
+    elif report.station:
+        # Fallback: Send to ANY agent at that station
+        # Ordered by the profile's user id so portal_officer_station_user serves it without a sort
+        officer = (
+            User.objects.filter(officerprofile__station_id=report.station_id)
+            .order_by('officerprofile__user_id').first()
+        )
+        if officer and officer.email:
+            recipient_email = officer.email
+
+    if not recipient_email:
+        logger.warning(f"No agent found to receive alert for IMEI {report.imei}")
+        return
+
+    location_data = get_geo_location(ip)
+    alerts.record_sighting(SightingAlertWindow.KindChoices.AGENT, report, recipient_email, {
+        # Jobs queued before seen_at was passed
+        'seen_at': seen_at or str(timezone.now()), 'ip': ip, 'location': location_data.get('full', 'Unknown'),
+    })
+
+
+@job('sighting_digest')
+def sighting_digest(window_id):
+    """Send the sightings held back during an alert window (see portal/alerts.py)."""
+    alerts.send_digest(window_id)
+
+
+@job('verify_report_documents')
+def verify_report_documents(report_id):
+    """OCR the report's proof documents and record whether they show its IMEI."""
+    ocr.verify_report(report_id)
+
+
+@job('generate_proof_derivatives')
+def generate_proof_derivatives(blob_name):
+    """Render the thumbnail and preview of a newly stored proof."""
+    blob = ProofBlob.objects.filter(name=blob_name).first()
+    if blob:
+        derivatives.generate(blob)
+
+
+@job('import_reports')
+def import_reports(import_id):
+    """Import an uploaded registry, queueing a continuation while rows remain."""
+    upload = ReportImport.objects.filter(pk=import_id).first()
+    if upload and not report_import.run_uploaded_import(upload):
+        enqueue('import_reports', import_id=import_id)
@@ -0,0 +1,73 @@
+# portal/testing.py
+"""
+Test helpers: a local HTTP server that stands in for Paystack/ipinfo.
+
+    with StubServer() as stub:
+        stub.route('POST', '/transaction/initialize', {'status': True, ...})
+        with override_settings(OUTBOUND_HTTP={'paystack': {'base_url': stub.url}}):
+            ...
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that time out on purpose close the socket mid-response.
+        pass
+
+
+class StubServer:
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                path = self.path.split('?', 1)[0]
+                stub.requests.append((self.command, path, dict(self.headers), body))
+
+                status, payload, delay = stub.routes.get((self.command, path), (404, {'status': False}, 0))
+                if callable(payload):
+                    payload = payload(body)
+                if delay:
+                    time.sleep(delay)
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = _QuietServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def route(self, method, path, payload, status=200, delay=0):
+        """Answer `method path` with `payload` (a dict, or a callable taking the request body)."""
+        self.routes[(method, path)] = (status, payload, delay)
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
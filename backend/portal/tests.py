@@ -1,7 +1,78 @@
-from django.test import TestCase, Client
+import csv
+import datetime
+import hashlib
+import io
+import json
+import os
+import shutil
+import socket
+import struct
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+import requests
+
+from django.test import TestCase, TransactionTestCase, Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.conf import settings
 from django.urls import reverse
+from django.utils import timezone
 from django.contrib.auth.models import User
-from .models import Station, OfficerProfile, DeviceReport
+from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db import IntegrityError, connection, connections
+from django.db.models import Sum
+from .models import (
+    Station, OfficerProfile, DeviceReport, Job, PaymentEvent, ProofBlob, ReportImport, ReportRollup, Sighting,
+    SightingAlertWindow, SightingRollup,
+)
+from .imei_index import stolen_index
+from . import alerts, benchmarks, checks, db_router, geoip, jobs, load_data, metrics, ocr, payments, ratelimit, rollups, sightings, tac
+from .http_client import CircuitOpenError, OutboundError, get_client
+from .testing import StubServer
+from .dashboard import compute_station_stats, station_stats
+from .imei_search import search_reports
+from . import query_audit
+from .uploads import ValidatingUploadHandler
+from .proof_storage import proof_storage
+from .forms import PublicReportForm
+from .load_data import LoadDataGenerator
+from .validators import validate_imei
+from safeimei_project.database import database_for_profile
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+
+def make_report(station, **fields):
+    """A DeviceReport filed at `station` with placeholder details; `fields` override any of them."""
+    fields.setdefault('imei', "490154203237518")
+    fields.setdefault('transaction_ref', f"TEST-{fields['imei']}")
+    return DeviceReport.objects.create(**{
+        'owner_full_name': "Jane Doe",
+        'owner_phone_number': "1234567890",
+        'brand': "Tecno",
+        'model': "Spark 10",
+        'incident_date': "2025-01-01",
+        'incident_time': "12:00",
+        'incident_type': "Robbery",
+        'station': station,
+        **fields,
+    })
+
 
 class PortalTestCase(TestCase):
     
@@ -104,4 +175,1679 @@ class PortalTestCase(TestCase):
         
         # A successful post should redirect to step 2
         self.assertEqual(response.status_code, 302)
-        self.assertRedirects(response, reverse('create_report', kwargs={'step': 2}))
\ No newline at end of file
+        self.assertRedirects(response, reverse('create_report', kwargs={'step': 2}))
+
+class StolenImeiIndexTestCase(TestCase):
+
+    def setUp(self):
+        self.station = Station.objects.create(name="Index Division", location="Index City")
+        self.user = User.objects.create_user(username='indexofficer', password='testpassword123')
+        OfficerProfile.objects.create(user=self.user, station=self.station)
+        self.report = make_report(self.station, imei="333333333333333", status=DeviceReport.StatusChoices.PENDING)
+
+    def test_safe_check_skips_report_lookup(self):
+        """A clean IMEI is answered from the index once it is warm."""
+        stolen_index.refresh()
+        with self.assertNumQueries(0):
+            self.assertFalse(stolen_index.contains('222222222222222'))
+
+    def test_approval_is_visible_to_index(self):
+        """Approving a report from the agent portal blacklists the IMEI immediately."""
+        self.assertFalse(stolen_index.contains(self.report.imei))
+
+        self.client.login(username='indexofficer', password='testpassword123')
+        self.client.post(reverse('report_detail', args=[self.report.id]), {'action': 'approve'})
+        self.assertTrue(stolen_index.contains(self.report.imei))
+
+        self.client.post(reverse('report_detail', args=[self.report.id]), {'action': 'mark_recovered'})
+        self.assertFalse(stolen_index.contains(self.report.imei))
+
+
+@override_settings(IMEI_BATCH_API_KEYS=['partner-key'])
+class ImeiBatchApiTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        ratelimit.local_buckets.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(ratelimit.local_buckets.clear)
+        self.client = Client(headers={'Authorization': 'Bearer partner-key'})
+        self.station = Station.objects.create(name="Batch Division", location="Batch City")
+        make_report(self.station)
+
+    def read_results(self, response):
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content).decode()
+        return [json.loads(line) for line in body.splitlines()]
+
+    def test_json_batch(self):
+        """A JSON list is resolved in order with one status per IMEI."""
+        response = self.client.post(
+            reverse('imei_batch'),
+            data={'imeis': ['490154203237518', '356938035643809', '12345']},
+            content_type='application/json'
+        )
+        results = self.read_results(response)
+        self.assertEqual([r['status'] for r in results], ['stolen', 'safe', 'invalid'])
+
+    def test_ndjson_body(self):
+        """NDJSON bodies accept bare strings and objects with an 'imei' key."""
+        body = '"356938035643809"\n{"imei": "490154203237518"}\n'
+        response = self.client.post(reverse('imei_batch'), data=body, content_type='application/x-ndjson')
+        results = self.read_results(response)
+        self.assertEqual([r['status'] for r in results], ['safe', 'stolen'])
+
+    def test_csv_upload_respects_batch_limit(self):
+        """Uploads beyond IMEI_BATCH_MAX_ITEMS are cut off with an error line."""
+        upload = SimpleUploadedFile('stock.csv', b'imei,brand\n490154203237518,A\n356938035643809,B\n356938035643817,C\n')
+        with override_settings(IMEI_BATCH_MAX_ITEMS=2, IMEI_BATCH_CHUNK_SIZE=1):
+            response = self.client.post(reverse('imei_batch'), {'file': upload})
+            results = self.read_results(response)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(results[0]['status'], 'stolen')
+        self.assertIn('error', results[2])
+
+    def test_json_batch_over_limit_is_rejected(self):
+        with override_settings(IMEI_BATCH_MAX_ITEMS=1):
+            response = self.client.post(
+                reverse('imei_batch'),
+                data=['490154203237518', '356938035643809'],
+                content_type='application/json'
+            )
+        self.assertEqual(response.status_code, 413)
+
+    def test_partner_key_required(self):
+        for client in (Client(), Client(headers={'Authorization': 'Bearer guessed-key'})):
+            response = client.post(reverse('imei_batch'), data=['490154203237518'], content_type='application/json')
+            self.assertEqual(response.status_code, 401)
+        with override_settings(IMEI_BATCH_API_KEYS=[]):
+            response = self.client.post(reverse('imei_batch'), data=['490154203237518'], content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_rate_limited_per_partner(self):
+        with override_settings(RATE_LIMITS={'imei_batch': {'partner': '2/m'}}):
+            statuses = [
+                self.client.post(reverse('imei_batch'), data=['490154203237518'], content_type='application/json',
+                                 REMOTE_ADDR=f'10.0.0.{n}').status_code
+                for n in range(3)
+            ]
+        self.assertEqual(statuses, [200, 200, 429])
+
+
+class JobQueueTestCase(TestCase):
+
+    def setUp(self):
+        self.station = Station.objects.create(name="Queue Division", location="Queue City")
+        self.report = make_report(self.station, owner_email="owner@test.com")
+
+    def test_stolen_check_queues_owner_alert(self):
+        """The sighting email is queued, not sent during the request."""
+        self.client.post(reverse('home'), {'imei': self.report.imei})
+        self.assertEqual(len(mail.outbox), 0)
+        queued = Job.objects.get()
+        self.assertEqual(queued.name, 'owner_sighting_alert')
+
+        self.assertEqual(jobs.claim(10), [queued.id])
+        self.assertTrue(jobs.execute(queued.id))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['owner@test.com'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_claimed_job_is_hidden_from_other_workers(self):
+        queued = jobs.enqueue('send_email', subject='s', message='m', recipient_list=['a@test.com'])
+        self.assertEqual(jobs.claim(10), [queued.id])
+        self.assertEqual(jobs.claim(10), [])
+
+    @mock.patch('portal.tasks.send_mail', side_effect=ConnectionRefusedError("SMTP down"))
+    def test_failing_job_retries_then_dead_letters(self, send_mail):
+        queued = jobs.enqueue('send_email', max_attempts=2, subject='s', message='m', recipient_list=['a@test.com'])
+
+        jobs.claim(1)
+        self.assertFalse(jobs.execute(queued.id))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.StatusChoices.QUEUED)
+        self.assertGreater(queued.run_after, timezone.now())
+
+        Job.objects.filter(pk=queued.pk).update(run_after=timezone.now())
+        jobs.claim(1)
+        self.assertFalse(jobs.execute(queued.id))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.StatusChoices.DEAD)
+        self.assertIn('SMTP down', queued.last_error)
+
+    def reclaim(self, queued):
+        """Expire `queued`'s lease and let another worker claim it."""
+        Job.objects.filter(pk=queued.pk).update(locked_until=timezone.now())
+        self.assertEqual(jobs.claim(1), [queued.id])
+
+    def test_worker_that_lost_its_lease_does_not_delete_the_job(self):
+        queued = jobs.enqueue('send_email', subject='s', message='m', recipient_list=['a@test.com'])
+        jobs.claim(1)
+        with mock.patch('portal.tasks.send_mail', side_effect=lambda *a, **k: self.reclaim(queued)):
+            self.assertTrue(jobs.execute(queued.id))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.StatusChoices.RUNNING)
+        self.assertEqual(queued.attempts, 2)
+
+    def test_worker_that_lost_its_lease_does_not_record_its_failure(self):
+        queued = jobs.enqueue('send_email', max_attempts=2, subject='s', message='m', recipient_list=['a@test.com'])
+        jobs.claim(1)
+
+        def stall_then_fail(*args, **kwargs):
+            self.reclaim(queued)
+            raise ConnectionRefusedError("SMTP down")
+
+        with mock.patch('portal.tasks.send_mail', side_effect=stall_then_fail):
+            self.assertFalse(jobs.execute(queued.id))
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.StatusChoices.RUNNING)
+        self.assertIsNotNone(queued.locked_until)
+        self.assertEqual(queued.last_error, '')
+
+
+class RunWorkersCommandTestCase(TransactionTestCase):
+
+    def test_burst_run_drains_queue(self):
+        for i in range(3):
+            jobs.enqueue('send_email', subject=f'Subject {i}', message='m', recipient_list=['a@test.com'])
+        call_command('run_workers', burst=True, concurrency=2, pool='thread', stdout=io.StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(Job.objects.exists())
+
+
+class GeoIPTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        csv_path = os.path.join(self.tmpdir.name, 'ranges.csv')
+        with open(csv_path, 'w') as f:
+            f.write("start_ip,end_ip,country,region,city\n")
+            f.write("41.58.0.0,41.58.255.255,NG,Lagos,Ikeja\n")
+            f.write("102.88.0.0,102.88.255.255,NG,Kano,Kano\n")
+            f.write("2c0f:f5c0::,2c0f:f5c0:ffff:ffff:ffff:ffff:ffff:ffff,NG,FCT,Abuja\n")
+        self.db_path = os.path.join(self.tmpdir.name, 'geoip.bin')
+        call_command('build_geoip', csv=csv_path, output=self.db_path, stdout=io.StringIO())
+        geoip._cache.clear()
+
+    def test_offline_lookup(self):
+        with override_settings(GEOIP_DATABASE=self.db_path, GEOIP_REMOTE_FALLBACK=False):
+            self.assertEqual(geoip.get_geo_location('41.58.10.20')['full'], 'Ikeja, Lagos, NG')
+            self.assertEqual(geoip.get_geo_location('102.88.255.255')['city'], 'Kano')
+            self.assertEqual(geoip.get_geo_location('2c0f:f5c0::1')['city'], 'Abuja')
+            self.assertEqual(geoip.get_geo_location('8.8.8.8')['city'], 'Unknown')
+
+    def test_remote_fallback_is_cached(self):
+        with StubServer() as ipinfo:
+            ipinfo.route('GET', '/154.160.0.1/json', {'city': 'Accra', 'country': 'GH'})
+            with override_settings(GEOIP_DATABASE=self.db_path, GEOIP_REMOTE_FALLBACK=True,
+                                   OUTBOUND_HTTP={'ipinfo': {'base_url': ipinfo.url}}):
+                self.assertEqual(geoip.get_geo_location('41.58.1.1')['city'], 'Ikeja')
+                self.assertEqual(geoip.get_geo_location('154.160.0.1')['city'], 'Accra')
+                self.assertEqual(geoip.get_geo_location('154.160.0.1')['city'], 'Accra')
+        self.assertEqual(len(ipinfo.requests), 1)
+
+
+class OutboundClientTestCase(TestCase):
+
+    def setUp(self):
+        self.stub = StubServer().start()
+        self.addCleanup(self.stub.stop)
+        self.station = Station.objects.create(name="Lagos State Command", location="Lagos")
+
+    def paystack_settings(self, **options):
+        return override_settings(OUTBOUND_HTTP={'paystack': {'base_url': self.stub.url, 'retry_backoff': 0, **options}})
+
+    def test_public_report_initialises_payment(self):
+        """The report form hands the user over to the Paystack checkout URL."""
+        self.stub.route('POST', '/transaction/initialize', lambda body: {
+            'status': True,
+            'data': {'authorization_url': f"https://checkout.test/{json.loads(body)['reference']}"},
+        })
+        data = {
+            'owner_full_name': 'Ada Obi',
+            'owner_phone_number': '08012345678',
+            'owner_email': 'ada@test.com',
+            'owner_address': '1 Test Road',
+            'imei': '490154203237518',
+            'brand': 'Tecno',
+            'model': 'Spark 10',
+            'incident_state': self.station.pk,
+            'incident_date': '2025-01-01',
+            'police_report_image': SimpleUploadedFile('report.pdf', b'%PDF-1.4 test', content_type='application/pdf'),
+            'device_receipt': SimpleUploadedFile('receipt.pdf', b'%PDF-1.4 test', content_type='application/pdf'),
+            'terms': 'on',
+        }
+        with self.paystack_settings(), self.settings(MEDIA_ROOT=tempfile.mkdtemp()):
+            response = self.client.post(reverse('public_report'), data)
+        report = DeviceReport.objects.get(imei='490154203237518')
+        self.assertRedirects(response, f"https://checkout.test/{report.transaction_ref}", fetch_redirect_response=False)
+        self.assertEqual(self.stub.requests[0][2]['Authorization'], 'Bearer ' + settings.PAYSTACK_SECRET_KEY)
+        self.assertTrue(Job.objects.filter(name='verify_report_documents', payload={'report_id': report.pk}).exists())
+
+    def test_circuit_opens_after_repeated_failures(self):
+        self.stub.route('GET', '/transaction/verify/REF1', {'status': False}, status=503)
+        with self.paystack_settings(retries=0, failure_threshold=2):
+            client = get_client('paystack')
+            for _ in range(2):
+                self.assertEqual(client.get('/transaction/verify/REF1').status_code, 503)
+            with self.assertRaises(CircuitOpenError):
+                client.get('/transaction/verify/REF1')
+            self.assertEqual(len(self.stub.requests), 2)
+            self.assertEqual(client.stats.snapshot()['outcomes'], {'server_error': 2, 'short_circuited': 1})
+
+            # A failed verification call renders the failure page instead of hanging.
+            response = self.client.get(reverse('verify_payment'), {'reference': 'REF1'})
+            self.assertTemplateUsed(response, 'payment_failed.html')
+
+    def test_retries_are_limited_by_budget_and_timeouts_raise(self):
+        self.stub.route('GET', '/slow', {}, delay=0.5)
+        with self.paystack_settings(read_timeout=0.1, retries=5, retry_budget_ratio=0.1):
+            client = get_client('paystack')
+            client.budget._tokens = 1
+            with self.assertRaises(OutboundError):
+                client.get('/slow')
+            # One first try plus the single retry the budget allowed
+            self.assertEqual(client.stats.snapshot()['outcomes'], {'timeout': 2})
+
+    def test_post_is_retried_only_when_the_connection_failed(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            closed_url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        with override_settings(OUTBOUND_HTTP={'paystack': {'base_url': closed_url, 'retry_backoff': 0, 'retries': 1}}):
+            client = get_client('paystack')
+            with self.assertRaises(OutboundError):
+                client.post('/transaction/initialize')
+            self.assertEqual(client.stats.snapshot()['outcomes'], {'connection_error': 2})
+
+        with self.paystack_settings(retries=1):
+            client = get_client('paystack')
+            reset = requests.ConnectionError(ConnectionResetError("Connection reset by peer"))
+            with mock.patch.object(client.session, 'request', side_effect=reset) as send:
+                with self.assertRaises(OutboundError):
+                    client.post('/transaction/initialize')
+            self.assertEqual(send.call_count, 1)
+
+
+class DashboardStatsTestCase(TestCase):
+
+    def setUp(self):
+        self.station = Station.objects.create(name="Stats Division", location="Stats City")
+        self.user = User.objects.create_user(username='statsofficer', password='testpassword123')
+        OfficerProfile.objects.create(user=self.user, station=self.station)
+        for i, status in enumerate([DeviceReport.StatusChoices.PENDING, DeviceReport.StatusChoices.PENDING,
+                                    DeviceReport.StatusChoices.RECOVERED]):
+            make_report(self.station, imei=f"35693803564380{i}", status=status)
+        self.client.login(username='statsofficer', password='testpassword123')
+
+    @override_settings(DEBUG=False, DASHBOARD_CACHE_TTL=60)
+    def test_deploy_check_wants_a_shared_tile_cache(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual([e.id for e in checks.check_dashboard_cache(None)], ['portal.E002'])
+            with override_settings(DASHBOARD_CACHE_TTL=0):
+                self.assertEqual(checks.check_dashboard_cache(None), [])
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                                                   'LOCATION': 'cache'}}):
+            self.assertEqual(checks.check_dashboard_cache(None), [])
+
+    def test_tiles_come_from_one_cached_query(self):
+        with self.assertNumQueries(1):
+            stats = compute_station_stats(self.station.pk)
+        self.assertEqual(stats['reports_this_month_count'], 3)
+        self.assertEqual(stats['pending_review_count'], 2)
+        self.assertEqual(stats['recently_recovered_count'], 1)
+        self.assertEqual(stats['reports_last_7_days_count'], 3)
+
+        station_stats(self.station.pk)
+        with self.assertNumQueries(0):
+            station_stats(self.station.pk)
+
+    def test_status_change_invalidates_cached_tiles(self):
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['pending_review_count'], 2)
+
+        report = DeviceReport.objects.filter(status=DeviceReport.StatusChoices.PENDING).first()
+        self.client.post(reverse('report_detail', args=[report.id]), {'action': 'approve'})
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['pending_review_count'], 1)
+        self.assertEqual(response.context['stolen_count'], 1)
+
+
+class ReportListPaginationTestCase(TestCase):
+
+    def setUp(self):
+        self.station = Station.objects.create(name="Feed Division", location="Feed City")
+        self.user = User.objects.create_user(username='feedofficer', password='testpassword123')
+        OfficerProfile.objects.create(user=self.user, station=self.station)
+        same_time = timezone.now()
+        for i in range(5):
+            report = make_report(self.station, imei=f"49015420323751{i}", status=DeviceReport.StatusChoices.PENDING)
+            # Ties on created_at must be broken by id
+            DeviceReport.objects.filter(pk=report.pk).update(created_at=same_time)
+        self.client.login(username='feedofficer', password='testpassword123')
+
+    @override_settings(REPORTS_PAGE_SIZE=2)
+    def test_cursor_pages_cover_every_report_once(self):
+        seen, url, pages = [], reverse('view_reports'), []
+        while url:
+            response = self.client.get(url)
+            page = [r.imei for r in response.context['reports']]
+            pages.append(page)
+            seen += page
+            next_url = response.context['next_url']
+            url = reverse('view_reports') + next_url if next_url else None
+        self.assertEqual(sorted(seen), sorted(DeviceReport.objects.values_list('imei', flat=True)))
+        self.assertEqual([len(p) for p in pages], [2, 2, 1])
+
+        # Stepping back from the last page returns the middle page
+        response = self.client.get(reverse('view_reports') + response.context['previous_url'])
+        self.assertEqual([r.imei for r in response.context['reports']], pages[1])
+
+    def test_list_defers_long_text_columns(self):
+        response = self.client.get(reverse('view_reports'))
+        report = response.context['reports'][0]
+        self.assertIn('owner_address', report.get_deferred_fields())
+
+
+class ImeiSearchTestCase(TestCase):
+
+    def setUp(self):
+        self.station = Station.objects.create(name="Search Division", location="Search City")
+        for imei in ['490154203237518', '356938035643809', '111111111118888']:
+            make_report(self.station, imei=imei)
+
+    def search(self, query):
+        return sorted(search_reports(DeviceReport.objects.all(), query).values_list('imei', flat=True))
+
+    def test_suffix_and_prefix_use_indexed_columns(self):
+        self.assertEqual(self.search('7518'), ['490154203237518'])
+        self.assertEqual(self.search('356938'), ['356938035643809'])
+        self.assertEqual(self.search('8888'), ['111111111118888'])
+        # Middle fragments of indexed length are not matched
+        self.assertEqual(self.search('203237'), [])
+        self.assertIn('imei_reversed', str(search_reports(DeviceReport.objects.all(), '7518').query))
+
+    def test_short_fragment_falls_back_to_substring(self):
+        self.assertEqual(self.search('938'), ['356938035643809'])
+
+    def test_reversed_imei_follows_edits(self):
+        report = DeviceReport.objects.get(imei='490154203237518')
+        report.imei = '490154203237526'
+        report.save(update_fields=['imei'])
+        self.assertEqual(self.search('7526'), ['490154203237526'])
+
+    def test_backfill_command(self):
+        # Rows saved before the column existed, or changed by a queryset update
+        DeviceReport.objects.update(imei_reversed='')
+        DeviceReport.objects.filter(imei='356938035643809').update(imei='356938035643817')
+        self.assertEqual(self.search('7518'), [])
+
+        out = io.StringIO()
+        call_command('backfill_imei_reversed', chunk_size=1, stdout=out)
+        self.assertIn('on 3 reports', out.getvalue())
+        self.assertEqual(self.search('7518'), ['490154203237518'])
+        self.assertEqual(self.search('3817'), ['356938035643817'])
+        call_command('backfill_imei_reversed', stdout=out)
+        self.assertIn('on 0 reports', out.getvalue())
+
+
+class QueryPlanAuditTestCase(TestCase):
+
+    def test_portal_views_do_not_scan_whole_tables(self):
+        """Every query the portal views issue is served by an index."""
+        results = query_audit.audit_views()
+        for result in results:
+            if result['view'] in query_audit.QUERY_FREE:
+                self.assertEqual(result['queries'], 0, result['view'])
+            else:
+                self.assertTrue(result['plans'], result['view'])
+        unexpected = [
+            (result['view'], plan['sql']) for result in results for plan in result['plans'] if plan['unexpected']
+        ]
+        self.assertEqual(unexpected, [])
+
+    def test_unindexed_filter_is_flagged(self):
+        sql = str(DeviceReport.objects.filter(owner_phone_number='0').query)
+        self.assertIn('portal_devicereport', query_audit.full_scans(query_audit.explain(sql)))
+
+    def test_transaction_refs_are_unique(self):
+        station = Station.objects.create(name="Ref Division", location="Ref City")
+        make_report(station, imei='490154203237518', transaction_ref="PAY-SAME")
+        with self.assertRaises(IntegrityError):
+            make_report(station, imei='356938035643809', transaction_ref="PAY-SAME")
+
+
+class DedupeTransactionRefsTestCase(TransactionTestCase):
+
+    def setUp(self):
+        # The database as it was before portal_report_unique_txref
+        self.constraint = next(c for c in DeviceReport._meta.constraints if c.name == 'portal_report_unique_txref')
+        others = [c for c in DeviceReport._meta.constraints if c is not self.constraint]
+        # SQLite rebuilds the table from the model, so hide the constraint from it
+        with mock.patch.object(DeviceReport._meta, 'constraints', others), connection.schema_editor() as editor:
+            editor.remove_constraint(DeviceReport, self.constraint)
+        self.restored = False
+        self.addCleanup(self.restore_constraint, clear=True)
+
+    def restore_constraint(self, clear=False):
+        if self.restored:
+            return
+        if clear:
+            DeviceReport.objects.all().delete()
+        with connection.schema_editor() as editor:
+            editor.add_constraint(DeviceReport, self.constraint)
+        self.restored = True
+
+    def test_duplicates_are_renamed_so_the_constraint_applies(self):
+        station = Station.objects.create(name="Ref Division", location="Ref City")
+        first = make_report(station, imei='490154203237518', transaction_ref="PAY-123456")
+        second = make_report(station, imei='356938035643809', transaction_ref="PAY-123456")
+        make_report(station, imei='356938035643817', transaction_ref="PAY-654321")
+
+        out = io.StringIO()
+        call_command('dedupe_transaction_refs', stdout=out)
+        self.assertIn('Reassigned 1 duplicate', out.getvalue())
+        self.assertEqual(DeviceReport.objects.get(pk=first.pk).transaction_ref, "PAY-123456")
+        self.assertEqual(DeviceReport.objects.get(pk=second.pk).transaction_ref, f"PAY-123456-R{second.pk}")
+        self.restore_constraint()
+
+
+class PaystackWebhookTestCase(TestCase):
+
+    def setUp(self):
+        self.station = Station.objects.create(name="Kano State Command", location="Kano")
+        self.report = make_report(
+            self.station, owner_email="ada@test.com", transaction_ref="PAY-0A1B2C3D4E5F",
+            status=DeviceReport.StatusChoices.PAYMENT_PENDING,
+        )
+
+    def deliver(self, event='charge.success', status='success', amount=None, signature=None):
+        body = json.dumps({
+            'event': event,
+            'data': {
+                'id': 302961,
+                'reference': self.report.transaction_ref,
+                'status': status,
+                'amount': settings.PAYSTACK_REPORT_AMOUNT if amount is None else amount,
+            },
+        }).encode()
+        return self.client.post(
+            reverse('paystack_webhook'), body, content_type='application/json',
+            HTTP_X_PAYSTACK_SIGNATURE=signature if signature is not None else payments.sign(body),
+        )
+
+    def test_signed_charge_confirms_report_once(self):
+        """A charge.success event moves the report to PENDING; redeliveries are ignored."""
+        self.assertEqual(self.deliver().status_code, 200)
+        self.assertEqual(self.deliver().status_code, 200)
+
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, DeviceReport.StatusChoices.PENDING)
+        self.assertEqual(PaymentEvent.objects.count(), 1)
+        self.assertEqual(Job.objects.filter(name='send_email').count(), 1)
+
+    def test_bad_signature_is_rejected(self):
+        self.assertEqual(self.deliver(signature='0' * 128).status_code, 401)
+        self.assertFalse(PaymentEvent.objects.exists())
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, DeviceReport.StatusChoices.PAYMENT_PENDING)
+
+    def test_underpaid_charge_is_recorded_but_not_applied(self):
+        self.deliver(amount=100)
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, DeviceReport.StatusChoices.PAYMENT_PENDING)
+        self.assertIn('amount', PaymentEvent.objects.get().note)
+
+    def test_non_numeric_amount_is_recorded_not_raised(self):
+        self.assertEqual(self.deliver(amount='1,000.00').status_code, 200)
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, DeviceReport.StatusChoices.PAYMENT_PENDING)
+        self.assertIn('invalid amount', PaymentEvent.objects.get().note)
+
+    def test_confirmation_page_stops_refreshing(self):
+        url = reverse('verify_payment')
+        response = self.client.get(url, {'reference': self.report.transaction_ref})
+        self.assertContains(response, 'http-equiv="refresh"')
+        DeviceReport.objects.filter(pk=self.report.pk).update(
+            created_at=timezone.now() - datetime.timedelta(seconds=settings.PAYSTACK_CONFIRMATION_TIMEOUT + 1)
+        )
+        response = self.client.get(url, {'reference': self.report.transaction_ref})
+        self.assertNotContains(response, 'http-equiv="refresh"')
+        self.assertContains(response, 'Payment Not Yet Confirmed')
+
+    @mock.patch('portal.views.get_client')
+    def test_redirect_reads_local_status(self, get_client):
+        """The checkout redirect never calls Paystack; it waits for the webhook."""
+        url = reverse('verify_payment')
+        response = self.client.get(url, {'reference': self.report.transaction_ref})
+        self.assertTemplateUsed(response, 'payment_processing.html')
+
+        self.deliver()
+        response = self.client.get(url, {'reference': self.report.transaction_ref})
+        self.assertTemplateUsed(response, 'report_success.html')
+        get_client.assert_not_called()
+
+    def test_redirect_can_fall_back_to_verify_call(self):
+        with StubServer() as stub:
+            stub.route('GET', f'/transaction/verify/{self.report.transaction_ref}', {
+                'status': True, 'data': {'status': 'success', 'amount': settings.PAYSTACK_REPORT_AMOUNT},
+            })
+            with override_settings(PAYSTACK_VERIFY_ON_REDIRECT=True, OUTBOUND_HTTP={'paystack': {'base_url': stub.url}}):
+                response = self.client.get(reverse('verify_payment'), {'reference': self.report.transaction_ref})
+        self.assertTemplateUsed(response, 'report_success.html')
+        self.report.refresh_from_db()
+        self.assertEqual(self.report.status, DeviceReport.StatusChoices.PENDING)
+
+
+@override_settings(OCR_ENGINE='fake', OCR_ENGINE_OPTIONS={}, OCR_PROCESSES=0)
+class OcrVerificationTestCase(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.station = Station.objects.create(name="Oyo State Command", location="Ibadan")
+
+    def report_with_proofs(self, police_text, receipt_text):
+        return make_report(
+            self.station,
+            police_report_image=SimpleUploadedFile('report.pdf', police_text.encode()),
+            device_receipt=SimpleUploadedFile('receipt.pdf', receipt_text.encode()),
+            status=DeviceReport.StatusChoices.PAYMENT_PENDING,
+        )
+
+    def test_candidates_tolerate_separators(self):
+        lines = [("IMEI: 4901 5420 3237 518", 0.8), ("Ref 12345678901234567", 0.9), ("490154203237518", 0.95)]
+        self.assertEqual(ocr.find_candidates(lines), {'490154203237518': 0.95})
+
+    def test_matching_documents_verify_report(self):
+        report = self.report_with_proofs("%PDF-1.4\nExtract\nIMEI 4901-5420-3237-518\n", "Receipt\n490154203237518\n")
+        ocr.verify_report(report.pk)
+        report.refresh_from_db()
+        self.assertTrue(report.ocr_verification_status)
+        self.assertEqual(report.ocr_confidence, 0.99)
+        self.assertIsNotNone(report.ocr_checked_at)
+
+    def test_mismatch_records_candidates(self):
+        report = self.report_with_proofs("IMEI 490154203237526\n", "Receipt\n490154203237518\n")
+        ocr.verify_report(report.pk)
+        report.refresh_from_db()
+        self.assertFalse(report.ocr_verification_status)
+        police = report.ocr_details['documents']['police_report_image']
+        self.assertEqual(police['candidates'], ['490154203237526'])
+        self.assertEqual(police['nearest_distance'], 2)
+
+    @unittest.skipIf(Image is None, "Pillow is not installed")
+    def test_missing_tesseract_binary_is_unavailable_not_retried(self):
+        class TesseractNotFoundError(EnvironmentError):
+            pass
+
+        def image_to_data(*args, **kwargs):
+            raise TesseractNotFoundError("tesseract is not installed or it's not in your PATH")
+
+        fake = types.SimpleNamespace(
+            TesseractNotFoundError=TesseractNotFoundError, Output=types.SimpleNamespace(DICT='dict'),
+            image_to_data=image_to_data,
+        )
+        path = os.path.join(settings.MEDIA_ROOT, 'receipt.png')
+        Image.new('RGB', (8, 8)).save(path)
+        with mock.patch.dict(sys.modules, {'pytesseract': fake}):
+            result = ocr.analyse_document('tesseract', {}, path, '490154203237518')
+        self.assertFalse(result['match'])
+        self.assertIn('Tesseract could not run', result['error'])
+
+    def test_documents_are_analysed_on_process_pool(self):
+        report = self.report_with_proofs("IMEI 490154203237518\n", "490154203237518\n")
+        self.addCleanup(ocr.shutdown_pool)
+        with self.settings(OCR_PROCESSES=1):
+            ocr.verify_report(report.pk)
+        report.refresh_from_db()
+        self.assertTrue(report.ocr_verification_status)
+
+
+class UploadValidationTestCase(TestCase):
+
+    def parse(self, content, handler_options=None, content_type='application/pdf'):
+        request = RequestFactory().post('/upload/', {
+            'police_report_image': SimpleUploadedFile('report.pdf', content, content_type=content_type),
+            'note': 'kept',
+        })
+        handler = ValidatingUploadHandler(request, ['police_report_image'], **(handler_options or {}))
+        request.upload_handlers = [handler]
+        return request.FILES, request.POST, handler
+
+    def test_accepted_file_carries_digest_and_sniffed_type(self):
+        content = b'%PDF-1.4\n' + os.urandom(200 * 1024)
+        files, post, _ = self.parse(content, content_type='image/png')
+        uploaded = files['police_report_image']
+        self.assertEqual(uploaded.sha256, hashlib.sha256(content).hexdigest())
+        self.assertEqual(uploaded.content_type, 'application/pdf')
+        self.assertEqual(uploaded.read(), content)
+        self.assertEqual(post['note'], 'kept')
+
+    def test_disguised_file_is_dropped_on_first_chunk(self):
+        files, post, handler = self.parse(b'MZ\x90\x00 not really a pdf')
+        self.assertNotIn('police_report_image', files)
+        self.assertIn('Unsupported file type', handler.errors['police_report_image'])
+        self.assertEqual(post['note'], 'kept')
+
+    def test_oversized_file_is_dropped_mid_stream(self):
+        files, _, handler = self.parse(b'%PDF-1.4\n' + b'0' * (300 * 1024), {'max_size': 100 * 1024})
+        self.assertNotIn('police_report_image', files)
+        self.assertIn('File size', handler.errors['police_report_image'])
+
+    def test_public_report_form_shows_upload_error(self):
+        station = Station.objects.create(name="Edo State Command", location="Benin")
+        response = self.client.post(reverse('public_report'), {
+            'owner_full_name': 'Ada Obi',
+            'owner_phone_number': '08012345678',
+            'owner_email': 'ada@test.com',
+            'owner_address': '1 Test Road',
+            'imei': '490154203237518',
+            'brand': 'Tecno',
+            'model': 'Spark 10',
+            'incident_state': station.pk,
+            'incident_date': '2025-01-01',
+            'police_report_image': SimpleUploadedFile('report.png', b'<script>', content_type='image/png'),
+            'device_receipt': SimpleUploadedFile('receipt.pdf', b'%PDF-1.4 test', content_type='application/pdf'),
+            'terms': 'on',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context['form'].errors['police_report_image'],
+            ["Unsupported file type. Use JPEG, PNG, or PDF."]
+        )
+        self.assertFalse(DeviceReport.objects.exists())
+
+
+class ProofStorageTestCase(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.station = Station.objects.create(name="Kaduna State Command", location="Kaduna")
+
+    def report_with_receipt(self, imei, receipt=b'%PDF-1.4 same receipt'):
+        return make_report(self.station, imei=imei, device_receipt=SimpleUploadedFile('receipt.pdf', receipt))
+
+    def gc(self):
+        call_command('gc_proofs', grace=0, stdout=io.StringIO())
+
+    def test_identical_uploads_share_one_counted_blob(self):
+        first = self.report_with_receipt('490154203237518')
+        second = self.report_with_receipt('356938035643809')
+        digest = hashlib.sha256(b'%PDF-1.4 same receipt').hexdigest()
+        self.assertEqual(first.device_receipt.name, f"proofs/blobs/{digest[:2]}/{digest[2:4]}/{digest}.pdf")
+        self.assertEqual(second.device_receipt.name, first.device_receipt.name)
+        self.assertEqual(ProofBlob.objects.get().ref_count, 2)
+
+        first.delete()
+        self.gc()
+        self.assertTrue(proof_storage.exists(second.device_receipt.name))
+        self.assertEqual(ProofBlob.objects.get().ref_count, 1)
+
+        second.delete()
+        self.gc()
+        self.assertFalse(proof_storage.exists(second.device_receipt.name))
+        self.assertFalse(ProofBlob.objects.exists())
+
+    def test_replacing_a_proof_moves_the_reference(self):
+        report = self.report_with_receipt('490154203237518')
+        old_name = report.device_receipt.name
+        report.device_receipt = SimpleUploadedFile('receipt.pdf', b'%PDF-1.4 new receipt')
+        report.save()
+        self.assertEqual(ProofBlob.objects.get(name=old_name).ref_count, 0)
+        self.assertEqual(ProofBlob.objects.get(name=report.device_receipt.name).ref_count, 1)
+
+    def test_gc_keeps_young_and_bulk_referenced_blobs(self):
+        orphan = proof_storage.save('proofs/receipts/x.pdf', io.BytesIO(b'%PDF-1.4 orphan'))
+        report = self.report_with_receipt('490154203237518')
+        # A reference written without signals (e.g. a bulk update)
+        bulk = proof_storage.save('proofs/receipts/y.pdf', io.BytesIO(b'%PDF-1.4 bulk'))
+        DeviceReport.objects.filter(pk=report.pk).update(police_report_image=bulk)
+
+        call_command('gc_proofs', stdout=io.StringIO())
+        self.assertTrue(proof_storage.exists(orphan))
+
+        self.gc()
+        self.assertFalse(proof_storage.exists(orphan))
+        self.assertTrue(proof_storage.exists(bulk))
+        self.assertTrue(proof_storage.exists(report.device_receipt.name))
+
+        call_command('gc_proofs', grace=0, recount=True, stdout=io.StringIO())
+        self.assertEqual(ProofBlob.objects.get(name=bulk).ref_count, 1)
+
+
+@unittest.skipIf(Image is None, "Pillow is not installed")
+@override_settings(JOBS_EAGER=True)
+class ProofDerivativesTestCase(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.station = Station.objects.create(name="Enugu State Command", location="Enugu")
+        self.user = User.objects.create_user(username='reviewer', password='testpassword123')
+        OfficerProfile.objects.create(user=self.user, station=self.station)
+
+    def encode(self, image_format, size=(2000, 1500)):
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (200, 30, 30)).save(buffer, image_format)
+        return buffer.getvalue()
+
+    def test_image_proof_gets_bounded_thumbnail_and_preview(self):
+        report = make_report(self.station, device_receipt=SimpleUploadedFile('receipt.png', self.encode('PNG')))
+        blob = ProofBlob.objects.get(name=report.device_receipt.name)
+        with Image.open(proof_storage.path(blob.thumbnail)) as thumbnail:
+            self.assertEqual(thumbnail.format, 'WEBP')
+            self.assertEqual(thumbnail.size, (settings.PROOF_THUMBNAIL_SIZE, 240))
+        with Image.open(proof_storage.path(blob.preview)) as preview:
+            self.assertEqual(max(preview.size), settings.PROOF_PREVIEW_SIZE)
+
+    @unittest.skipIf(pypdfium2 is None, "pypdfium2 is not installed")
+    def test_pdf_proof_gets_first_page_preview(self):
+        report = make_report(self.station, police_report_image=SimpleUploadedFile('report.pdf', self.encode('PDF')))
+        blob = ProofBlob.objects.get(name=report.police_report_image.name)
+        self.assertTrue(blob.thumbnail)
+        self.assertEqual(blob.derivatives_error, '')
+
+    def test_unreadable_proof_records_error(self):
+        report = make_report(self.station, device_receipt=SimpleUploadedFile('receipt.png', b'\x89PNG\r\n\x1a\nbroken'))
+        blob = ProofBlob.objects.get(name=report.device_receipt.name)
+        self.assertFalse(blob.thumbnail)
+        self.assertIn('Unreadable image', blob.derivatives_error)
+
+    def test_review_page_serves_derivatives_not_originals(self):
+        report = make_report(self.station, device_receipt=SimpleUploadedFile('receipt.jpg', self.encode('JPEG')))
+        blob = ProofBlob.objects.get(name=report.device_receipt.name)
+        self.client.login(username='reviewer', password='testpassword123')
+        response = self.client.get(reverse('report_detail', args=[report.pk]))
+        self.assertContains(response, f'src="{proof_storage.url(blob.thumbnail)}"')
+        self.assertContains(response, f'href="{proof_storage.url(blob.preview)}"')
+        self.assertNotContains(response, f'src="{report.device_receipt.url}"')
+        self.assertContains(response, f'href="{report.device_receipt.url}"')
+
+
+class TacDatabaseTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        csv_path = os.path.join(self.tmpdir.name, 'tac.csv')
+        with open(csv_path, 'w') as f:
+            # GSMA exports are pipe separated; spreadsheets strip leading zeros
+            f.write("TAC|Marketing Name|Manufacturer (or) Applicant|Brand Name|Model Name\n")
+            f.write("35391805|Spark 10|TECNO Mobile Limited|Tecno|KI5q\n")
+            f.write("49015420|iPhone 13|Apple Inc|Apple|A2633\n")
+            f.write("1234567|Nokia 105|HMD Global|Nokia|TA-1174\n")
+            f.write("not-a-tac|Broken|X|X|X\n")
+        self.db_path = os.path.join(self.tmpdir.name, 'tac.bin')
+        out = io.StringIO()
+        call_command('import_tac', csv=csv_path, output=self.db_path, stdout=out)
+        self.assertIn('Skipped 1', out.getvalue())
+        self.enterContext(override_settings(TAC_DATABASE=self.db_path))
+        self.station = Station.objects.create(name="Ogun State Command", location="Abeokuta")
+
+    def test_luhn_checksum(self):
+        validate_imei('490154203237518')
+        with self.assertRaisesMessage(ValidationError, 'checksum'):
+            validate_imei('490154203237519')
+
+    def test_lookup(self):
+        self.assertEqual(tac.lookup('490154203237518'), {'tac': '49015420', 'brand': 'Apple', 'model': 'iPhone 13'})
+        self.assertEqual(tac.lookup('01234567')['brand'], 'Nokia')
+        self.assertIsNone(tac.lookup('99999999'))
+        self.assertIsNone(tac.lookup('00000001'))
+        self.assertIsNone(tac.lookup('123'))
+
+    def test_reimport_is_picked_up(self):
+        self.assertIsNotNone(tac.lookup('35391805'))
+        tac.write_database(self.db_path, [('86000000', 'Itel', 'A70')])
+        self.assertIsNone(tac.lookup('35391805'))
+        self.assertEqual(tac.lookup('86000000')['model'], 'A70')
+
+    @unittest.skipUnless(sys.byteorder == 'little', "simulates a big-endian host from a little-endian one")
+    def test_big_endian_copy_keeps_whole_words(self):
+        data = struct.pack('<3I', 1, 2, 70000)
+        with mock.patch.object(tac, 'sys', types.SimpleNamespace(byteorder='big')):
+            words = tac._u32_view(data, 0, 3)
+        # Swapped here, since this host is little-endian; one element per word, not per byte
+        self.assertEqual(list(words), list(struct.unpack('>3I', data)))
+
+    def form_data(self, **overrides):
+        data = {
+            'owner_full_name': 'Ada Obi', 'owner_phone_number': '08012345678', 'owner_email': 'ada@test.com',
+            'owner_address': '1 Test Road', 'imei': '353918054321670', 'brand': 'TECNO', 'model': 'Spark 10',
+            'incident_state': self.station.pk, 'incident_date': '2025-01-01', 'terms': 'on',
+        }
+        data.update(overrides)
+        files = {'police_report_image': SimpleUploadedFile('r.pdf', b'%PDF-1.4 r'),
+                 'device_receipt': SimpleUploadedFile('c.pdf', b'%PDF-1.4 c')}
+        return PublicReportForm(data, files)
+
+    def test_form_checks_brand_and_model(self):
+        self.assertTrue(self.form_data().is_valid())
+        form = self.form_data(brand='Samsung')
+        self.assertEqual(form.errors['brand'], ["This IMEI belongs to a Tecno device."])
+        form = self.form_data(model='Camon 20')
+        self.assertIn('Tecno Spark 10', form.errors['model'][0])
+        # Unknown TACs are not second-guessed
+        self.assertTrue(self.form_data(imei='356938035643809', brand='Anything').is_valid())
+
+    def test_prefill_endpoint(self):
+        response = self.client.get(reverse('tac_lookup', args=['353918054321670']))
+        self.assertEqual(response.json()['brand'], 'Tecno')
+        self.assertEqual(self.client.get(reverse('tac_lookup', args=['99999999'])).status_code, 404)
+
+
+class LoadDataGeneratorTestCase(TestCase):
+
+    def generate(self, **options):
+        call_command('generate_load_data', reports=30, officers=4, stations=3, batch_size=7,
+                     end_date=datetime.date(2025, 6, 30), stdout=io.StringIO(), **options)
+        return list(DeviceReport.objects.order_by('transaction_ref').values_list(
+            'imei', 'brand', 'status', 'station__name', 'reported_by__username', 'created_at'))
+
+    def test_generated_reports_are_valid(self):
+        rows = self.generate()
+        self.assertEqual(len(rows), 30)
+        for imei, *_ in rows:
+            validate_imei(imei)
+        self.assertEqual(Station.objects.count(), 3)
+        self.assertEqual(OfficerProfile.objects.count(), 4)
+        self.assertTrue(all(r[5].date() <= datetime.date(2025, 6, 30) for r in rows))
+        self.assertGreater(len({r[5].date() for r in rows}), 1)
+
+    def test_deterministic_and_appendable(self):
+        first = self.generate(seed=7)
+        self.assertEqual(self.generate(seed=7, wipe=True), first)
+        self.assertNotEqual(self.generate(seed=8, wipe=True), first)
+
+        # Appending keeps the existing rows and continues the numbering
+        self.generate(seed=8)
+        self.assertEqual(DeviceReport.objects.count(), 60)
+        self.assertEqual(DeviceReport.objects.values('imei').distinct().count(), 60)
+        self.assertTrue(DeviceReport.objects.filter(transaction_ref='LOAD-0000000059').exists())
+        self.assertEqual(OfficerProfile.objects.count(), 8)
+
+    def test_sightings_follow_stolen_reports(self):
+        def sightings():
+            return list(Sighting.objects.order_by('report__transaction_ref', 'created_at')
+                        .values_list('report__transaction_ref', 'ip', 'city', 'created_at'))
+
+        self.generate(seed=3, sightings_per_report=3)
+        first = sightings()
+        self.assertGreater(len(first), 30)
+        self.assertFalse(Sighting.objects.exclude(report__status=DeviceReport.StatusChoices.STOLEN).exists())
+        for sighting in Sighting.objects.select_related('report'):
+            self.assertGreaterEqual(sighting.created_at, sighting.report.created_at)
+            self.assertLessEqual(sighting.created_at.date(), datetime.date(2025, 6, 30))
+
+        self.generate(seed=3, sightings_per_report=3, wipe=True)
+        self.assertEqual(sightings(), first)
+
+    def test_wipe_keeps_stations_of_superuser_officers(self):
+        self.generate()
+        admin = User.objects.create_superuser(username='admin', password='testpassword123')
+        OfficerProfile.objects.create(user=admin, station=Station.objects.order_by('pk').first())
+
+        self.generate(wipe=True)
+        self.assertEqual(DeviceReport.objects.count(), 30)
+        self.assertEqual(Station.objects.count(), 3)
+        self.assertTrue(OfficerProfile.objects.filter(user=admin).exists())
+
+
+class ViewBenchmarkTestCase(TestCase):
+
+    def test_suite_reports_every_scenario(self):
+        generator = LoadDataGenerator(seed=1, batch_size=50)
+        station_ids = generator.ensure_stations(2)
+        generator.create_officers(2, station_ids)
+        generator.create_reports(60, station_ids)
+
+        suite = benchmarks.run_suite(iterations=3, warmup=1, allocation_iterations=1)
+        self.assertEqual(suite['dataset']['reports'], 60)
+        self.assertIn('public_report_view (POST)', suite['results'])
+        for result in suite['results'].values():
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['alloc_peak_kib'], 0)
+        self.assertEqual(suite['results']['home_view (safe IMEI)']['queries'], 0)
+
+    def test_compare_flags_slower_scenarios_and_extra_queries(self):
+        def suite(p50, queries):
+            return {'results': {'home': {'p50_ms': p50, 'p95_ms': p50, 'p99_ms': p50, 'queries': queries}}}
+
+        self.assertEqual(benchmarks.compare(suite(10, 2), suite(10.5, 2))[0]['regressions'], [])
+        self.assertEqual(benchmarks.compare(suite(10, 2), suite(13, 2))[0]['regressions'], ['p50_ms', 'p95_ms'])
+        self.assertEqual(benchmarks.compare(suite(10, 2), suite(9, 3))[0]['regressions'], ['queries'])
+        # Sub-millisecond jitter on a fast view is not a regression
+        self.assertEqual(benchmarks.compare(suite(1, 2), suite(1.3, 2))[0]['regressions'], [])
+
+
+try:
+    import prometheus_client
+except ImportError:
+    prometheus_client = None
+
+
+@unittest.skipIf(prometheus_client is None, "prometheus_client is not installed")
+class MetricsTestCase(TestCase):
+
+    def sample(self, name, **labels):
+        return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_are_timed_per_view(self):
+        before = self.sample('safeimei_http_request_duration_seconds_count', view='home', method='POST', outcome='2xx')
+        queries_before = self.sample('safeimei_db_queries_per_request_count', view='home')
+        self.client.post(reverse('home'), {'imei': '356938035643809'})
+        self.client.get('/no-such-page/')
+        self.assertEqual(
+            self.sample('safeimei_http_request_duration_seconds_count', view='home', method='POST', outcome='2xx'),
+            before + 1,
+        )
+        self.assertEqual(self.sample('safeimei_db_queries_per_request_count', view='home'), queries_before + 1)
+        self.assertGreater(
+            self.sample('safeimei_http_request_duration_seconds_count', view='unresolved', method='GET', outcome='4xx'), 0
+        )
+
+    def test_outbound_calls_are_timed(self):
+        before = self.sample('safeimei_outbound_request_duration_seconds_count', provider='paystack', outcome='ok')
+        with StubServer() as paystack:
+            paystack.route('GET', '/ping', {'status': True})
+            with override_settings(OUTBOUND_HTTP={'paystack': {'base_url': paystack.url}}):
+                get_client('paystack').get('/ping')
+        self.assertEqual(
+            self.sample('safeimei_outbound_request_duration_seconds_count', provider='paystack', outcome='ok'),
+            before + 1,
+        )
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('home'))
+        with override_settings(METRICS_AUTH_TOKEN='s3cret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'safeimei_http_request_duration_seconds_bucket{')
+        self.assertContains(response, 'view="home"')
+
+    def test_metrics_endpoint_needs_a_token_outside_debug(self):
+        with override_settings(METRICS_AUTH_TOKEN='', DEBUG=False):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(METRICS_AUTH_TOKEN='', DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_multiprocess_aggregation(self):
+        from prometheus_client import CollectorRegistry, Histogram, values
+        original = values.ValueClass
+        self.addCleanup(setattr, values, 'ValueClass', original)
+        with tempfile.TemporaryDirectory() as directory, mock.patch.dict(os.environ, {'PROMETHEUS_MULTIPROC_DIR': directory}):
+            # Two "workers" writing to the shared directory
+            for pid in (101, 102):
+                values.ValueClass = values.MultiProcessValue(lambda: pid)
+                histogram = Histogram('safeimei_test_latency_seconds', 'test', registry=CollectorRegistry())
+                histogram.observe(0.2)
+            values.ValueClass = original
+            body, _ = metrics.render()
+        self.assertIn(b'safeimei_test_latency_seconds_count 2.0', body)
+
+
+class DatabaseProfileTestCase(TestCase):
+
+    def connect(self, database):
+        from django.db.backends.sqlite3.base import DatabaseWrapper
+        database = {**connections['default'].settings_dict, **database}
+        wrapper = DatabaseWrapper(database, alias='profile-test')
+        self.addCleanup(wrapper.close)
+        wrapper.ensure_connection()
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_sqlite_wal_profile_configures_connections(self):
+        with tempfile.TemporaryDirectory() as directory:
+            database = database_for_profile(
+                'sqlite-wal', os.path.join(directory, 'db.sqlite3'), conn_max_age=300,
+                busy_timeout=7, mmap_size=1024 * 1024, cache_size_kib=2048,
+            )
+            self.assertEqual(database['CONN_MAX_AGE'], 300)
+            wrapper = self.connect(database)
+            self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+            self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)  # NORMAL
+            self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 7000)
+            self.assertEqual(self.pragma(wrapper, 'mmap_size'), 1024 * 1024)
+            self.assertEqual(self.pragma(wrapper, 'cache_size'), -2048)
+            wrapper.close()
+
+    def test_plain_sqlite_profile_is_unchanged(self):
+        self.assertEqual(database_for_profile('sqlite', 'db.sqlite3'),
+                         {'ENGINE': 'django.db.backends.sqlite3', 'NAME': 'db.sqlite3'})
+
+    def test_postgres_profile(self):
+        with self.assertRaises(ImproperlyConfigured):
+            database_for_profile('postgres', 'db.sqlite3')
+        with self.assertRaises(ImproperlyConfigured):
+            database_for_profile('mysql', 'db.sqlite3')
+        try:
+            import dj_database_url  # noqa: F401
+        except ImportError:
+            self.skipTest("dj-database-url is not installed")
+        database = database_for_profile('postgres', '', url='postgres://app:pw@db.internal:5432/safeimei',
+                                        conn_max_age=120)
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((database['HOST'], database['NAME']), ('db.internal', 'safeimei'))
+        self.assertEqual(database['CONN_MAX_AGE'], 120)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+
+
+class ReadReplicaTestCase(TestCase):
+    """A second SQLite file plays a replica that has not caught up with the primary."""
+    # Resolved in setUpClass, after the replica alias is registered
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        import sqlite3
+        cls.replica_dir = tempfile.mkdtemp()
+        path = os.path.join(cls.replica_dir, 'replica.sqlite3')
+        # Same schema as the test database
+        target = sqlite3.connect(path)
+        connections['default'].ensure_connection()
+        connections['default'].connection.backup(target)
+        target.close()
+        connections.settings['replica1'] = connections.configure_settings({
+            'default': connections.settings['default'],
+            'replica1': database_for_profile('sqlite-wal', path, conn_max_age=0),
+        })['replica1']
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica1'].close()
+        del connections['replica1']
+        del connections.settings['replica1']
+        shutil.rmtree(cls.replica_dir, ignore_errors=True)
+
+    def setUp(self):
+        self.enterContext(override_settings(READ_REPLICAS=['replica1'], REPLICA_MAX_LAG=5, RATE_LIMIT_ENABLED=False))
+        db_router.health.clear()
+        self.addCleanup(db_router.health.clear)
+        self.addCleanup(stolen_index.invalidate)
+        for alias in ('default', 'replica1'):
+            station = Station.objects.using(alias).create(pk=1, name="Replica Command", location="Kano")
+            DeviceReport.objects.using(alias).create(
+                owner_full_name="Jane Doe", owner_phone_number="0", owner_email="jane@example.com", imei="490154203237518",
+                brand="Tecno", model="Spark 10", incident_date="2025-01-01", incident_time="12:00",
+                incident_type="Robbery", transaction_ref="replica-ref", station=station,
+                status=DeviceReport.StatusChoices.STOLEN,
+            )
+        # Recovered on the primary; the replica has not seen it yet
+        DeviceReport.objects.using('default').update(status=DeviceReport.StatusChoices.RECOVERED)
+        stolen_index.invalidate()
+
+    def check(self):
+        stolen_index.invalidate()
+        return self.client.post(reverse('home'), {'imei': '490154203237518'}).context['imei_result']['status']
+
+    def test_public_lookups_read_the_replica(self):
+        self.assertEqual(self.check(), 'stolen')
+        # Agent pages and everything outside the public views read the primary
+        self.assertEqual(DeviceReport.objects.get().status, DeviceReport.StatusChoices.RECOVERED)
+
+    def test_client_is_pinned_to_primary_after_writing(self):
+        # The stolen hit queues an owner alert: a write, so the client is pinned
+        response = self.client.post(reverse('home'), {'imei': '490154203237518'})
+        self.assertIn(db_router.PIN_COOKIE, response.cookies)
+        self.assertEqual(self.check(), 'safe')
+
+        self.client.cookies.pop(db_router.PIN_COOKIE)
+        self.assertEqual(self.check(), 'stolen')
+
+    def test_lagging_replica_is_skipped(self):
+        with mock.patch('portal.db_router.replica_lag', return_value=30.0):
+            self.assertEqual(self.check(), 'safe')
+
+
+@override_settings(RATE_LIMITS={
+    'home': {'ip': '3/m', 'imei': '2/m'},
+    'anonymous_alert': {'ip': '1/h'},
+})
+class RateLimitTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        ratelimit.local_buckets.clear()
+        self.addCleanup(cache.clear)
+        self.addCleanup(ratelimit.local_buckets.clear)
+
+    def check(self, imei, ip='10.0.0.1'):
+        return self.client.post(reverse('home'), {'imei': imei}, REMOTE_ADDR=ip)
+
+    def test_parse_rate(self):
+        rate = ratelimit.parse_rate('100/10m')
+        self.assertEqual(rate.capacity, 100)
+        self.assertAlmostEqual(rate.refill, 100 / 600)
+        for spec in ('', '0/m', '10/w', 'ten/m'):
+            with self.assertRaises(ValueError):
+                ratelimit.parse_rate(spec)
+
+    def test_ip_and_imei_buckets(self):
+        self.assertEqual(self.check('356938035643809').status_code, 200)
+        self.assertEqual(self.check('356938035643809').status_code, 200)
+        # Per IMEI: a third check of the same number is refused, from any address
+        response = self.check('356938035643809', ip='10.0.0.2')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        # Per IP: a different IMEI gets one more, then the address is out
+        self.assertEqual(self.check('356938035643817').status_code, 200)
+        self.assertEqual(self.check('356938035643825').status_code, 429)
+        # Other clients and page loads are unaffected
+        self.assertEqual(self.check('356938035643825', ip='10.0.0.3').status_code, 200)
+        self.assertEqual(self.client.get(reverse('home'), REMOTE_ADDR='10.0.0.1').status_code, 200)
+
+    def test_forwarded_for_cannot_rotate_the_ip_bucket(self):
+        imeis = ['356938035643809', '356938035643817', '356938035643825']
+        with override_settings(RATE_LIMITS={'home': {'ip': '2/m'}}):
+            statuses = [
+                self.client.post(reverse('home'), {'imei': imei}, REMOTE_ADDR='10.0.0.1',
+                                 HTTP_X_FORWARDED_FOR=f'203.0.113.{n}').status_code
+                for n, imei in enumerate(imeis)
+            ]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    def test_client_ip_behind_trusted_proxies(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.9', HTTP_X_FORWARDED_FOR='1.1.1.1, 198.51.100.7')
+        self.assertEqual(ratelimit.client_ip(request), '10.0.0.9')
+        with override_settings(TRUSTED_PROXY_COUNT=1):
+            # The spoofed leftmost entry is ignored
+            self.assertEqual(ratelimit.client_ip(request), '198.51.100.7')
+        with override_settings(TRUSTED_PROXY_COUNT=5):
+            self.assertEqual(ratelimit.client_ip(request), '1.1.1.1')
+
+    def test_forwarded_for_without_trusted_proxies_is_logged_once(self):
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.9', HTTP_X_FORWARDED_FOR='1.1.1.1')
+        with mock.patch.object(ratelimit, '_warned_untrusted_forwarding', False):
+            with self.assertLogs('portal.ratelimit', 'WARNING') as logs:
+                ratelimit.client_ip(request)
+                ratelimit.client_ip(request)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('TRUSTED_PROXY_COUNT', logs.output[0])
+
+    @override_settings(DEBUG=False, RATE_LIMIT_ENABLED=True, RATE_LIMIT_CACHE='default')
+    def test_deploy_check_refuses_a_per_process_cache(self):
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        shared = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'cache'}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual([e.id for e in checks.check_rate_limit_cache(None)], ['portal.E001'])
+            with override_settings(RATE_LIMIT_ENABLED=False):
+                self.assertEqual(checks.check_rate_limit_cache(None), [])
+        with override_settings(CACHES=shared):
+            self.assertEqual(checks.check_rate_limit_cache(None), [])
+
+    def test_buckets_refill(self):
+        buckets = {'key': ratelimit.parse_rate('2/m')}
+        self.assertEqual(ratelimit.take(buckets, now=1000), {})
+        self.assertEqual(ratelimit.take(buckets, now=1000), {})
+        self.assertAlmostEqual(ratelimit.take(buckets, now=1010)['key'], 20)
+        self.assertEqual(ratelimit.take(buckets, now=1030), {})
+
+    def test_shared_across_processes(self):
+        url = reverse('anonymous_alert')
+        self.assertEqual(self.client.post(url, {'imei': '356938035643809'}).status_code, 302)
+        # Another worker: its own memory is empty, the shared bucket is not
+        ratelimit.local_buckets.clear()
+        response = self.client.post(url, {'imei': '356938035643809'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '3600')
+
+    def test_floods_are_refused_without_the_cache(self):
+        self.check('356938035643809')
+        self.check('356938035643817')
+        self.check('356938035643825')
+        self.assertEqual(self.check('356938035643825').status_code, 429)
+        with mock.patch('portal.ratelimit.take') as take:
+            for _ in range(20):
+                self.assertEqual(self.check('356938035643825').status_code, 429)
+        take.assert_not_called()
+
+    def test_unavailable_cache_fails_open(self):
+        with mock.patch('portal.ratelimit.take', side_effect=ConnectionError("cache down")):
+            self.assertEqual(self.check('356938035643809').status_code, 200)
+
+
+@override_settings(JOBS_EAGER=False, GEOIP_REMOTE_FALLBACK=False, SIGHTING_ALERT_WINDOW=3600)
+class SightingAlertTestCase(TestCase):
+    def setUp(self):
+        self.station = Station.objects.create(name="Market Division", location="Kano")
+        self.agent = User.objects.create_user(username='alert.agent', email='agent@test.com', password='pw')
+        self.report = make_report(self.station, owner_email="owner@test.com", reported_by=self.agent)
+
+    def sighting(self, ip, job='owner_sighting_alert'):
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs._registry[job](report_id=self.report.id, ip=ip, seen_at=str(timezone.now()))
+
+    def test_first_sighting_is_immediate_and_later_ones_coalesce(self):
+        self.sighting('10.0.0.1')
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('was Detected', mail.outbox[0].subject)
+
+        for ip in ('10.0.0.2', '10.0.0.3', '10.0.0.4'):
+            self.sighting(ip)
+        self.assertEqual(len(mail.outbox), 1)
+        window = SightingAlertWindow.objects.get()
+        self.assertEqual(window.pending_count, 3)
+        digest = Job.objects.get(name='sighting_digest')
+        self.assertAlmostEqual(digest.run_after, window.window_ends, delta=datetime.timedelta(seconds=1))
+
+        jobs._registry['sighting_digest'](**digest.payload)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[1].to, ['owner@test.com'])
+        self.assertIn('checked 3 more times', mail.outbox[1].subject)
+        for ip in ('10.0.0.2', '10.0.0.3', '10.0.0.4'):
+            self.assertIn(f'IP {ip}', mail.outbox[1].body)
+        window.refresh_from_db()
+        self.assertEqual((window.pending, window.pending_count), ([], 0))
+
+        # Once the window has closed, the next sighting is sent at once again
+        SightingAlertWindow.objects.update(window_ends=timezone.now())
+        self.sighting('10.0.0.5')
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertIn('was Detected', mail.outbox[2].subject)
+
+    def test_windows_are_per_recipient(self):
+        self.sighting('10.0.0.1')
+        self.sighting('10.0.0.2', job='agent_sighting_alert')
+        self.assertEqual([m.to for m in mail.outbox], [['owner@test.com'], ['agent@test.com']])
+        self.assertEqual(SightingAlertWindow.objects.count(), 2)
+
+    @override_settings(SIGHTING_DIGEST_MAX_ITEMS=1)
+    def test_digest_lists_a_bounded_number_of_sightings(self):
+        for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.3'):
+            self.sighting(ip, job='agent_sighting_alert')
+        alerts.send_digest(SightingAlertWindow.objects.get().pk)
+        self.assertIn('2 more sightings', mail.outbox[1].subject)
+        self.assertIn('IP 10.0.0.2', mail.outbox[1].body)
+        self.assertIn('... and 1 more.', mail.outbox[1].body)
+
+    def test_failed_digest_keeps_its_sightings(self):
+        self.sighting('10.0.0.1')
+        self.sighting('10.0.0.2')
+        window = SightingAlertWindow.objects.get()
+        with mock.patch('portal.alerts.send_mail', side_effect=ConnectionRefusedError("SMTP down")):
+            with self.assertRaises(ConnectionRefusedError):
+                alerts.send_digest(window.pk)
+        window.refresh_from_db()
+        self.assertEqual(window.pending_count, 1)
+        alerts.send_digest(window.pk)
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_sightings_after_a_dead_lettered_digest_are_still_alerted(self):
+        self.sighting('10.0.0.1')
+        self.sighting('10.0.0.2')
+        digest = Job.objects.get(name='sighting_digest')
+        with mock.patch('portal.alerts.send_mail', side_effect=ConnectionRefusedError("SMTP down")):
+            with self.assertRaises(ConnectionRefusedError):
+                jobs._registry['sighting_digest'](**digest.payload)
+        # The digest job ran out of retries
+        Job.objects.filter(pk=digest.pk).update(status=Job.StatusChoices.DEAD)
+
+        SightingAlertWindow.objects.update(window_ends=timezone.now())
+        self.sighting('10.0.0.3')
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn('IP Address: 10.0.0.3', mail.outbox[1].body)
+        # The sighting the dead digest held goes out straight away
+        requeued = Job.objects.get(name='sighting_digest', status=Job.StatusChoices.QUEUED)
+        self.assertLessEqual(requeued.run_after, timezone.now())
+        jobs._registry['sighting_digest'](**requeued.payload)
+        self.assertIn('IP 10.0.0.2', mail.outbox[2].body)
+
+        # Later sightings in the new window get their own digest
+        self.sighting('10.0.0.4')
+        self.assertEqual(Job.objects.filter(name='sighting_digest', status=Job.StatusChoices.QUEUED).count(), 2)
+
+    def test_retried_opening_alert_is_sent_not_digested(self):
+        seen_at = str(timezone.now())
+        alert = jobs._registry['owner_sighting_alert']
+        with mock.patch('portal.alerts.send_mail', side_effect=ConnectionRefusedError("SMTP down")):
+            with self.assertRaises(ConnectionRefusedError):
+                alert(report_id=self.report.id, ip='10.0.0.1', seen_at=seen_at)
+        with self.captureOnCommitCallbacks(execute=True):
+            alert(report_id=self.report.id, ip='10.0.0.1', seen_at=seen_at)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn('was Detected', mail.outbox[0].subject)
+        window = SightingAlertWindow.objects.get()
+        self.assertEqual((window.opening, window.pending_count), (None, 0))
+        self.assertFalse(Job.objects.filter(name='sighting_digest').exists())
+
+
+@override_settings(GEOIP_REMOTE_FALLBACK=False, RATE_LIMIT_ENABLED=False, SIGHTING_BATCH_SIZE=3, SIGHTING_FLUSH_INTERVAL=60)
+class SightingLogTestCase(TestCase):
+    def setUp(self):
+        sightings.buffer.clear()
+        self.addCleanup(sightings.buffer.clear)
+        self.station = Station.objects.create(name="Log Division", location="Lagos")
+        self.officer = User.objects.create_user(username='log.agent', password='pw')
+        OfficerProfile.objects.create(user=self.officer, station=self.station)
+        self.report = make_report(self.station)
+
+    def test_lookups_are_buffered_and_written_in_batches(self):
+        self.client.post(reverse('home'), {'imei': self.report.imei}, REMOTE_ADDR='10.0.0.1')
+        self.client.post(reverse('anonymous_alert'), {'imei': self.report.imei}, REMOTE_ADDR='10.0.0.2')
+        # Below the batch size and younger than the interval: still buffered
+        self.assertEqual(len(sightings.buffer), 2)
+        self.assertFalse(Sighting.objects.exists())
+
+        self.client.post(reverse('home'), {'imei': self.report.imei}, REMOTE_ADDR='10.0.0.3')
+        self.assertEqual(len(sightings.buffer), 0)
+        self.assertEqual(
+            list(self.report.sightings.order_by('created_at').values_list('source', 'ip', 'city')),
+            [('check', '10.0.0.1', 'Local'), ('tip', '10.0.0.2', 'Local'), ('check', '10.0.0.3', 'Local')],
+        )
+        # Clean devices leave no trace
+        self.client.post(reverse('home'), {'imei': '356938035643809'})
+        self.assertEqual(len(sightings.buffer), 0)
+
+    def test_flush_after_interval(self):
+        sightings.record(self.report.id, Sighting.SourceChoices.CHECK, '10.0.0.1')
+        with override_settings(SIGHTING_FLUSH_INTERVAL=0):
+            self.client.get(reverse('home'))
+        self.assertEqual(self.report.sightings.count(), 1)
+
+    def test_failed_batch_is_kept_and_bounded(self):
+        sightings.record(self.report.id, Sighting.SourceChoices.CHECK, 'not-an-ip')
+        sightings.record(self.report.id, Sighting.SourceChoices.CHECK, '10.0.0.1')
+        with mock.patch.object(Sighting.objects, 'bulk_create', side_effect=IntegrityError("down")):
+            self.assertEqual(sightings.buffer.flush(), 0)
+        self.assertEqual(len(sightings.buffer), 2)
+        with override_settings(SIGHTING_BUFFER_MAX=1), \
+                mock.patch.object(Sighting.objects, 'bulk_create', side_effect=IntegrityError("down")):
+            sightings.buffer.flush()
+        self.assertEqual(len(sightings.buffer), 1)
+
+        # Sightings of reports deleted meanwhile are dropped
+        sightings.record(DeviceReport.objects.order_by('-pk').first().pk + 1, Sighting.SourceChoices.TIP, '10.0.0.2')
+        self.assertEqual(sightings.buffer.flush(), 1)
+        self.assertEqual(self.report.sightings.get().ip, '10.0.0.1')
+
+    def test_report_detail_pages_through_sightings(self):
+        start = timezone.now() - datetime.timedelta(days=1)
+        Sighting.objects.bulk_create([
+            Sighting(report=self.report, source='check', ip=f'10.0.1.{i}', created_at=start + datetime.timedelta(minutes=i))
+            for i in range(5)
+        ])
+        self.client.force_login(self.officer)
+        url = reverse('report_detail', args=[self.report.id])
+        with override_settings(SIGHTINGS_PAGE_SIZE=3):
+            response = self.client.get(url)
+            self.assertEqual([s.ip for s in response.context['sightings']], ['10.0.1.4', '10.0.1.3', '10.0.1.2'])
+            self.assertContains(response, '10.0.1.4')
+            response = self.client.get(url + response.context['sightings_next_url'])
+        self.assertEqual([s.ip for s in response.context['sightings']], ['10.0.1.1', '10.0.1.0'])
+        self.assertIsNotNone(response.context['sightings_previous_url'])
+
+
+@override_settings(GEOIP_REMOTE_FALLBACK=False)
+class RollupTestCase(TestCase):
+    def setUp(self):
+        sightings.buffer.clear()
+        self.addCleanup(sightings.buffer.clear)
+        self.station = Station.objects.create(name="Rollup Division", location="Kano")
+        self.officer = User.objects.create_user(username='rollup.agent', password='pw')
+        OfficerProfile.objects.create(user=self.officer, station=self.station)
+
+    def report(self, n, brand="Tecno", incident_type="Robbery", status=DeviceReport.StatusChoices.STOLEN):
+        return make_report(self.station, imei=load_data.imei_for(n), transaction_ref=f"rollup-{n}", brand=brand,
+                           incident_type=incident_type, status=status)
+
+    def counts(self):
+        return {
+            (row.brand, row.status, row.incident_type): row.count
+            for row in ReportRollup.objects.filter(station=self.station, count__gt=0)
+        }
+
+    def test_kept_current_on_write(self):
+        first = self.report(1)
+        self.report(2)
+        self.report(3, brand="Apple", incident_type="Snatching")
+        self.assertEqual(self.counts(), {
+            ('Tecno', 'Stolen', 'Robbery'): 2, ('Apple', 'Stolen', 'Snatching'): 1,
+        })
+
+        first.status = DeviceReport.StatusChoices.RECOVERED
+        first.save()
+        DeviceReport.objects.get(transaction_ref='rollup-3').delete()
+        self.assertEqual(self.counts(), {
+            ('Tecno', 'Stolen', 'Robbery'): 1, ('Tecno', 'Recovered', 'Robbery'): 1,
+        })
+
+        sightings.record(first.id, Sighting.SourceChoices.CHECK, '127.0.0.1')
+        sightings.record(first.id, Sighting.SourceChoices.TIP, '127.0.0.1')
+        sightings.buffer.flush()
+        self.assertEqual(
+            list(SightingRollup.objects.values_list('station_id', 'day', 'city', 'count')),
+            [(self.station.id, timezone.localdate(), 'Local', 2)],
+        )
+
+    def test_compaction_matches_and_corrects_drift(self):
+        for n in range(6):
+            self.report(n, brand=["Tecno", "Apple"][n % 2])
+        incremental = self.counts()
+        # Bypasses the signals, as bulk loads and queryset updates do
+        DeviceReport.objects.filter(brand="Apple").update(status=DeviceReport.StatusChoices.RECOVERED)
+        self.assertEqual(self.counts(), incremental)
+
+        out = io.StringIO()
+        call_command('compact_rollups', stdout=out)
+        self.assertIn('Wrote 2 report', out.getvalue())
+        self.assertEqual(self.counts(), {
+            ('Tecno', 'Stolen', 'Robbery'): 3, ('Apple', 'Recovered', 'Robbery'): 3,
+        })
+        self.assertFalse(ReportRollup.objects.filter(count__lte=0).exists())
+
+        call_command('compact_rollups', days=1, station=[self.station.id], stdout=io.StringIO())
+        self.assertEqual(sum(self.counts().values()), 6)
+
+    def test_analytics_page_reads_only_rollups(self):
+        self.client.force_login(self.officer)
+        url = reverse('station_analytics')
+        self.report(0)
+        with CaptureQueriesContext(connections['default']) as few:
+            self.client.get(url)
+        for n in range(1, 40):
+            self.report(n, brand=["Tecno", "Apple", "Samsung", "itel", "Xiaomi", "Google", "Nokia"][n % 7],
+                        incident_type=["Robbery", "Lost"][n % 2])
+        with CaptureQueriesContext(connections['default']) as many:
+            response = self.client.get(url, {'weeks': 4})
+        self.assertEqual(len(many), len(few))
+        self.assertFalse(any('portal_devicereport' in q['sql'] for q in many.captured_queries))
+
+        self.assertEqual(len(response.context['weeks']), 4)
+        self.assertEqual(response.context['weekly_totals'][-1], 40)
+        brands = response.context['by_brand']
+        self.assertEqual(len(brands), 6)
+        self.assertEqual(brands[-1]['name'], 'Other')
+        self.assertEqual(sum(b['total'] for b in brands), 40)
+        self.assertEqual({row['name']: row['total'] for row in response.context['by_incident_type']},
+                         {'Robbery': 20, 'Lost': 20})
+        self.assertContains(response, 'Thefts per Week by Brand')
+
+    def test_unpaid_and_rejected_reports_are_not_thefts(self):
+        self.report(0)
+        self.report(1, status=DeviceReport.StatusChoices.PAYMENT_PENDING)
+        self.report(2, status=DeviceReport.StatusChoices.REJECTED)
+        analytics = rollups.station_analytics(self.station.id, weeks=4)
+        self.assertEqual(analytics['weekly_totals'][-1], 1)
+        self.assertEqual(sum(row['total'] for row in analytics['by_status']), 3)
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def test_reseeding_keeps_rollups_in_step(self):
+        self.report(0)
+        for _ in range(2):
+            call_command('seed_data', stdout=io.StringIO())
+        self.assertFalse(ReportRollup.objects.filter(count__lt=0).exists())
+        self.assertEqual(
+            ReportRollup.objects.aggregate(total=Sum('count'))['total'], DeviceReport.objects.count(),
+        )
+
+
+@override_settings(JOBS_EAGER=False, IMPORT_CHUNK_SIZE=2)
+class ImportReportsTestCase(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(self.settings(MEDIA_ROOT=media_root))
+        self.station = Station.objects.create(name="Legacy Division", location="Kaduna")
+        self.officer = User.objects.create_user(username='import.agent', password='pw')
+        OfficerProfile.objects.create(user=self.officer, station=self.station)
+        self.existing = make_report(self.station, imei=load_data.imei_for(9))
+
+    def registry_csv(self):
+        bad_checksum = load_data.imei_for(1)[:-1] + str((int(load_data.imei_for(1)[-1]) + 1) % 10)
+        return (
+            "IMEI,Make,Model,Owner,Phone,Date Stolen,Time,Status,Date Reported\n"
+            f"{load_data.imei_for(1)},Tecno,Camon 20,Ada Obi,0803,14/02/2021,18:30,Stolen,\n"
+            f"{bad_checksum},Tecno,Camon 20,Ada Obi,0803,14/02/2021,,Stolen,\n"
+            f"{load_data.imei_for(1)},Tecno,Camon 20,Ada Obi,0803,14/02/2021,,Stolen,\n"
+            f"{load_data.imei_for(9)},Tecno,Spark,Musa Bello,0805,2021-03-01,,,\n"
+            f"{load_data.imei_for(2)},,Galaxy,Musa Bello,0805,2021-03-01,,,\n"
+            f"{load_data.imei_for(3)},Samsung,Galaxy,Musa Bello,0805,2021-03-01,,Pending,\n"
+            "\n"
+            f"{load_data.imei_for(4)},Samsung,Galaxy A14,Musa Bello,0805,2021-03-01,,recovered,2021-03-05\n"
+        )
+
+    def test_command_imports_and_reports_rejections(self):
+        path = os.path.join(settings.MEDIA_ROOT, 'registry.csv')
+        with open(path, 'w') as f:
+            f.write(self.registry_csv())
+        rejections_path = os.path.join(settings.MEDIA_ROOT, 'rejected.csv')
+        stolen_index.refresh()
+
+        out = io.StringIO()
+        call_command('import_reports', path, station='legacy division', agent='import.agent',
+                     rejections=rejections_path, stdout=out)
+        self.assertIn('2 reports imported, 5 rows rejected', out.getvalue())
+
+        upload = ReportImport.objects.get()
+        self.assertEqual((upload.status, upload.rows_done, upload.imported, upload.rejected), ('Done', 9, 2, 5))
+        first = DeviceReport.objects.get(imei=load_data.imei_for(1))
+        self.assertEqual((first.brand, first.reported_by, first.station), ('Tecno', self.officer, self.station))
+        self.assertEqual(first.imei_reversed, first.imei[::-1])
+        self.assertEqual(first.incident_date, datetime.date(2021, 2, 14))
+        self.assertEqual(timezone.localtime(first.created_at).date(), datetime.date(2021, 2, 14))
+        recovered = DeviceReport.objects.get(imei=load_data.imei_for(4))
+        self.assertEqual(recovered.status, DeviceReport.StatusChoices.RECOVERED)
+        self.assertEqual(timezone.localtime(recovered.created_at).date(), datetime.date(2021, 3, 5))
+
+        with open(rejections_path) as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ['row', 'imei', 'reason'])
+        reasons = {int(row[0]): row[2] for row in rows[1:]}
+        self.assertEqual(sorted(reasons), [3, 4, 5, 6, 7])
+        self.assertIn('checksum', reasons[3].lower())
+        self.assertIn('already registered', reasons[4])
+        self.assertIn('already registered', reasons[5])
+        self.assertIn('Missing brand', reasons[6])
+        self.assertIn('status', reasons[7])
+
+        # Bulk inserts skip the signals; the import refreshes the index and rollups itself
+        self.assertTrue(stolen_index.contains(load_data.imei_for(1)))
+        self.assertEqual(
+            ReportRollup.objects.get(station=self.station, day=datetime.date(2021, 2, 14)).count, 1,
+        )
+
+    def test_ndjson_rows(self):
+        path = os.path.join(settings.MEDIA_ROOT, 'registry.ndjson')
+        with open(path, 'w') as f:
+            f.write(json.dumps({'imei': load_data.imei_for(5), 'brand': 'itel', 'model': 'A70',
+                                'owner_full_name': 'Ada Obi', 'incident_date': '2020-06-01'}) + "\n")
+            f.write("{not json\n")
+            f.write(json.dumps([load_data.imei_for(6)]) + "\n")
+            f.write(json.dumps({'imei': int(load_data.imei_for(6)), 'brand': 'itel', 'model': 'A70',
+                                'owner_full_name': 'Ada Obi', 'incident_date': '01.06.2020'}) + "\n")
+        call_command('import_reports', path, station=str(self.station.id), stdout=io.StringIO())
+        upload = ReportImport.objects.get()
+        self.assertEqual((upload.format, upload.imported, upload.rejected), ('ndjson', 2, 2))
+        self.assertEqual(list(upload.rejections.values_list('row_number', flat=True).order_by('row_number')), [2, 3])
+
+    def test_rows_registered_during_the_insert_are_rejected(self):
+        path = os.path.join(settings.MEDIA_ROOT, 'registry.csv')
+        with open(path, 'w') as f:
+            f.write("imei,brand,model,owner,date\n")
+            f.write(f"{load_data.imei_for(1)},Tecno,Spark,Ada Obi,2021-03-01\n")
+            f.write(f"{load_data.imei_for(2)},Tecno,Spark,Ada Obi,2021-03-01\n")
+        bulk_create = DeviceReport.objects.bulk_create
+
+        def racing_bulk_create(objs, **kwargs):
+            # Another agent registers the first IMEI after the duplicate check
+            make_report(self.station, imei=load_data.imei_for(1), transaction_ref="racer")
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(DeviceReport.objects, 'bulk_create', side_effect=racing_bulk_create):
+            call_command('import_reports', path, station=str(self.station.id), chunk_size=10, stdout=io.StringIO())
+        upload = ReportImport.objects.get()
+        self.assertEqual((upload.imported, upload.rejected), (1, 1))
+        rejection = upload.rejections.get()
+        self.assertEqual((rejection.row_number, rejection.imei), (2, load_data.imei_for(1)))
+        self.assertIn('registered while the import ran', rejection.reason)
+
+    def test_undecodable_rows_are_rejected_or_read_in_the_chosen_encoding(self):
+        path = os.path.join(settings.MEDIA_ROOT, 'registry.csv')
+        with open(path, 'wb') as f:
+            f.write("imei,brand,model,owner,date\n".encode())
+            f.write(f"{load_data.imei_for(1)},Tecno,Spark,Ada Obi,2021-03-01\n".encode())
+            f.write(f"{load_data.imei_for(2)},Tecno,Spark,Adé Okafor,2021-03-01\n".encode('latin-1'))
+        call_command('import_reports', path, station=str(self.station.id), stdout=io.StringIO())
+        upload = ReportImport.objects.get()
+        self.assertEqual((upload.imported, upload.rejected), (1, 1))
+        self.assertIn('Not valid utf-8 text', upload.rejections.get().reason)
+
+        DeviceReport.objects.filter(imei=load_data.imei_for(1)).delete()
+        call_command('import_reports', path, station=str(self.station.id), encoding='latin-1', stdout=io.StringIO())
+        self.assertEqual(DeviceReport.objects.get(imei=load_data.imei_for(2)).owner_full_name, "Adé Okafor")
+
+    def test_upload_page_queues_a_resumable_import(self):
+        self.client.force_login(self.officer)
+        url = reverse('import_reports')
+        response = self.client.post(url, {'file': SimpleUploadedFile('notes.txt', b'x'), 'encoding': 'utf-8'})
+        self.assertContains(response, 'Upload a .csv')
+
+        registry = SimpleUploadedFile('registry.csv', self.registry_csv().encode('utf-8-sig'))
+        response = self.client.post(url, {'file': registry, 'encoding': 'utf-8'})
+        self.assertRedirects(response, url)
+        upload = ReportImport.objects.get()
+        self.assertEqual((upload.status, upload.uploaded_by, upload.format), ('Queued', self.officer, 'csv'))
+        job = Job.objects.get(name='import_reports')
+        self.assertEqual(job.payload, {'import_id': upload.id})
+
+        # Out of time after the first chunk: the job queues its own continuation
+        with self.settings(IMPORT_JOB_SECONDS=0):
+            self.assertEqual(jobs.claim(10), [job.id])
+            self.assertTrue(jobs.execute(job.id))
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.rows_done), ('Running', 3))
+
+        continuation = jobs.claim(10)
+        self.assertEqual(len(continuation), 1)
+        self.assertTrue(jobs.execute(continuation[0]))
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.imported, upload.rejected), ('Done', 2, 5))
+        self.assertEqual(upload.rejections.count(), 5)
+
+        response = self.client.get(url)
+        self.assertContains(response, 'registry.csv')
+        response = self.client.get(reverse('import_rejections', args=[upload.id]))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertTrue(lines[1].startswith('3,'))
+
+        other = User.objects.create_user(username='other.agent', password='pw')
+        OfficerProfile.objects.create(user=other, station=Station.objects.create(name="Other", location="Jos"))
+        self.client.force_login(other)
+        self.assertRedirects(self.client.get(reverse('import_rejections', args=[upload.id])), reverse('dashboard'),
+                             fetch_redirect_response=False)
+
@@ -0,0 +1,148 @@
+# portal/uploads.py
+"""
+Streaming validation for proof uploads.
+
+Django's default upload handlers store the whole file before any form
+validator runs, and the browser-supplied content type is all the old
+validators looked at. ValidatingUploadHandler checks each proof file as the
+multipart body is parsed instead:
+
+- the real type is sniffed from the magic bytes of the first chunk, and
+  anything but JPEG/PNG/PDF is dropped there;
+- a file is dropped as soon as it passes PROOF_UPLOAD_MAX_SIZE;
+- when the request's declared length could not possibly be valid, proof
+  files are dropped without buffering any of their bytes;
+- the SHA-256 of accepted files is computed chunk by chunk and exposed as
+  `uploaded_file.sha256`, alongside `uploaded_file.sniffed_content_type`.
+
+Dropped files never reach request.FILES; the reason is kept in
+request.upload_errors for the form to report. Views opt in with:
+
+    @validate_uploads(PublicReportForm)
+    def public_report_view(request): ...
+"""
+import hashlib
+import tempfile
+from functools import wraps
+
+from django import forms
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+
+# Leading bytes of each accepted type
+SIGNATURES = {
+    'image/jpeg': (b'\xff\xd8\xff',),
+    'image/png': (b'\x89PNG\r\n\x1a\n',),
+    'application/pdf': (b'%PDF-',),
+}
+
+# Room for the non-file fields and multipart framing of a report form
+FORM_OVERHEAD = 1024 * 1024
+
+
+def sniff_content_type(head):
+    """The type whose signature `head` starts with, or None."""
+    for content_type, signatures in SIGNATURES.items():
+        if head.startswith(signatures):
+            return content_type
+    return None
+
+
+def file_fields(form_class):
+    return [name for name, field in form_class.base_fields.items() if isinstance(field, forms.FileField)]
+
+
+class ValidatingUploadHandler(FileUploadHandler):
+    """
+    Stores uploads like Django's default handlers (in memory up to
+    FILE_UPLOAD_MAX_MEMORY_SIZE, then on disk), validating and hashing the
+    `fields` it is given as they stream in.
+    """
+
+    def __init__(self, request=None, fields=None, max_size=None, allowed_types=None):
+        super().__init__(request)
+        self.fields = set(fields or ())
+        self.max_size = max_size or settings.PROOF_UPLOAD_MAX_SIZE
+        self.allowed_types = set(allowed_types or settings.PROOF_UPLOAD_TYPES)
+        self.errors = {}
+        self.oversized_request = False
+        if request is not None:
+            request.upload_errors = self.errors
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Too big to be valid: every proof file is dropped as soon as it
+        # starts, while the small fields (CSRF token, form data) still parse.
+        self.oversized_request = bool(
+            content_length and content_length > self.max_size * len(self.fields) + FORM_OVERHEAD
+        )
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.checked = self.field_name in self.fields
+        self.detected_type = None
+        self.hasher = hashlib.sha256()
+        self.file = tempfile.SpooledTemporaryFile(max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE, suffix='.upload')
+        if self.checked and (self.oversized_request or (self.content_length or 0) > self.max_size):
+            self.reject(f"File size must be under {self.max_size // (1024 * 1024)}MB.")
+
+    def reject(self, message):
+        self.errors[self.field_name] = message
+        self.file.close()
+        raise SkipFile()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.checked:
+            if start == 0:
+                self.detected_type = sniff_content_type(raw_data)
+                if self.detected_type not in self.allowed_types:
+                    self.reject("Unsupported file type. Use JPEG, PNG, or PDF.")
+            if start + len(raw_data) > self.max_size:
+                self.reject(f"File size must be under {self.max_size // (1024 * 1024)}MB.")
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+        # Consumed here; no later handler needs the chunk.
+        return None
+
+    def file_complete(self, file_size):
+        if self.checked and file_size == 0:
+            # Not a SkipFile: the parser only catches that while streaming.
+            self.errors[self.field_name] = "The uploaded file is empty."
+            self.file.close()
+            return None
+        self.file.seek(0)
+        uploaded = UploadedFile(
+            file=self.file,
+            name=self.file_name,
+            content_type=self.detected_type or self.content_type,
+            size=file_size,
+            charset=self.charset,
+            content_type_extra=self.content_type_extra,
+        )
+        uploaded.sha256 = self.hasher.hexdigest()
+        uploaded.sniffed_content_type = self.detected_type
+        return uploaded
+
+
+def validate_uploads(form_class):
+    """
+    Parse POSTs to the decorated view with ValidatingUploadHandler for the
+    form's file fields.
+
+    Upload handlers must be installed before anything reads request.POST,
+    which CsrfViewMiddleware does; so the CSRF check moves inside.
+    """
+    fields = file_fields(form_class)
+
+    def decorator(view):
+        protected = csrf_protect(view)
+
+        @csrf_exempt
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method == 'POST':
+                request.upload_handlers = [ValidatingUploadHandler(request, fields)]
+            return protected(request, *args, **kwargs)
+        return wrapped
+    return decorator
@@ -15,12 +15,16 @@ urlpatterns = [
     # Officer Portal
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('reports/', views.view_reports_view, name='view_reports'),
+    path('analytics/', views.station_analytics_view, name='station_analytics'),
+    path('reports/import/', views.import_reports_view, name='import_reports'),
+    path('reports/import/<int:import_id>/rejections.csv', views.import_rejections_view, name='import_rejections'),
     # Updated URL for multi-step form
     path('reports/create/<int:step>/', views.create_report_view, name='create_report'),
     path('report-stolen/', views.public_report_view, name='public_report'),
     path('reports/<int:report_id>/review/', views.view_reports_view, name='review_report'),
     path('reports/<int:report_id>/manage/', views.report_detail_view, name='report_detail'),
     path('verify-payment/', views.verify_payment_view, name='verify_payment'), # <--- ADD THIS
+    path('payments/paystack/webhook/', views.paystack_webhook_view, name='paystack_webhook'),
 
     path('faq/', views.faq, name='faq'),
     path('contact/', views.contact, name='contact'),
@@ -29,4 +33,11 @@ urlpatterns = [
     path('your-secret-seeding-url-12345/', views.seed_database_view, name='seed_database'),
     path('anonymous-alert/', views.anonymous_alert_view, name='anonymous_alert'),
 
+    # Partner API
+    path('api/imei/batch/', views.imei_batch_view, name='imei_batch'),
+    path('api/imei/tac/<str:imei>/', views.tac_lookup_view, name='tac_lookup'),
+
+    # Monitoring
+    path('metrics', views.metrics_view, name='metrics'),
+
 ]
\ No newline at end of file
@@ -1,18 +1,41 @@
 # portal/validators.py
+from django.conf import settings
 from django.core.exceptions import ValidationError
 
+from .uploads import sniff_content_type
+
+def luhn_check_digit(digits):
+    """The Luhn check digit that completes `digits` (the first 14 digits of an IMEI)."""
+    total = 0
+    for i, c in enumerate(reversed(digits)):
+        d = int(c)
+        if i % 2 == 0:
+            # Doubled positions count from the right, next to the check digit
+            d = d * 2 - 9 if d > 4 else d * 2
+        total += d
+    return str(-total % 10)
+
+
 def validate_imei(value):
     if not value.isdigit() or len(value) != 15:
         raise ValidationError("IMEI must be a 15-digit number.")
+    if luhn_check_digit(value[:14]) != value[14]:
+        raise ValidationError("Invalid IMEI checksum. Please check the number.")
 
 
 def validate_file_size(file):
-    max_size = 5 * 1024 * 1024  # 5MB
+    max_size = settings.PROOF_UPLOAD_MAX_SIZE
     if file.size > max_size:
-        raise ValidationError("File size must be under 5MB.")
+        raise ValidationError(f"File size must be under {max_size // (1024 * 1024)}MB.")
 
 
 def validate_file_type(file):
-    valid_types = ['image/jpeg', 'image/png', 'application/pdf']
-    if file.content_type not in valid_types:
+    # Judge by the file's leading bytes, not the client-supplied content type.
+    detected = getattr(file, 'sniffed_content_type', None)
+    if detected is None:
+        position = file.tell()
+        file.seek(0)
+        detected = sniff_content_type(file.read(16))
+        file.seek(position)
+    if detected not in settings.PROOF_UPLOAD_TYPES:
         raise ValidationError("Unsupported file type. Use JPEG, PNG, or PDF.")
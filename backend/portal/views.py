@@ -1,21 +1,43 @@
 # backend/portal/views.py
 from django.utils import timezone
+import json
 import random
+import hmac
+import secrets
 import datetime
 from django.shortcuts import render, redirect, reverse, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.core.mail import send_mail, BadHeaderError
 from django.contrib.auth.models import User
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from django.core.management import call_command
 from django.conf import settings
 import logging
-import requests
-import ipaddress
-
-from .models import DeviceReport
-from .forms import ReportStep1Form, ReportStep2Form, ReportStep3Form, ReportStep4Form, PublicReportForm
+from urllib.parse import urlencode
+
+from .models import DeviceReport, ReportImport, Sighting
+from .imei_index import stolen_index
+from . import sightings
+from . import tac
+from .imei_batch import BatchError, iter_submitted_imeis, resolve_batch, to_ndjson
+from . import metrics
+from .jobs import enqueue
+from .payments import mark_report_paid, record_event, verify_signature
+from .uploads import validate_uploads
+from .derivatives import proof_previews
+from .db_router import read_replica
+from .ratelimit import client_ip, rate_limit
+from .geoip import get_geo_location
+from .http_client import get_client
+from .dashboard import station_stats
+from .rollups import station_analytics
+from .report_import import format_for, rejection_lines
+from .pagination import keyset_paginate
+from .imei_search import search_reports
+from .forms import ReportStep1Form, ReportStep2Form, ReportStep3Form, ReportStep4Form, PublicReportForm, ReportImportForm
 
 logger = logging.getLogger(__name__)
 
@@ -30,85 +52,54 @@ def get_client_ip(request):
         ip = request.META.get('REMOTE_ADDR')
     return ip
 
-def get_geo_location(ip):
-    """Retrieves geolocation data for an IP address."""
-    default_location = {"city": "Unknown", "country": "Unknown", "full": "Unknown Location"}
-    
-    if ip == '127.0.0.1' or ip == 'localhost':
-        return {"city": "Local", "country": "Network", "full": "Local Test Network"}
-
-    try:
-        if ipaddress.ip_address(ip).is_private:
-            return {"city": "Local", "country": "Network", "full": "Local Network"}
-    except ValueError:
-        pass
+def get_posted_imei(request):
+    return (request.POST.get('imei') or '').strip()
 
-    try:
-        r = requests.get(f"https://ipinfo.io/{ip}/json", timeout=5)
-        if r.status_code == 200:
-            data = r.json()
-            city = data.get('city', 'Unknown')
-            region = data.get('region', '')
-            country = data.get('country', 'Nigeria')
-            parts = [city, region, country]
-            full_loc = ", ".join([p for p in parts if p])
-            return {"city": city, "country": country, "full": full_loc}
-    except Exception as e:
-        logger.warning(f"GeoIP lookup failed for {ip}: {e}")
-
-    return default_location
-
-# --- MOCK OCR FUNCTION ---
-def verify_documents_ocr(police_report, receipt, imei_text):
-    if police_report and receipt:
-        print(f"OCR Scanning: {police_report.name}...")
-        print(f"OCR Scanning: {receipt.name}...")
-        print(f"Verifying IMEI: {imei_text} match found.")
-        return True
-    return False
+def get_partner_key(request):
+    """The batch API key the request authenticates with, or None."""
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return None
+    key = header[len('Bearer '):].strip()
+    for allowed in settings.IMEI_BATCH_API_KEYS:
+        if allowed and hmac.compare_digest(key.encode(), allowed.encode()):
+            return key
+    return None
 
 # -------------------- PUBLIC VIEWS --------------------
 
+@rate_limit('home', ip=client_ip, imei=get_posted_imei)
+@read_replica
 def home_view(request):
     imei_result = None
     if request.method == 'POST':
         imei = request.POST.get('imei')
         try:
+            # Most checks are for clean devices; the in-memory index answers
+            # those without a database round-trip.
+            if not stolen_index.contains(imei):
+                raise DeviceReport.DoesNotExist
             report = DeviceReport.objects.get(imei=imei, status=DeviceReport.StatusChoices.STOLEN)
+
             ip = get_client_ip(request)
-            location_data = get_geo_location(ip)
+            sightings.record(report.id, Sighting.SourceChoices.CHECK, ip)
+            # Local range file only; never wait on the remote provider here.
+            location_data = get_geo_location(ip, allow_remote=False)
 
             imei_result = {
                 'status': 'stolen',
                 'message': f'This device (IMEI: {imei}) has been reported stolen.',
                 'imei': imei,
-                'location': location_data
+                'location': location_data if location_data['city'] != 'Unknown' else None
             }
 
-            # Notify the Reporter (Victim)
+            # Notify the Reporter (Victim). The email (and any remote geo
+            # lookup) runs in a background worker.
             if report.owner_email:
                 try:
-                    subject = f"SafeIMEI Alert: Your Stolen Device (IMEI: {imei}) was Detected!"
-                    message = f"""
-Dear {report.owner_full_name},
-
-Important Update:
-Your stolen device (IMEI: {imei}) was just searched on the SafeIMEI database.
-This usually means someone is trying to buy or sell it right now.
-
---- Sighting Details ---
-Time: {timezone.now()}
-Approximate Location: {location_data.get('full', 'Unknown')}
-IP Address: {ip}
------------------------
-
-Please forward this information to your recovery agent immediately.
-
-SafeIMEI Security Team
-                    """
-                    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [report.owner_email], fail_silently=True)
+                    enqueue('owner_sighting_alert', report_id=report.id, ip=ip, seen_at=str(timezone.now()))
                 except Exception as e:
-                    logger.error(f"Failed to send sighting alert: {e}")
+                    logger.error(f"Failed to queue sighting alert: {e}")
 
         except DeviceReport.DoesNotExist:
             imei_result = {'status': 'safe', 'message': f'This device (IMEI: {imei}) has not been reported stolen.'}
@@ -119,51 +110,76 @@ SafeIMEI Security Team
     alert_success = request.GET.get('alert_success', False)
     return render(request, 'home.html', {'imei_result': imei_result, 'alert_success': alert_success})
 
+@rate_limit('anonymous_alert', ip=client_ip, imei=get_posted_imei)
+@read_replica
 def anonymous_alert_view(request):
     if request.method == 'POST':
         imei = request.POST.get('imei')
         if imei:
             try:
                 report = DeviceReport.objects.get(imei=imei, status=DeviceReport.StatusChoices.STOLEN)
-                
-                # Find Recipient (Agent)
-                recipient_email = None
-                if report.reported_by and report.reported_by.email:
-                    recipient_email = report.reported_by.email
-                elif report.station:
-                    # Fallback: Send to ANY agent at that station
-                    officer = User.objects.filter(officerprofile__station=report.station).first()
-                    if officer and officer.email:
-                        recipient_email = officer.email
-                
-                if recipient_email:
-                    ip = get_client_ip(request)
-                    location_data = get_geo_location(ip)
-                    subject = f"Anonymous Tip: Stolen Device (IMEI: {imei})"
-                    message = f"""
-ALERT: A stolen device has just been scanned on SafeIMEI.
-
-Device Details:
-- IMEI: {imei}
-- Brand: {report.brand} {report.model}
-- Center: {report.station.name}
-
-Sighting Information:
-- Approx Location: {location_data.get('full', 'Unknown')}
-- IP Address: {ip}
-
-This is an automated intelligence alert.
-                    """
-                    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [recipient_email], fail_silently=False)
-                else:
-                    logger.warning(f"No agent found to receive alert for IMEI {imei}")
-
+                ip = get_client_ip(request)
+                sightings.record(report.id, Sighting.SourceChoices.TIP, ip)
+                enqueue('agent_sighting_alert', report_id=report.id, ip=ip, seen_at=str(timezone.now()))
             except Exception as e:
                 logger.error(f"Error in anonymous_alert_view: {e}")
 
             return redirect(f"{reverse('home')}?alert_success=True")
     return redirect('home')
 
+# -------------------- PARTNER API --------------------
+
+@csrf_exempt
+@require_POST
+@rate_limit('imei_batch', ip=client_ip, partner=get_partner_key)
+def imei_batch_view(request):
+    """
+    Bulk IMEI status check for retailers and repair shops.
+
+    Accepts a JSON list (or {"imeis": [...]}), a CSV/NDJSON request body, or a
+    multipart 'file' upload, and streams back one NDJSON line per IMEI.
+    Batch checks do not trigger owner emails or geo lookups. Partners must
+    send one of IMEI_BATCH_API_KEYS as a bearer token.
+    """
+    if get_partner_key(request) is None:
+        return JsonResponse({'error': 'A valid partner API key is required.'}, status=401)
+    try:
+        imeis = iter_submitted_imeis(request)
+    except BatchError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+    if isinstance(imeis, list) and len(imeis) > settings.IMEI_BATCH_MAX_ITEMS:
+        return JsonResponse(
+            {'error': f"A batch may contain at most {settings.IMEI_BATCH_MAX_ITEMS} IMEIs."},
+            status=413
+        )
+
+    return StreamingHttpResponse(to_ndjson(resolve_batch(imeis)), content_type='application/x-ndjson')
+
+def metrics_view(request):
+    """Prometheus scrape endpoint (see portal/metrics.py)."""
+    token = settings.METRICS_AUTH_TOKEN
+    if not token:
+        # Route names, latencies and outbound timings are not for the public
+        if not settings.DEBUG:
+            return HttpResponse("Set METRICS_AUTH_TOKEN to enable /metrics.", status=403, content_type='text/plain')
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+        return HttpResponse(status=401)
+    try:
+        body, content_type = metrics.render()
+    except metrics.MetricsUnavailable as e:
+        return HttpResponse(str(e), status=503, content_type='text/plain')
+    return HttpResponse(body, content_type=content_type)
+
+def tac_lookup_view(request, imei):
+    """Brand and model for an IMEI's first 8 digits; prefills the report form."""
+    device = tac.lookup(imei)
+    if device is None:
+        return JsonResponse({'error': 'Unknown TAC.'}, status=404)
+    response = JsonResponse(device)
+    response['Cache-Control'] = 'public, max-age=86400'
+    return response
+
 # -------------------- AUTHENTICATION --------------------
 
 def officer_login_view(request):
@@ -177,13 +193,14 @@ def officer_login_view(request):
                 code = random.randint(100000, 999999)
                 request.session['2fa_code'] = code
                 request.session['2fa_user_id'] = user.id
-                send_mail(
-                    'Your SafeIMEI Login Code',
-                    f'Your verification code is: {code}',
-                    settings.DEFAULT_FROM_EMAIL,
-                    [user.email],
-                    fail_silently=False
-                )
+                with metrics.timed_outbound('email'):
+                    send_mail(
+                        'Your SafeIMEI Login Code',
+                        f'Your verification code is: {code}',
+                        settings.DEFAULT_FROM_EMAIL,
+                        [user.email],
+                        fail_silently=False
+                    )
                 return redirect('verify_2fa')
             except Exception as e:
                 logger.error(f"Email error: {e}")
@@ -220,18 +237,14 @@ def officer_logout_view(request):
 
 # -------------------- PUBLIC REPORTING & PAYMENTS --------------------
 
+@validate_uploads(PublicReportForm)
 def public_report_view(request):
     if request.method == 'POST':
-        form = PublicReportForm(request.POST, request.FILES)
+        form = PublicReportForm(request.POST, request.FILES, upload_errors=request.upload_errors)
         if form.is_valid():
             try:
-                ref_code = f"PAY-{random.randint(100000, 999999)}"
-                ocr_passed = verify_documents_ocr(
-                    form.cleaned_data['police_report_image'],
-                    form.cleaned_data['device_receipt'],
-                    form.cleaned_data['imei']
-                )
-
+                # Must be unique across all reports (see DeviceReport.Meta)
+                ref_code = f"PAY-{secrets.token_hex(6).upper()}"
                 report = DeviceReport(
                     owner_full_name=form.cleaned_data['owner_full_name'],
                     owner_phone_number=form.cleaned_data['owner_phone_number'],
@@ -246,24 +259,28 @@ def public_report_view(request):
                     incident_location=form.cleaned_data['incident_description'],
                     police_report_image=form.cleaned_data['police_report_image'],
                     device_receipt=form.cleaned_data['device_receipt'],
-                    ocr_verification_status=ocr_passed,
                     station=form.cleaned_data['incident_state'],
                     transaction_ref=ref_code,
                     status=DeviceReport.StatusChoices.PAYMENT_PENDING
                 )
                 report.save()
-                
+
+                # Documents are OCR-checked against the IMEI in the background
+                try:
+                    enqueue('verify_report_documents', report_id=report.id)
+                except Exception as e:
+                    logger.error(f"Failed to queue OCR for report {report.id}: {e}")
+
                 # Paystack Init
-                paystack_url = "https://api.paystack.co/transaction/initialize"
                 headers = {"Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}", "Content-Type": "application/json"}
                 data = {
                     "email": report.owner_email,
-                    "amount": 100000, 
+                    "amount": settings.PAYSTACK_REPORT_AMOUNT,
                     "reference": ref_code,
                     "callback_url": request.build_absolute_uri(reverse('verify_payment')),
                     "metadata": {"custom_fields": [{"display_name": "IMEI", "variable_name": "imei", "value": report.imei}]}
                 }
-                response = requests.post(paystack_url, headers=headers, json=data)
+                response = get_client('paystack').post('/transaction/initialize', headers=headers, json=data)
                 response_data = response.json()
 
                 if response_data['status']:
@@ -272,7 +289,7 @@ def public_report_view(request):
                     form.add_error(None, "Payment initialization failed.")
             except Exception as e:
                 logger.error(f"Error in public report: {e}")
-                if "unique constraint" in str(e):
+                if "unique constraint" in str(e).lower() and "imei" in str(e):
                     form.add_error('imei', "This IMEI has already been reported.")
                 else:
                     form.add_error(None, "An unexpected error occurred.")
@@ -281,61 +298,143 @@ def public_report_view(request):
     return render(request, 'public_report.html', {'form': form})
 
 def verify_payment_view(request):
+    """
+    Where Paystack sends the payer after checkout. The webhook confirms the
+    payment, so this only reads the report's status.
+    """
     reference = request.GET.get('reference')
     if not reference: return redirect('public_report')
 
-    try:
-        verify_url = f"https://api.paystack.co/transaction/verify/{reference}"
-        headers = {"Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}"}
-        response = requests.get(verify_url, headers=headers)
-        response_data = response.json()
-
-        if response_data['status'] and response_data['data']['status'] == 'success':
-            report = get_object_or_404(DeviceReport, transaction_ref=reference)
-            
-            if report.status == DeviceReport.StatusChoices.PAYMENT_PENDING:
-                report.status = DeviceReport.StatusChoices.PENDING
-                report.save()
-                try:
-                    subject = f"SafeIMEI Report Received - {report.transaction_ref}"
-                    message = f"Dear {report.owner_full_name},\n\nPayment received. Your report for IMEI {report.imei} is now PENDING VERIFICATION at our {report.station.name} center."
-                    send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, [report.owner_email], fail_silently=True)
-                except: pass
-                return render(request, 'report_success.html', {'report': report})
-            elif report.status == DeviceReport.StatusChoices.PENDING:
-                return render(request, 'report_success.html', {'report': report})
-        return render(request, 'payment_failed.html')
-    except:
+    report = DeviceReport.objects.select_related('station').filter(transaction_ref=reference).first()
+    if report is None:
         return render(request, 'payment_failed.html')
 
+    if report.status == DeviceReport.StatusChoices.PAYMENT_PENDING and settings.PAYSTACK_VERIFY_ON_REDIRECT:
+        try:
+            headers = {"Authorization": f"Bearer {settings.PAYSTACK_SECRET_KEY}"}
+            response_data = get_client('paystack').get(f'/transaction/verify/{reference}', headers=headers).json()
+            if response_data['status'] and response_data['data']['status'] == 'success':
+                mark_report_paid(reference, response_data['data'].get('amount'))
+                report.refresh_from_db()
+            elif response_data['status'] and response_data['data']['status'] in ('failed', 'abandoned', 'reversed'):
+                return render(request, 'payment_failed.html')
+        except Exception as e:
+            logger.error(f"Error verifying payment {reference}: {e}")
+            return render(request, 'payment_failed.html')
+
+    if report.status == DeviceReport.StatusChoices.PAYMENT_PENDING:
+        # The webhook has not arrived yet; the page refreshes until it does,
+        # or until PAYSTACK_CONFIRMATION_TIMEOUT has passed.
+        waited = (timezone.now() - report.created_at).total_seconds()
+        return render(request, 'payment_processing.html', {
+            'report': report, 'timed_out': waited > settings.PAYSTACK_CONFIRMATION_TIMEOUT,
+        })
+    return render(request, 'report_success.html', {'report': report})
+
+@csrf_exempt
+@require_POST
+def paystack_webhook_view(request):
+    """Paystack transaction events (see portal/payments.py)."""
+    if not verify_signature(request.body, request.headers.get('x-paystack-signature', '')):
+        return HttpResponse(status=401)
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        return HttpResponse(status=400)
+    if not isinstance(payload, dict):
+        return HttpResponse(status=400)
+
+    record_event(payload)
+    # Acknowledge duplicates too, or Paystack keeps retrying them.
+    return HttpResponse(status=200)
+
 # -------------------- AGENT PORTAL --------------------
 
+REPORT_LIST_FIELDS = ('id', 'station_id', 'imei', 'brand', 'model', 'status', 'created_at')
+
 @login_required
 def dashboard_view(request):
     try:
-        officer_station = request.user.officerprofile.station
-        now = timezone.now()
-        context = {
-            'reports_this_month_count': DeviceReport.objects.filter(station=officer_station, created_at__year=now.year, created_at__month=now.month).count(),
-            'pending_review_count': DeviceReport.objects.filter(station=officer_station, status=DeviceReport.StatusChoices.PENDING).count(),
-            'recently_recovered_count': DeviceReport.objects.filter(station=officer_station, status=DeviceReport.StatusChoices.RECOVERED).count(),
-        }
+        # All tiles come from one cached aggregate query (see portal/dashboard.py)
+        context = station_stats(request.user.officerprofile.station_id)
         return render(request, 'dashboard.html', context)
     except: return redirect('home')
 
+@login_required
+def station_analytics_view(request):
+    try:
+        station_id = request.user.officerprofile.station_id
+    except Exception: return redirect('home')
+    try:
+        weeks = min(max(int(request.GET.get('weeks', 12)), 4), 52)
+    except ValueError:
+        weeks = 12
+    # Reads the rollup tables only (see portal/rollups.py)
+    context = station_analytics(station_id, weeks=weeks)
+    context['weeks_options'] = [4, 12, 26, 52]
+    context['selected_weeks'] = weeks
+    return render(request, 'analytics.html', context)
+
+IMPORTS_LISTED = 20
+
+@login_required
+def import_reports_view(request):
+    try:
+        station_id = request.user.officerprofile.station_id
+    except Exception: return redirect('home')
+    form = ReportImportForm(request.POST or None, request.FILES or None)
+    if request.method == 'POST' and form.is_valid():
+        upload = form.cleaned_data['file']
+        report_import = ReportImport.objects.create(
+            station_id=station_id, uploaded_by=request.user, file=upload,
+            source_name=upload.name[:255], format=format_for(upload.name),
+            encoding=form.cleaned_data['encoding'],
+        )
+        # Rows are read by the job, a chunk at a time (see portal/report_import.py)
+        enqueue('import_reports', import_id=report_import.pk)
+        return redirect('import_reports')
+    imports = (
+        ReportImport.objects.filter(station_id=station_id)
+        .select_related('uploaded_by').order_by('-created_at')[:IMPORTS_LISTED]
+    )
+    return render(request, 'import_reports.html', {'form': form, 'imports': imports})
+
+@login_required
+def import_rejections_view(request, import_id):
+    report_import = get_object_or_404(ReportImport, id=import_id)
+    if report_import.station_id != request.user.officerprofile.station_id: return redirect('dashboard')
+    # Streamed, so a registry with millions of bad rows is never held in memory
+    response = StreamingHttpResponse(rejection_lines(report_import), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="import-{report_import.pk}-rejections.csv"'
+    return response
+
 @login_required
 def view_reports_view(request):
     officer_station = getattr(request.user.officerprofile, 'station', None)
     if not officer_station: return redirect('home')
     search_query = request.GET.get('search', '')
-    reports = DeviceReport.objects.filter(station=officer_station)
-    if search_query: reports = reports.filter(imei__icontains=search_query)
-    return render(request, 'view_reports.html', {'reports': reports.order_by('-created_at')})
+    # Only the columns the list renders; the long text fields stay on disk.
+    reports = DeviceReport.objects.filter(station=officer_station).only(*REPORT_LIST_FIELDS)
+    reports = search_reports(reports, search_query)
+
+    page = keyset_paginate(
+        reports,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        page_size=settings.REPORTS_PAGE_SIZE
+    )
+    base_params = {'search': search_query} if search_query else {}
+    context = {
+        'reports': page.items,
+        'next_url': f"?{urlencode({**base_params, 'after': page.next_cursor})}" if page.next_cursor else None,
+        'previous_url': f"?{urlencode({**base_params, 'before': page.previous_cursor})}" if page.previous_cursor else None,
+    }
+    return render(request, 'view_reports.html', context)
 
 @login_required
 def report_detail_view(request, report_id):
     report = get_object_or_404(DeviceReport, id=report_id)
-    if report.station != request.user.officerprofile.station: return redirect('dashboard')
+    if report.station_id != request.user.officerprofile.station_id: return redirect('dashboard')
 
     if request.method == 'POST':
         action = request.POST.get('action')
@@ -348,7 +447,7 @@ def report_detail_view(request, report_id):
             email_message = "Your device has been blacklisted."
             send_notify = True
         elif action == 'reject':
-            report.status = 'Rejected'
+            report.status = DeviceReport.StatusChoices.REJECTED
             report.save()
             email_subject = "Report Rejected"
             email_message = "Report rejected due to invalid documents."
@@ -365,10 +464,23 @@ def report_detail_view(request, report_id):
 
         if send_notify and report.owner_email:
             try:
-                send_mail(email_subject, email_message, settings.DEFAULT_FROM_EMAIL, [report.owner_email], fail_silently=True)
+                enqueue('send_email', subject=email_subject, message=email_message, recipient_list=[report.owner_email])
             except: pass
         return redirect('view_reports')
-    return render(request, 'report_detail.html', {'report': report})
+    sighting_page = keyset_paginate(
+        report.sightings.all(),
+        after=request.GET.get('sightings_after'),
+        before=request.GET.get('sightings_before'),
+        page_size=settings.SIGHTINGS_PAGE_SIZE
+    )
+    # Thumbnails and previews; originals are only fetched from the 'Open original' links
+    return render(request, 'report_detail.html', {
+        'report': report,
+        'proofs': proof_previews(report),
+        'sightings': sighting_page.items,
+        'sightings_next_url': f"?{urlencode({'sightings_after': sighting_page.next_cursor})}" if sighting_page.next_cursor else None,
+        'sightings_previous_url': f"?{urlencode({'sightings_before': sighting_page.previous_cursor})}" if sighting_page.previous_cursor else None,
+    })
 
 # -------------------- STATIC & ADMIN --------------------
 def faq(request): return render(request, 'faq.html')
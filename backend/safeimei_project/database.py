@@ -0,0 +1,77 @@
+# backend/safeimei_project/database.py
+"""
+Database profiles, selected with DATABASE_PROFILE:
+
+- sqlite      a plain SQLite file, one connection per request (the default);
+- sqlite-wal  SQLite tuned for concurrent web traffic: write-ahead logging so
+              IMEI checks keep reading while a report is written,
+              synchronous=NORMAL (safe under WAL; only the last transactions
+              can be lost on power failure, never corrupted), a busy timeout
+              instead of immediate "database is locked" errors, memory-mapped
+              reads, a larger page cache and persistent connections;
+- postgres    PostgreSQL from DATABASE_URL, with persistent, health-checked
+              connections.
+
+Read replicas (DATABASE_REPLICAS) use the same profile: SQLite paths for the
+sqlite profiles, URLs for postgres. See portal/db_router.py.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+PROFILES = ('sqlite', 'sqlite-wal', 'postgres')
+
+
+def sqlite_pragmas(synchronous='NORMAL', mmap_size=256 * 1024 * 1024, cache_size_kib=64 * 1024):
+    return [
+        'PRAGMA journal_mode=WAL',
+        f'PRAGMA synchronous={synchronous}',
+        f'PRAGMA mmap_size={mmap_size}',
+        # Negative values are KiB rather than pages
+        f'PRAGMA cache_size=-{cache_size_kib}',
+        'PRAGMA temp_store=MEMORY',
+    ]
+
+
+def sqlite_database(name, tuned=False, conn_max_age=600, busy_timeout=20, **pragmas):
+    database = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': name}
+    if tuned:
+        database['CONN_MAX_AGE'] = conn_max_age
+        database['OPTIONS'] = {
+            # Seconds a connection waits for a lock before giving up
+            'timeout': busy_timeout,
+            # Writers take the lock at BEGIN, where they can wait out the busy
+            # timeout, instead of failing when a read lock is upgraded mid-transaction
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(sqlite_pragmas(**pragmas)),
+        }
+    return database
+
+
+def postgres_database(url, conn_max_age=600, connect_timeout=5):
+    if not url:
+        raise ImproperlyConfigured("DATABASE_PROFILE=postgres needs DATABASE_URL.")
+    import dj_database_url
+    database = dj_database_url.parse(url, conn_max_age=conn_max_age, conn_health_checks=True)
+    database.setdefault('OPTIONS', {}).setdefault('connect_timeout', connect_timeout)
+    return database
+
+
+def database_for_profile(profile, sqlite_name, url='', conn_max_age=600, **sqlite_options):
+    """The DATABASES entry for `profile`; sqlite_options tune the sqlite-wal profile."""
+    if profile == 'sqlite':
+        return sqlite_database(sqlite_name)
+    if profile == 'sqlite-wal':
+        return sqlite_database(sqlite_name, tuned=True, conn_max_age=conn_max_age, **sqlite_options)
+    if profile == 'postgres':
+        return postgres_database(url, conn_max_age=conn_max_age)
+    raise ImproperlyConfigured(f"Unknown DATABASE_PROFILE {profile!r}; use one of {', '.join(PROFILES)}.")
+
+
+def replica_databases(profile, replicas, **options):
+    """DATABASES entries ('replica1', ...) for replica paths or URLs, mirrored to 'default' in tests."""
+    return {
+        f'replica{i}': {
+            **database_for_profile(profile, sqlite_name=replica, url=replica, **options),
+            'TEST': {'MIRROR': 'default'},
+        }
+        for i, replica in enumerate(replicas, start=1)
+    }
@@ -13,6 +13,8 @@ from decouple import config, Csv
 import os
 from pathlib import Path
 
+from .database import database_for_profile, replica_databases
+
 # Build paths inside the project
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -45,12 +47,14 @@ INSTALLED_APPS = [
 
 # --- MIDDLEWARE ---
 MIDDLEWARE = [
+    'portal.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'portal.db_router.ReplicaMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -83,14 +87,75 @@ WSGI_APPLICATION = 'safeimei_project.wsgi.application'
 # }
 
 # --- DATABASE (Use SQLite for PythonAnywhere Free Tier) ---
+# DATABASE_PROFILE: 'sqlite' (plain file), 'sqlite-wal' (tuned for concurrent
+# traffic) or 'postgres' (DATABASE_URL). See safeimei_project/database.py.
+DATABASE_PROFILE = config('DATABASE_PROFILE', default='sqlite')
+DATABASE_OPTIONS = {
+    'conn_max_age': config('CONN_MAX_AGE', default=600, cast=int),
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT', default=20, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    'cache_size_kib': config('SQLITE_CACHE_SIZE_KIB', default=64 * 1024, cast=int),
+}
 DATABASES = {
+    'default': database_for_profile(
+        DATABASE_PROFILE,
+        sqlite_name=config('SQLITE_PATH', default=str(BASE_DIR / 'db.sqlite3')),
+        url=config('DATABASE_URL', default=''),
+        **DATABASE_OPTIONS,
+    ),
+    # Comma-separated replica paths (SQLite) or URLs (postgres)
+    **replica_databases(DATABASE_PROFILE, config('DATABASE_REPLICAS', default='', cast=Csv()), **DATABASE_OPTIONS),
+}
+# Public IMEI lookups read from these (portal/db_router.py)
+READ_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['portal.db_router.ReplicaRouter']
+# Seconds a client keeps reading from the primary after it wrote, and the
+# replication lag beyond which a replica is skipped
+REPLICA_MAX_LAG = config('REPLICA_MAX_LAG', default=5, cast=float)
+REPLICA_LAG_CHECK_INTERVAL = config('REPLICA_LAG_CHECK_INTERVAL', default=10, cast=float)
+
+
+# --- CACHE ---
+# Defaults to a per-process cache. Point CACHE_BACKEND/CACHE_LOCATION at a
+# shared backend (e.g. django.core.cache.backends.db.DatabaseCache or Redis)
+# so invalidation and counters are seen by every gunicorn worker.
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='safeimei'),
     }
 }
 
 
+# --- RATE LIMITING ---
+# Token buckets per client IP and per submitted IMEI for the public lookups
+# (portal/ratelimit.py). Rates are 'count/period', period one of s, m, h, d
+# with an optional multiple ('100/10m'); an empty rate disables that bucket.
+# The buckets must be in a cache every worker shares; `check --deploy`
+# refuses a per-process one outside DEBUG (portal/checks.py).
+RATE_LIMIT_ENABLED = config('RATE_LIMIT_ENABLED', default=True, cast=bool)
+RATE_LIMIT_CACHE = config('RATE_LIMIT_CACHE', default='default')
+# Reverse proxies in front of the app that append to X-Forwarded-For. The
+# per-IP buckets use the address the outermost one saw; with 0 they use
+# REMOTE_ADDR (set this behind a load balancer, or every client shares its IP).
+TRUSTED_PROXY_COUNT = config('TRUSTED_PROXY_COUNT', default=0, cast=int)
+RATE_LIMITS = {
+    'home': {
+        'ip': config('RATE_LIMIT_HOME_IP', default='30/m'),
+        'imei': config('RATE_LIMIT_HOME_IMEI', default='10/m'),
+    },
+    'anonymous_alert': {
+        'ip': config('RATE_LIMIT_ALERT_IP', default='5/m'),
+        'imei': config('RATE_LIMIT_ALERT_IMEI', default='3/10m'),
+    },
+    # Per request, each carrying up to IMEI_BATCH_MAX_ITEMS IMEIs
+    'imei_batch': {
+        'ip': config('RATE_LIMIT_BATCH_IP', default='20/m'),
+        'partner': config('RATE_LIMIT_BATCH_PARTNER', default='60/m'),
+    },
+}
+
+
 # --- AUTH ---
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -221,4 +286,138 @@ JAZZMIN_SETTINGS = {
 # --- PAYSTACK SETTINGS ---
 # Replace these with your actual keys from paystack.com
 PAYSTACK_SECRET_KEY = config('PAYSTACK_SECRET_KEY', default='sk_test_bb8eb628a59d2675dea45635c2d9d2a643ee6d42')
-PAYSTACK_PUBLIC_KEY = config('PAYSTACK_PUBLIC_KEY', default='pk_test_33bc2baf2001d124320039fc1d39cd195c7216e7')
\ No newline at end of file
+PAYSTACK_PUBLIC_KEY = config('PAYSTACK_PUBLIC_KEY', default='pk_test_33bc2baf2001d124320039fc1d39cd195c7216e7')
+# Report fee in kobo; webhook charges below this do not confirm a report
+PAYSTACK_REPORT_AMOUNT = config('PAYSTACK_REPORT_AMOUNT', default=100000, cast=int)
+# Payments are confirmed by the webhook (/payments/paystack/webhook/). Turn
+# this on where the webhook URL cannot be registered (e.g. local
+# development) to also ask Paystack when the payer returns from checkout.
+PAYSTACK_VERIFY_ON_REDIRECT = config('PAYSTACK_VERIFY_ON_REDIRECT', default=False, cast=bool)
+# Seconds after the report was submitted that the confirmation page keeps
+# refreshing; after that it stops and tells the payer how to follow up.
+PAYSTACK_CONFIRMATION_TIMEOUT = config('PAYSTACK_CONFIRMATION_TIMEOUT', default=600, cast=int)
+
+# --- STOLEN IMEI INDEX ---
+# Upper bound (seconds) on how long a worker may answer IMEI checks from its
+# in-memory index before re-reading the shared version counter.
+STOLEN_INDEX_MAX_STALENESS = config('STOLEN_INDEX_MAX_STALENESS', default=5, cast=float)
+
+# --- PARTNER BATCH API ---
+# Partners authenticate with "Authorization: Bearer <key>", one of these keys.
+# With no keys set the batch API refuses every request.
+IMEI_BATCH_API_KEYS = config('IMEI_BATCH_API_KEYS', default='', cast=Csv())
+IMEI_BATCH_MAX_ITEMS = config('IMEI_BATCH_MAX_ITEMS', default=5000, cast=int)
+IMEI_BATCH_CHUNK_SIZE = config('IMEI_BATCH_CHUNK_SIZE', default=500, cast=int)
+
+# --- BACKGROUND JOBS ---
+# Run `python manage.py run_workers` alongside the web server. Set JOBS_EAGER
+# to run jobs inline instead (no worker needed, but requests wait on SMTP).
+JOBS_EAGER = config('JOBS_EAGER', default=False, cast=bool)
+JOBS_MAX_ATTEMPTS = config('JOBS_MAX_ATTEMPTS', default=5, cast=int)
+JOBS_VISIBILITY_TIMEOUT = config('JOBS_VISIBILITY_TIMEOUT', default=300, cast=int)
+JOBS_RETRY_BASE_DELAY = config('JOBS_RETRY_BASE_DELAY', default=10, cast=int)
+JOBS_RETRY_MAX_DELAY = config('JOBS_RETRY_MAX_DELAY', default=3600, cast=int)
+JOBS_WORKER_POOL = config('JOBS_WORKER_POOL', default='thread')
+JOBS_WORKER_CONCURRENCY = config('JOBS_WORKER_CONCURRENCY', default=4, cast=int)
+JOBS_POLL_INTERVAL = config('JOBS_POLL_INTERVAL', default=1.0, cast=float)
+
+# --- SIGHTING ALERTS ---
+# The first sighting of an IMEI emails its recipient at once; further
+# sightings within this many seconds are sent as one digest when the window
+# closes (portal/alerts.py). The digest lists at most SIGHTING_DIGEST_MAX_ITEMS.
+SIGHTING_ALERT_WINDOW = config('SIGHTING_ALERT_WINDOW', default=3600, cast=int)
+SIGHTING_DIGEST_MAX_ITEMS = config('SIGHTING_DIGEST_MAX_ITEMS', default=50, cast=int)
+# The sighting log is written in batches of SIGHTING_BATCH_SIZE, or once the
+# oldest buffered sighting is SIGHTING_FLUSH_INTERVAL seconds old
+# (portal/sightings.py). Unwritable batches are kept up to SIGHTING_BUFFER_MAX.
+SIGHTING_BATCH_SIZE = config('SIGHTING_BATCH_SIZE', default=200, cast=int)
+SIGHTING_FLUSH_INTERVAL = config('SIGHTING_FLUSH_INTERVAL', default=5.0, cast=float)
+SIGHTING_BUFFER_MAX = config('SIGHTING_BUFFER_MAX', default=10000, cast=int)
+
+# --- GEOIP ---
+# Range file built with `python manage.py build_geoip --csv <dump.csv>`.
+GEOIP_DATABASE = config('GEOIP_DATABASE', default=os.path.join(BASE_DIR, 'data', 'geoip.bin'))
+# Ask ipinfo.io for addresses the local file does not cover (background jobs only).
+GEOIP_REMOTE_FALLBACK = config('GEOIP_REMOTE_FALLBACK', default=True, cast=bool)
+GEOIP_CACHE_SIZE = config('GEOIP_CACHE_SIZE', default=10000, cast=int)
+GEOIP_CACHE_TTL = config('GEOIP_CACHE_TTL', default=6 * 3600, cast=int)
+
+# --- TAC DATABASE ---
+# Device models by IMEI prefix, built with `python manage.py import_tac --csv <export.csv>`.
+# Without the file, brand/model checks and prefill are skipped.
+TAC_DATABASE = config('TAC_DATABASE', default=os.path.join(BASE_DIR, 'data', 'tac.bin'))
+
+# --- OUTBOUND HTTP ---
+# One pooled client per provider (see portal/http_client.py). Timeouts are
+# (connect, read) seconds; the breaker opens after `failure_threshold`
+# consecutive failures and stays open for `reset_timeout` seconds.
+OUTBOUND_HTTP = {
+    'paystack': {
+        'base_url': config('PAYSTACK_BASE_URL', default='https://api.paystack.co'),
+        'connect_timeout': 3.05,
+        'read_timeout': 15,
+        'retries': 2,
+    },
+    'ipinfo': {
+        'base_url': config('IPINFO_BASE_URL', default='https://ipinfo.io'),
+        'connect_timeout': 1,
+        'read_timeout': 2,
+        'retries': 1,
+    },
+}
+
+# --- AGENT PORTAL ---
+# Tiles are cached in the default cache and dropped on every report change;
+# outside DEBUG `check --deploy` wants that cache shared (or this set to 0).
+DASHBOARD_CACHE_TTL = config('DASHBOARD_CACHE_TTL', default=60, cast=int)
+REPORTS_PAGE_SIZE = config('REPORTS_PAGE_SIZE', default=50, cast=int)
+SIGHTINGS_PAGE_SIZE = config('SIGHTINGS_PAGE_SIZE', default=20, cast=int)
+# Shorter search fragments fall back to a substring scan.
+IMEI_SEARCH_MIN_INDEXED_DIGITS = config('IMEI_SEARCH_MIN_INDEXED_DIGITS', default=4, cast=int)
+
+# --- OCR VERIFICATION ---
+# Engine alias ('tesseract', 'fake') or dotted path to a portal.ocr.OcrEngine
+# subclass. 'fake' reads the file's raw text; only for tests and benchmarks.
+# 'tesseract' also needs the tesseract binary (e.g. apt install tesseract-ocr).
+OCR_ENGINE = config('OCR_ENGINE', default='tesseract')
+OCR_ENGINE_OPTIONS = {'lang': config('OCR_LANG', default='eng')}
+# Worker processes for document analysis (0 = analyse in the job worker)
+OCR_PROCESSES = config('OCR_PROCESSES', default=2, cast=int)
+# Seconds to wait for one document before the job is retried
+OCR_TIMEOUT = config('OCR_TIMEOUT', default=120, cast=int)
+
+# --- PROOF UPLOADS ---
+# Checked while the request streams in (see portal/uploads.py)
+PROOF_UPLOAD_MAX_SIZE = config('PROOF_UPLOAD_MAX_SIZE', default=5 * 1024 * 1024, cast=int)
+PROOF_UPLOAD_TYPES = ['image/jpeg', 'image/png', 'application/pdf']
+# Proofs are stored by content hash under this media prefix (portal/proof_storage.py)
+PROOF_BLOB_PREFIX = 'proofs/blobs'
+# Unreferenced blobs younger than this are kept by gc_proofs (uploads in flight)
+PROOF_GC_GRACE_SECONDS = config('PROOF_GC_GRACE_SECONDS', default=24 * 3600, cast=int)
+# Review-page copies of image/PDF proofs (portal/derivatives.py)
+PROOF_THUMBNAIL_SIZE = 320
+PROOF_PREVIEW_SIZE = 1280
+PROOF_DERIVATIVE_FORMAT = config('PROOF_DERIVATIVE_FORMAT', default='WEBP')
+PROOF_DERIVATIVE_QUALITY = 80
+
+# --- BULK IMPORT ---
+# Historical registries loaded with `manage.py import_reports` or the agent
+# upload page (portal/report_import.py), IMPORT_CHUNK_SIZE rows per transaction.
+IMPORT_CHUNK_SIZE = config('IMPORT_CHUNK_SIZE', default=1000, cast=int)
+# An uploaded import works this long per job, then queues its continuation;
+# keep it below JOBS_VISIBILITY_TIMEOUT.
+IMPORT_JOB_SECONDS = config('IMPORT_JOB_SECONDS', default=240, cast=int)
+IMPORT_MAX_UPLOAD_SIZE = config('IMPORT_MAX_UPLOAD_SIZE', default=100 * 1024 * 1024, cast=int)
+
+# --- METRICS ---
+# Prometheus metrics at /metrics (portal/metrics.py; needs prometheus_client)
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+# Scrapers must send "Authorization: Bearer <token>"; unset, /metrics is only
+# served with DEBUG on.
+METRICS_AUTH_TOKEN = config('METRICS_AUTH_TOKEN', default='')
+# Directory shared by gunicorn workers so /metrics covers all of them. Read
+# by prometheus_client from the environment, so it is exported here before
+# any metric is created.
+PROMETHEUS_MULTIPROC_DIR = config('PROMETHEUS_MULTIPROC_DIR', default='')
+if PROMETHEUS_MULTIPROC_DIR:
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', PROMETHEUS_MULTIPROC_DIR)